@@ -0,0 +1,141 @@
+"""依輸出目標選擇 Azure 的音訊輸出格式與品質等級。
+
+原本不論輸出什麼都固定用 `Audio16Khz32KBitRateMonoMp3`。這裡改成依用途挑格式：
+- 影片（`video`）：MP3 是 MP4 容器原生支援的音訊編碼，`video_render` 直接 `-c:a copy` 放進去，
+  不經過解碼與重新編碼；Azure 沒有提供 AAC 輸出，因此影片同樣使用 MP3；
+- 只要音檔（`audio`）：MP3，高品質等級用較高的取樣率與位元率；
+- 需要後製（`pcm`）：RIFF / PCM 的 WAV，沒有任何有損壓縮。
+每個目標都有「省空間 / 標準 / 高音質」三種等級，用檔案大小與頻寬換音質。
+"""
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+from mp3_frames import FrameHeader, Mp3Joiner, mp3_duration, silent_mp3, split_mp3
+from wav_pcm import PcmFormat, WavJoiner, is_wav, silent_wav, split_wav, wav_duration
+
+
+TARGET_VIDEO = "video"
+TARGET_AUDIO = "audio"
+TARGET_PCM = "pcm"
+
+QUALITY_LABELS = {
+    "small": "省空間",
+    "standard": "標準",
+    "high": "高音質",
+}
+DEFAULT_AUDIO_QUALITY = "small"
+
+
+@dataclass(frozen=True)
+class AudioFormat:
+    key: str
+    # `speechsdk.SpeechSynthesisOutputFormat` 的成員名稱，也是分段快取鍵的一部分
+    sdk_name: str
+    container: str  # "mp3" 或 "wav"
+    sample_rate: int
+    # MP3 的位元率（bps）；PCM 為 0
+    bitrate: int = 0
+
+    @property
+    def extension(self) -> str:
+        return self.container
+
+    @property
+    def mime_type(self) -> str:
+        return "audio/mpeg" if self.container == "mp3" else "audio/wav"
+
+    @property
+    def kbps(self) -> int:
+        return self.bitrate // 1000 if self.bitrate else self.sample_rate * 16 // 1000
+
+    @property
+    def label(self) -> str:
+        if self.container == "mp3":
+            return f"MP3 {self.sample_rate // 1000} kHz / {self.kbps} kbps"
+        return f"WAV（PCM）{self.sample_rate // 1000} kHz / 16 bit"
+
+    @property
+    def mp3_header(self) -> Optional[FrameHeader]:
+        if self.container != "mp3":
+            return None
+        # 32 / 44.1 / 48 kHz 為 MPEG-1，其餘為 MPEG-2
+        version = 3 if self.sample_rate >= 32000 else 2
+        return FrameHeader(version, self.bitrate, self.sample_rate, 0, 1, False)
+
+    @property
+    def pcm_format(self) -> Optional[PcmFormat]:
+        return PcmFormat(self.sample_rate) if self.container == "wav" else None
+
+    def megabytes_per_minute(self) -> float:
+        return self.kbps * 1000 / 8 * 60 / 1024 / 1024
+
+
+AUDIO_FORMATS = {
+    f.key: f
+    for f in (
+        AudioFormat("mp3_16k_32k", "Audio16Khz32KBitRateMonoMp3", "mp3", 16000, 32000),
+        AudioFormat("mp3_24k_48k", "Audio24Khz48KBitRateMonoMp3", "mp3", 24000, 48000),
+        AudioFormat("mp3_24k_96k", "Audio24Khz96KBitRateMonoMp3", "mp3", 24000, 96000),
+        AudioFormat("mp3_48k_96k", "Audio48Khz96KBitRateMonoMp3", "mp3", 48000, 96000),
+        AudioFormat("mp3_48k_192k", "Audio48Khz192KBitRateMonoMp3", "mp3", 48000, 192000),
+        AudioFormat("wav_16k", "Riff16Khz16BitMonoPcm", "wav", 16000),
+        AudioFormat("wav_24k", "Riff24Khz16BitMonoPcm", "wav", 24000),
+        AudioFormat("wav_48k", "Riff48Khz16BitMonoPcm", "wav", 48000),
+    )
+}
+# 與原本寫死的格式相同，舊的分段快取與工作清單檔都能繼續使用
+DEFAULT_AUDIO_FORMAT = "mp3_16k_32k"
+
+FORMAT_BY_TARGET = {
+    TARGET_VIDEO: {"small": "mp3_16k_32k", "standard": "mp3_24k_48k", "high": "mp3_48k_96k"},
+    TARGET_AUDIO: {"small": "mp3_16k_32k", "standard": "mp3_24k_96k", "high": "mp3_48k_192k"},
+    TARGET_PCM: {"small": "wav_16k", "standard": "wav_24k", "high": "wav_48k"},
+}
+
+
+def output_target(make_video: bool, wav_output: bool = False) -> str:
+    if wav_output:
+        return TARGET_PCM
+    return TARGET_VIDEO if make_video else TARGET_AUDIO
+
+
+def select_audio_format(target: str, quality: str = DEFAULT_AUDIO_QUALITY) -> AudioFormat:
+    """依輸出目標與品質等級挑選格式；不認得的等級退回預設等級。"""
+    tiers = FORMAT_BY_TARGET[target]
+    return AUDIO_FORMATS[tiers.get(quality, tiers[DEFAULT_AUDIO_QUALITY])]
+
+
+def pcm_counterpart(audio_format: AudioFormat) -> AudioFormat:
+    """與 `audio_format` 同取樣率的 PCM 格式；PCM 後製時向 Azure 要這個格式，最後才編碼成目標格式。"""
+    if audio_format.container == "wav":
+        return audio_format
+    for candidate in AUDIO_FORMATS.values():
+        if candidate.container == "wav" and candidate.sample_rate == audio_format.sample_rate:
+            return candidate
+    return AUDIO_FORMATS[FORMAT_BY_TARGET[TARGET_PCM][DEFAULT_AUDIO_QUALITY]]
+
+
+def audio_duration(data) -> float:
+    """依內容判斷 WAV 或 MP3，回傳長度（秒）。"""
+    return wav_duration(data) if is_wav(data) else mp3_duration(data)
+
+
+def split_audio(data, boundaries: Sequence[float]) -> List[bytes]:
+    """依內容判斷 WAV 或 MP3，在 `boundaries`（秒）切成幾個獨立的音檔；MP3 以 frame 為單位。"""
+    if is_wav(data):
+        return split_wav(data, boundaries)
+    return split_mp3(data, boundaries)
+
+
+def make_joiner(audio_format: AudioFormat, output_path: str):
+    """記憶體合併用的 sink：MP3 以 frame 串接，WAV 以 PCM 取樣串接。"""
+    if audio_format.container == "wav":
+        return WavJoiner(output_path)
+    return Mp3Joiner(output_path)
+
+
+def silent_audio(audio_format: AudioFormat, seconds: float) -> bytes:
+    """與 `audio_format` 參數相同、長度約 `seconds` 秒的完整靜音檔。"""
+    if audio_format.container == "wav":
+        return silent_wav(seconds, audio_format.pcm_format)
+    return silent_mp3(seconds, template=audio_format.mp3_header)
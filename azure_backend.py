@@ -0,0 +1,197 @@
+"""Azure Speech 合成後端，實作 `tts_engine.SegmentSynthesizer`。"""
+import time
+from typing import Optional, Tuple
+
+import azure.cognitiveservices.speech as speechsdk
+
+from audio_formats import AUDIO_FORMATS, DEFAULT_AUDIO_FORMAT
+from segment_cache import CachedSynthesizer, SegmentCache
+from synth_daemon import DaemonSynthesizer
+from tts_engine import SegmentSynthesizer, SynthesisCanceled, SynthesisOutput
+from tts_pipeline import DEFAULT_VOICE
+from usage_quota import MeteredSynthesizer, UsageMeter
+
+
+# SDK 事件的 audio_offset 以 100 奈秒（tick）為單位
+TICKS_PER_SECOND = 10_000_000
+
+
+def speech_output_format(audio_format: str = DEFAULT_AUDIO_FORMAT) -> speechsdk.SpeechSynthesisOutputFormat:
+    """`audio_formats.AUDIO_FORMATS` 的鍵對應到 SDK 的輸出格式；分段快取的鍵也包含格式名稱。"""
+    return getattr(speechsdk.SpeechSynthesisOutputFormat, AUDIO_FORMATS[audio_format].sdk_name)
+
+
+def make_speech_config(
+    key: str,
+    region: str,
+    voice: str = DEFAULT_VOICE,
+    audio_format: str = DEFAULT_AUDIO_FORMAT,
+) -> speechsdk.SpeechConfig:
+    speech_config = speechsdk.SpeechConfig(
+        subscription=key,
+        region=region,
+    )
+    speech_config.speech_synthesis_voice_name = voice or DEFAULT_VOICE
+    speech_config.set_speech_synthesis_output_format(speech_output_format(audio_format))
+    return speech_config
+
+
+def word_boundary_handler(words: list):
+    """`synthesis_word_boundary` 事件 → (開始秒數, 長度秒數, 文字)；句子邊界不記錄，標點另成一筆。"""
+
+    def on_word(evt):
+        if getattr(evt, "boundary_type", None) == speechsdk.SpeechSynthesisBoundaryType.Sentence:
+            return
+        words.append((evt.audio_offset / TICKS_PER_SECOND, evt.duration.total_seconds(), evt.text))
+
+    return on_word
+
+
+class AzureSynthesizer:
+    """每次呼叫建立一個 SpeechSynthesizer，音訊直接留在記憶體（audio_config=None）。
+
+    `speech_config` 只會被讀取，因此可以讓多個 worker 執行緒共用同一個實例。
+    """
+
+    def __init__(self, speech_config: speechsdk.SpeechConfig):
+        self.speech_config = speech_config
+
+    def _new_synthesizer(self) -> speechsdk.SpeechSynthesizer:
+        return speechsdk.SpeechSynthesizer(
+            speech_config=self.speech_config,
+            audio_config=None,
+        )
+
+    def synthesize(self, text: str) -> SynthesisOutput:
+        synthesizer = self._new_synthesizer()
+        words = []
+        synthesizer.synthesis_word_boundary.connect(word_boundary_handler(words))
+        output = self._to_output(synthesizer.speak_text_async(text).get())
+        output.words = sorted(words)
+        return output
+
+    def synthesize_ssml(self, ssml: str) -> SynthesisOutput:
+        synthesizer = self._new_synthesizer()
+        bookmarks = []
+        words = []
+        synthesizer.bookmark_reached.connect(
+            lambda evt: bookmarks.append((evt.text, evt.audio_offset / TICKS_PER_SECOND))
+        )
+        synthesizer.synthesis_word_boundary.connect(word_boundary_handler(words))
+        result = synthesizer.speak_ssml_async(ssml).get()
+        output = self._to_output(result)
+        output.bookmarks = sorted(bookmarks, key=lambda item: item[1])
+        output.words = sorted(words)
+        return output
+
+    @staticmethod
+    def _to_output(result) -> SynthesisOutput:
+        if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
+            duration = getattr(result, "audio_duration", None)
+            return SynthesisOutput(
+                audio_data=result.audio_data,
+                audio_duration=duration.total_seconds() if duration else 0.0,
+            )
+        if result.reason == speechsdk.ResultReason.Canceled:
+            cancellation = result.cancellation_details
+            raise SynthesisCanceled(cancellation.reason, cancellation.error_details)
+        raise SynthesisCanceled(result.reason, "合成結果未知")
+
+
+class AzureSession:
+    """長期保留的 SpeechSynthesizer，給 `synth_daemon.py` 的連線池使用。
+
+    `AzureSynthesizer` 每次請求都建立新的 SpeechSynthesizer，每段都要重新連線與 TLS 交握；
+    這裡則在 `warm_up` 時以 `Connection.open` 預先建立連線，之後同一個 session 依序處理多個請求。
+    一個 session 同一時間只處理一個請求，由連線池保證。
+    """
+
+    def __init__(self, speech_config: speechsdk.SpeechConfig):
+        self.synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
+        self.connection = speechsdk.Connection.from_speech_synthesizer(self.synthesizer)
+        self._first_chunk_at: Optional[float] = None
+        self._bookmarks = []
+        self._words = []
+        self.synthesizer.synthesizing.connect(self._on_synthesizing)
+        self.synthesizer.bookmark_reached.connect(
+            lambda evt: self._bookmarks.append((evt.text, evt.audio_offset / TICKS_PER_SECOND))
+        )
+        # 事件處理函式只綁一次，每個請求開始時清空同一個 list
+        self.synthesizer.synthesis_word_boundary.connect(word_boundary_handler(self._words))
+
+    def _on_synthesizing(self, _evt):
+        if self._first_chunk_at is None:
+            self._first_chunk_at = time.perf_counter()
+
+    def warm_up(self):
+        # True：連同合成用的連線一起預先開好
+        self.connection.open(True)
+
+    def synthesize(self, payload: str, ssml: bool = False) -> Tuple[SynthesisOutput, float]:
+        """回傳 (合成結果, 第一個音訊片段到達的秒數)。"""
+        self._first_chunk_at = None
+        self._bookmarks = []
+        self._words.clear()
+        started = time.perf_counter()
+        speak = self.synthesizer.speak_ssml_async if ssml else self.synthesizer.speak_text_async
+        result = speak(payload).get()
+        output = AzureSynthesizer._to_output(result)
+        output.bookmarks = sorted(self._bookmarks, key=lambda item: item[1])
+        output.words = sorted(self._words)
+        first_byte = (self._first_chunk_at or time.perf_counter()) - started
+        return output, first_byte
+
+    def close(self):
+        self.connection.close()
+
+
+def make_session_factory(key: str, region: str):
+    """依 voice 與輸出格式建立 `AzureSession` 的工廠，給 `synth_daemon.SynthesisDaemon` 使用。"""
+
+    def factory(voice: str, audio_format: str = DEFAULT_AUDIO_FORMAT) -> AzureSession:
+        return AzureSession(make_speech_config(key, region, voice, audio_format))
+
+    return factory
+
+
+def make_synthesizer(
+    speech_config: speechsdk.SpeechConfig,
+    cache: Optional[SegmentCache] = None,
+    audio_format: str = DEFAULT_AUDIO_FORMAT,
+    meter: Optional[UsageMeter] = None,
+) -> SegmentSynthesizer:
+    """建立 Azure 合成後端；有提供快取時，外面再包一層 `CachedSynthesizer`。
+
+    `audio_format` 必須與建立 `speech_config` 時的格式相同，快取鍵才會對應到正確的音檔。
+    `meter` 包在快取內層：真的要送給 Azure 的請求才需要限速與記帳。
+    """
+    synthesizer = AzureSynthesizer(speech_config)
+    if meter is not None:
+        synthesizer = MeteredSynthesizer(synthesizer, meter, speech_config.speech_synthesis_voice_name)
+    if cache is not None:
+        synthesizer = CachedSynthesizer(
+            synthesizer,
+            cache,
+            voice=speech_config.speech_synthesis_voice_name,
+            output_format=AUDIO_FORMATS[audio_format].sdk_name,
+        )
+    return synthesizer
+
+
+def make_daemon_synthesizer(
+    url: str,
+    voice: str,
+    cache: Optional[SegmentCache] = None,
+    audio_format: str = DEFAULT_AUDIO_FORMAT,
+    meter: Optional[UsageMeter] = None,
+) -> SegmentSynthesizer:
+    """透過 `synth_daemon.py` 合成；快取鍵與直接連 Azure 時相同，兩種方式可共用快取。"""
+    voice = voice or DEFAULT_VOICE
+    synthesizer = DaemonSynthesizer(url, voice, audio_format=audio_format)
+    if meter is not None:
+        synthesizer = MeteredSynthesizer(synthesizer, meter, voice)
+    if cache is not None:
+        synthesizer = CachedSynthesizer(
+            synthesizer, cache, voice=voice, output_format=AUDIO_FORMATS[audio_format].sdk_name
+        )
+    return synthesizer
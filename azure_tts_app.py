@@ -1,121 +1,344 @@
+import json
 import os
-import subprocess
-import re
-from datetime import datetime
+import urllib.request
 
 import streamlit as st
 import azure.cognitiveservices.speech as speechsdk
 import streamlit.components.v1 as components
-import base64
 
+from audio_formats import DEFAULT_AUDIO_FORMAT, DEFAULT_AUDIO_QUALITY, QUALITY_LABELS
+from azure_backend import make_daemon_synthesizer, make_speech_config, make_synthesizer
+from job_manager import (
+    DEFAULT_MAX_JOBS,
+    STATUS_DONE,
+    STATUS_FAILED,
+    STATUS_LABELS,
+    STATUS_QUEUED,
+    STATUS_RUNNING,
+    JobManager,
+    JobRecord,
+)
+from dialogue import detect_speakers
+from job_manifest import find_resumable
+from output_library import (
+    DEFAULT_EVICTION_POLICY,
+    DEFAULT_LIBRARY_MAX_BYTES,
+    EVICTION_POLICIES,
+    LibraryEntry,
+    OutputLibrary,
+)
+from pcm_post import DEFAULT_LOUDNESS_DB, postprocess_available
+from run_history import JobEstimate, RunHistory, format_estimate
+from segment_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, SegmentCache
+from ssml_builder import DEFAULT_BREAK_MS
+from stream_player import get_stream_server
+from synth_daemon import DEFAULT_DAEMON_URL, daemon_available
+from tts_engine import DEFAULT_MAX_WORKERS
+from tts_pipeline import (
+    AZURE_MAX_SECONDS_PER_CALL,
+    DEFAULT_OUTPUT_DIR,
+    DEFAULT_SEGMENT_CHARS,
+    DEFAULT_SEGMENT_SECONDS,
+    DEFAULT_SHADOWING_GAP_MS,
+    JobSpec,
+    build_description,
+    job_audio_format,
+    job_billable_chars,
+    job_output_format,
+    make_final_base,
+    prepare_text,
+)
+from usage_quota import DEFAULT_TIER, TIERS, UsageLedger, UsageMeter, budget_warning, key_fingerprint, ledger_path, make_bucket
+from video_render import DEFAULT_VIDEO_PROFILE, VIDEO_PROFILES
+from youtube_templates import DEFAULT_YT_TEMPLATE_KEY, YOUTUBE_DESCRIPTION_TEMPLATES
+
+
+@st.cache_resource
+def get_segment_cache() -> SegmentCache:
+    # 跨 rerun 共用同一個快取實例，命中 / 未命中統計才會累積
+    return SegmentCache(DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES)
+
+
+def render_cache_stats(container, cache: SegmentCache):
+    stats = cache.stats()
+    container.caption(
+        f"快取命中 {stats['hits']} 段 / 未命中 {stats['misses']} 段"
+        f"（命中率 {stats['hit_rate'] * 100:.0f}%），已省下約 {stats['chars_saved']:,} 字元。\n"
+        f"目前 {stats['entries']} 段，{stats['bytes'] / 1024 / 1024:.1f} / "
+        f"{stats['max_bytes'] / 1024 / 1024:.0f} MB。"
+    )
 
-YOUTUBE_DESCRIPTION_TEMPLATES = {
-    # 一般德文聽力 / 閱讀 / 口語跟讀
-    "general_listening": """#Deutschlernen #GermanListening #TELC #Deutschverstehen
-📌 Deutsche Hörübung – Vorlesen eines Übungstextes zur Prüfungsvorbereitung
 
-In diesem Video wird ein deutscher Übungstext langsam, deutlich und mit natürlicher Betonung vorgelesen. Ideal für:
-✓ Vorbereitung auf TestDaF / DSH / Goethe / TELC
-✓ Training des Hörverstehens
-✓ Schattenlesen (Shadowing) und Nachsprechen
-✓ Wortschatzaufbau und Festigung grammatischer Strukturen
-✓ Gewöhnung an akademische Hörtexte
+@st.cache_resource
+def get_usage_ledger() -> UsageLedger:
+    return UsageLedger(ledger_path(DEFAULT_OUTPUT_DIR))
 
-🗣 Sprecher: Standarddeutscher Sprecher mit neutraler, klarer Aussprache  
-🎧 Inhalt: Vorlesen eines sachlichen deutschen Textes in prüfungsnahem Stil
 
-Tipps zum Lernen:
-1. Zuerst ohne Untertitel hören
-2. Danach mit deutschen Untertiteln (automatisch erzeugt) erneut anhören
-3. Den Text laut nachsprechen (Shadowing)
-4. Mehrmals wiederholen – Sprache lernt man durch Wiederholung
+@st.cache_resource
+def get_rate_limiter(tier: str):
+    # 同一個程序中的所有工作共用一個 bucket，併發的工作加起來也不會超過資源層級的限制
+    return make_bucket(tier)
 
-💡 Lerntipp:  
-Dieses Video lässt sich sehr gut zusammen mit dem Browser‑Add‑on **Language Reactor** verwenden (https://www.languagereactor.com/).  
-Damit kannst du Untertitel bequemer steuern, Vokabeln speichern und schwierige Stellen mehrfach im Kontext wiederholen.
 
-Wenn du weitere deutsche Hörübungen möchtest, freue ich mich über einen Kommentar oder ein Abo!
+def usage_key_id() -> str:
+    return key_fingerprint(st.secrets.get("SPEECH_KEY") or "")
 
-#Deutschlernen #GermanListening #TestDaF #DSH #TELC #Goethe #GermanAudio #DeutschfürAusländer #GermanPractice #GermanReading #Deutschverstehen""",
-    # 德福 / 高階考試：聽力重點
-    "testdaf_listening": """#TestDaF #Deutschlernen #Hörverstehen #GermanListening
-📌 TestDaF / Hochschulprüfung – Hörverstehen-Training mit authentischem Übungstext
 
-In diesem Video hörst du einen deutschen Übungstext im prüfungsnahen Stil. Ideal für:
-✓ Vorbereitung auf TestDaF, DSH, telc Hochschule
-✓ Training des globalen und selektiven Hörverstehens
-✓ Gewöhnung an akademische Hörtexte und typische Prüfungssituationen
+def render_usage(container, ledger: UsageLedger, key_id: str, budget_chars: int, job_chars: int, bucket):
+    """本月累計用量（跨次執行、依 voice 分列）、這份工作的字元數與限速統計。"""
+    totals = ledger.month_totals(key_id)
+    with container.container():
+        if job_chars > 0:
+            st.info(f"這份工作最多送出約 {job_chars:,} 個字元（命中分段快取的分段不計）。")
+        else:
+            st.write("目前還沒有可送給 Azure 的文字。")
+        if budget_chars > 0:
+            st.progress(min(1.0, totals["chars"] / budget_chars))
+        st.caption(
+            f"本月已送出 {totals['chars']:,} 字元"
+            + (f" / 預算 {budget_chars:,}" if budget_chars > 0 else "")
+            + f"，{totals['requests']} 個請求（失敗 {totals['failed']}）。"
+        )
+        warning = budget_warning(ledger, key_id, budget_chars, job_chars)
+        if warning:
+            st.warning(warning)
+        voices = ledger.by_voice(key_id)
+        if voices:
+            st.table(voices)
+        stats = bucket.stats()
+        if stats["acquired"]:
+            st.caption(
+                f"限速：已放行 {stats['acquired']} 個請求，其中 {stats['waited']} 個曾等待，"
+                f"共等待 {stats['wait_seconds']:.1f} 秒。"
+            )
 
-🗣 Sprecher: neutrale, deutliche Aussprache in Standarddeutsch  
-🎧 Fokus: Hörverstehen, Notizen machen, Struktur erkennen
 
-Lerntipps:
-1. Zuerst einmal ohne Untertitel hören und nur grob mitschreiben
-2. Beim zweiten Hören gezielt auf Details achten (Zahlen, Argumente, Beispiele)
-3. Schwierige Stellen mehrfach wiederholen, bis die Struktur klar ist
-4. Zum Schluss laut mitsprechen (Shadowing), um Aussprache und Rhythmus zu üben
+def render_estimate(container, estimate: JobEstimate):
+    """依過去的執行紀錄估計成品長度、耗時與字元數；還沒有紀錄的項目不顯示。"""
+    caption = "預估：" + format_estimate(estimate)
+    if estimate.learned_voices:
+        caption += f"\n語速與請求耗時依過去的執行紀錄（{'、'.join(estimate.learned_voices)}）。"
+    if estimate.synth_seconds is None:
+        caption += "\n這個 voice 還沒有足夠的執行紀錄，暫時只估計長度；合成幾份之後就會顯示耗時。"
+    container.caption(caption)
 
-💡 Bonus:  
-Zusammen mit **Language Reactor** im Browser kannst du Untertitel, Pausen und Wiederholungen noch besser steuern.
 
-Wenn dir dieses Hörtraining hilft, lass gerne einen Kommentar oder ein Abo da.
+@st.cache_resource
+def get_output_library() -> OutputLibrary:
+    library = OutputLibrary(DEFAULT_OUTPUT_DIR)
+    # 第一次啟動時把建立索引前就存在的輸出補進來
+    library.scan()
+    return library
 
-#TestDaF #DSH #telcC1 #GermanExam #Hörverstehen #DeutschfürStudium""",
-    # 德福 / 口語題型
-    "testdaf_speaking": """#TestDaF #Deutschlernen #Sprechen #GermanSpeaking
-📌 TestDaF Mündliche Prüfung – Sprechanlass / Antwortbausteine zum Mitsprechen
 
-Dieses Video ist für die Vorbereitung auf die mündliche Prüfung gedacht. Ideal für:
-✓ TestDaF-Aufgaben zur Beschreibung, Meinungsäußerung und Diskussion
-✓ Strukturierte Antwortbausteine (Einleitung – Argumente – Schluss)
-✓ Lautes Mitsprechen (Shadowing) für mehr Sicherheit im Ausdruck
+@st.cache_resource
+def get_run_history() -> RunHistory:
+    return RunHistory(DEFAULT_OUTPUT_DIR)
 
-🗣 Fokus: flüssiges, zusammenhängendes Sprechen in Prüfungssituationen  
-🎯 Ziel: typische Redemittel automatisieren, damit im Ernstfall mehr Kapazität fürs Denken bleibt
 
-💡 Lerntipps:
-1. Höre den Text zuerst komplett durch und achte auf Aufbau und Redemittel
-2. Spule zurück und sprich einzelne Sätze oder Abschnitte laut nach
-3. Pausiere das Video und versuche, ähnliche Antworten mit eigenen Inhalten zu formulieren
-4. Wiederhole das Ganze mehrmals an verschiedenen Tagen, damit die Strukturen im Kopf bleiben
+@st.cache_resource
+def get_job_manager() -> JobManager:
+    # 整個程序共用；工作在背景執行緒中進行，不受腳本重跑影響
+    return JobManager(DEFAULT_MAX_JOBS, library=get_output_library(), run_history=get_run_history())
 
- 
-Dieses Video lässt sich sehr gut zusammen mit dem Browser‑Add‑on **Language Reactor** verwenden (https://www.languagereactor.com/).  
-Damit kannst du Untertitel bequemer steuern, Vokabeln speichern und schwierige Stellen mehrfach im Kontext wiederholen.
 
-Wenn du dir mehr Vorlagen für mündliche Prüfungen wünschst, schreib es gern in die Kommentare.
+OUTPUT_KIND_LABELS = {
+    "audio": "音檔",
+    "video": "影片",
+    "subtitle": "字幕用文本",
+    "timing": "逐行時間戳文本",
+    "description": "說明欄文本",
+    "report": "效能報告",
+}
+OUTPUT_KIND_MIME = {"video": "video/mp4", "report": "application/json"}
 
-#TestDaF #MündlichePrüfung #DeutschSprechen #Redemittel #GermanOralExam""",
-    # 德福 / 書寫題型
-    "testdaf_writing": """#TestDaF #Deutschlernen #Schreiben #GermanWriting
-📌 TestDaF Schriftlicher Ausdruck – Mustertext / Formulierungshilfen
 
-In diesem Video wird ein Mustertext für die schriftliche Prüfung vorgelesen. Ideal für:
-✓ Vorbereitung auf den schriftlichen Ausdruck im TestDaF
-✓ Einüben von typischen Einleitungen, Überleitungen und Schlussformulierungen
-✓ Wiederkehrende Formulierungen für Argumentation, Beschreibung und Stellungnahme
+def render_library_entry(library: OutputLibrary, entry: LibraryEntry):
+    """輸出資料庫中的一份輸出：播放與重新下載各個檔案，不需要重新合成。"""
+    st.markdown(f"**{entry.title}** — `{entry.final_base}`")
+    st.caption(
+        f"{entry.voice or '未知 voice'}，{entry.audio_format}，約 {entry.audio_seconds / 60:.1f} 分鐘，"
+        f"{entry.total_bytes / 1024 / 1024:.1f} MB，已使用 {entry.use_count} 次"
+    )
+    if entry.audio_path and os.path.exists(entry.audio_path):
+        st.audio(entry.audio_path, format="audio/wav" if entry.audio_path.endswith(".wav") else "audio/mpeg")
+    columns = st.columns(3)
+    for i, (kind, path) in enumerate(entry.files.items()):
+        if not os.path.exists(path):
+            continue
+        with open(path, "rb") as f:
+            columns[i % 3].download_button(
+                f"下載{OUTPUT_KIND_LABELS.get(kind, kind)}",
+                data=f.read(),
+                file_name=os.path.basename(path),
+                mime=OUTPUT_KIND_MIME.get(kind, "audio/wav" if path.endswith(".wav") else None),
+                key=f"download_{entry.final_base}_{kind}",
+                on_click=library.touch,
+                args=(entry.final_base,),
+            )
 
-🗣 Sprecher: ruhige, deutliche Aussprache in Standarddeutsch  
-📄 Inhalt: prüfungsnaher Beispieltext, der sich gut als Vorlage oder Inspiration eignet
 
-💡 Lerntipps:
-1. Höre den Text einmal komplett, nur um Struktur und Aufbau zu verstehen
-2. Lies (oder höre) Abschnitt für Abschnitt und markiere dir nützliche Redemittel
-3. Versuche dann, mit denselben Bausteinen eigene Texte zu einem anderen Thema zu formulieren
-4. Nutze den Text zum laut Vorlesen, um Schriftbild und Aussprache gleichzeitig zu trainieren
+def render_library_browser(library: OutputLibrary):
+    """依標題或檔名搜尋之前的輸出，選一份重新播放或下載。"""
+    with st.expander("輸出資料庫（搜尋之前的輸出）", expanded=False):
+        query_col, voice_col, kind_col = st.columns([2, 1, 1])
+        query = query_col.text_input("搜尋標題或檔名：", key="library_query")
+        voice_filter = voice_col.selectbox("voice", ["全部"] + library.voices(), key="library_voice")
+        kind_filter = kind_col.selectbox("類型", ["全部", "有影片", "只有音檔"], key="library_kind")
+        entries = library.search(
+            query,
+            voice="" if voice_filter == "全部" else voice_filter,
+            with_video={"全部": None, "有影片": True, "只有音檔": False}[kind_filter],
+        )
+        if not entries:
+            st.caption("沒有符合的輸出。")
+            return
+        selected = st.selectbox(
+            f"找到 {len(entries)} 份（最新的在前面）：",
+            entries,
+            format_func=lambda entry: f"{entry.title}（{entry.final_base}）",
+            key="library_selected",
+        )
+        render_library_entry(library, selected)
+        if st.button("刪除這份輸出的所有檔案", key=f"library_remove_{selected.final_base}"):
+            library.remove(selected.final_base)
+            st.rerun()
 
-💡 Bonus:  
-Dieses Video lässt sich sehr gut zusammen mit dem Browser‑Add‑on **Language Reactor** verwenden (https://www.languagereactor.com/).  
-Damit kannst du Untertitel bequemer steuern, Vokabeln speichern und schwierige Stellen mehrfach im Kontext wiederholen.
 
-Wenn du mehr Beispieltexte für schriftliche Prüfungen brauchst, lass gern einen Kommentar oder ein Abo da.
-
-#TestDaF #SchriftlicherAusdruck #DeutschSchreiben #GermanWriting #DeutschPrüfung"""
+JOB_STAGE_LABELS = {
+    "synthesize": "Azure 正在合成",
+    "concat": "正在合併各段音檔為完整 MP3…",
+    "video": "正在用 ffmpeg 生成黑底影片…",
 }
+# 有工作在排隊或執行時，工作列表每隔幾秒自動更新
+JOB_POLL_SECONDS = 1.5
+
+
+def render_job(job: JobRecord, autoplay: bool):
+    label = STATUS_LABELS[job.status]
+    st.markdown(f"**{job.final_base}** — {label}")
+    if job.status == STATUS_RUNNING:
+        st.progress(job.progress)
+        stage = JOB_STAGE_LABELS.get(job.stage, "")
+        if job.stage == "synthesize":
+            stage = f"{stage}：已完成 {job.completed}/{job.segment_count} 段"
+        st.caption(f"{stage}（已執行 {job.elapsed_seconds:.0f} 秒）")
+    elif job.status == STATUS_QUEUED:
+        st.caption(f"共 {job.segment_count} 段，等待前面的工作完成。")
+    elif job.status == STATUS_FAILED:
+        st.error(job.error)
+        st.caption("已完成的段落都已保存，可在下方「可續傳的工作」只補合成未完成的段落。")
+    elif job.status == STATUS_DONE:
+        result = job.result
+        for warning in result.warnings:
+            st.warning(warning)
+        st.success(
+            f"語音合成完成（{job.elapsed_seconds:.0f} 秒），已輸出音檔：{result.audio_path}\n"
+            f"字幕用純文字檔：{result.subtitle_path}"
+            + (f"\n逐行時間戳文本：{result.timing_path}" if result.timing_path else "")
+            + (f"\nSRT / VTT 字幕：{result.srt_path}、{result.vtt_path}" if result.srt_path and result.vtt_path else "")
+        )
+        # 交給 st.audio 以檔案路徑提供，由 Streamlit 的媒體端點傳送，不再整檔 base64 進頁面
+        try:
+            audio_mime = "audio/wav" if result.audio_path.endswith(".wav") else "audio/mpeg"
+            st.audio(result.audio_path, format=audio_mime, autoplay=autoplay)
+        except Exception as e:
+            st.warning(f"音檔已產生，但讀取播放時發生錯誤：{e}")
+        if result.video_path:
+            st.success(f"影片生成完成（渲染 {result.render_seconds:.1f} 秒）：{result.video_path}")
+            st.video(result.video_path)
+        if result.report:
+            render_run_report(result.report, result.report_path)
+
+
+def render_run_report(report: dict, report_path: str):
+    totals = report["totals"]
+    latency = report["segment_latency"]
+    with st.expander("效能報告（各階段耗時）"):
+        st.caption(
+            f"總耗時 {totals['wall_seconds']:.1f} 秒，每秒處理 {totals['audio_seconds_per_wall_second']:.1f} 秒音訊；"
+            f"送出 {totals['chars_sent']} 字元，合成 {totals['segments_synthesized']} 段、"
+            f"快取 {totals['segments_cached']} 段、續傳沿用 {totals['segments_resumed']} 段。\n"
+            f"每段請求 p50 {latency['p50_seconds']:.2f} / p95 {latency['p95_seconds']:.2f} 秒"
+        )
+        st.table(
+            [
+                {
+                    "階段": timing["name"],
+                    "耗時（秒）": round(timing["wall_seconds"], 3),
+                    "字元": timing["chars"],
+                    "位元組": timing["bytes"],
+                    "音訊秒數": round(timing["audio_seconds"], 1),
+                }
+                for timing in report["stages"]
+            ]
+        )
+        st.caption(f"完整報告：{report_path}")
+
+
+def render_resumable_jobs(manager: JobManager, jobs, make_job_synthesizer, my_jobs):
+    """磁碟上還沒完成的工作清單檔（包含重新啟動前留下的），可以續傳或放棄。"""
+    active_bases = {job.final_base for job in jobs if job.is_active}
+    manifests = [m for m in find_resumable(DEFAULT_OUTPUT_DIR) if m.final_base not in active_bases]
+    if not manifests:
+        return
+    st.subheader("可續傳的工作")
+    for manifest in manifests:
+        with st.container(border=True):
+            st.markdown(f"**{manifest.final_base}** — 已完成 {manifest.done_count}/{len(manifest.segments)} 段")
+            if manifest.error:
+                st.caption(f"上次失敗原因：{manifest.error}")
+            failed = manifest.failed_segment
+            if failed is not None and failed.attempts > 1:
+                st.caption(f"第 {failed.index} 段已在 {failed.attempts} 次工作中失敗，可以先檢查這段的文字。")
+            resume_col, discard_col = st.columns(2)
+            if resume_col.button("繼續（只合成未完成的段落）", key=f"resume_{manifest.final_base}"):
+                synthesizer = make_job_synthesizer(manifest.spec.get("voice", ""), manifest.audio_format)
+                my_jobs.append(manager.resume(manifest, synthesizer))
+                st.rerun()
+            if discard_col.button("放棄並刪除分段檔", key=f"discard_{manifest.final_base}"):
+                manifest.remove()
+                st.rerun()
+
+
+def render_jobs_panel(manager: JobManager, make_job_synthesizer, my_jobs, autoplay_jobs, was_active: bool):
+    """工作列表；以 st.fragment 定期重跑，只更新這一區，不影響上方的輸入與設定。"""
+    jobs = manager.list_jobs()
+    if jobs:
+        st.subheader("工作列表")
+    mine = set(my_jobs)
+    for job in jobs:
+        with st.container(border=True):
+            render_job(job, autoplay=job.job_id in autoplay_jobs)
+            if job.status == STATUS_QUEUED and job.job_id in mine:
+                if st.button("取消", key=f"cancel_{job.job_id}"):
+                    manager.cancel(job.job_id)
+                    st.rerun()
+    render_resumable_jobs(manager, jobs, make_job_synthesizer, my_jobs)
+    # 所有工作都結束後整頁重跑一次：停止定期更新，並刷新側邊欄的快取統計
+    if was_active and not any(job.is_active for job in jobs):
+        st.rerun()
+
+
+def render_daemon_stats(url: str):
+    try:
+        with urllib.request.urlopen(f"{url.rstrip('/')}/stats", timeout=1.0) as response:
+            stats = json.loads(response.read().decode("utf-8"))
+    except (OSError, ValueError):
+        st.warning("目前連不到本機合成服務。")
+        return
+    if not stats:
+        st.caption("服務已啟動，尚未處理任何請求。")
+    for voice_name, pool in stats.items():
+        st.caption(
+            f"{voice_name}：{pool['sessions']}/{pool['size']} 個 session，已處理 {pool['requests']} 個請求。\n"
+            f"排隊 p50 {pool['queue_p50_ms']:.0f} ms；第一個音訊 p50 {pool['first_byte_p50_ms']:.0f} / "
+            f"p95 {pool['first_byte_p95_ms']:.0f} ms；完成 p50 {pool['total_p50_ms']:.0f} / "
+            f"p95 {pool['total_p95_ms']:.0f} ms"
+        )
 
-DEFAULT_YT_TEMPLATE_KEY = "general_listening"
 
-def get_speech_config() -> speechsdk.SpeechConfig:
+def get_speech_config(voice: str = "", audio_format: str = DEFAULT_AUDIO_FORMAT) -> speechsdk.SpeechConfig:
     # 優先從 Streamlit secrets 讀取
     key = st.secrets.get("SPEECH_KEY")
     region = st.secrets.get("SPEECH_REGION")
@@ -127,17 +350,8 @@ def get_speech_config() -> speechsdk.SpeechConfig:
         )
         st.stop()
 
-    speech_config = speechsdk.SpeechConfig(
-        subscription=key,
-        region=region,
-    )
-    # 預設德語女聲，可在 UI 中覆蓋
-    speech_config.speech_synthesis_voice_name = "de-DE-KatjaNeural"
-    # 直接輸出 MP3
-    speech_config.set_speech_synthesis_output_format(
-        speechsdk.SpeechSynthesisOutputFormat.Audio16Khz32KBitRateMonoMp3
-    )
-    return speech_config
+    # 未指定 voice 時使用預設德語女聲
+    return make_speech_config(key, region, voice, audio_format)
 
 
 def main():
@@ -194,84 +408,22 @@ def main():
         height=260,
     )
 
-    def clean_markdown(text: str) -> str:
-        """簡單清掉常見 Markdown 標記，保留純文字，並盡量保留原始換行。
-        特別處理：
-        - 保留第一個標題的內容（當成正文開頭），其他標題仍刪除。
-        - 去掉常見粗體標記、項目符號與 emoji bullet。
-        - 原文中的換行會盡量被保留為行分隔符。
-        """
-        lines = text.splitlines()
-        kept = []
-        first_heading_kept = False
-        for line in lines:
-            stripped = line.strip()
-            # 空行：保留為段落分隔（之後會變成一個空行）
-            if not stripped:
-                kept.append("")
-                continue
-            # 評分提示這類行直接丟掉
-            if stripped.startswith("✅"):
-                continue
-            # 標題處理
-            if stripped.startswith("#"):
-                # 只保留第一個標題的文字內容，其餘標題直接略過
-                if not first_heading_kept:
-                    heading_text = stripped.lstrip("#").strip()
-                    if heading_text:
-                        # 若標題末尾沒有句號等，補上一個句號，方便之後切句
-                        if not heading_text.endswith((".", "!", "?", "。", "！", "？")):
-                            heading_text += "."
-                        kept.append(heading_text)
-                    first_heading_kept = True
-                continue
-            # 分隔線 / 程式區塊標記
-            if stripped.startswith("---") or stripped.startswith("***"):
-                continue
-            if stripped.startswith("```"):
-                continue
-            # 去掉常見項目符號與 emoji bullet
-            stripped = re.sub(r"^[-*+•✅▶️✔️]\s*", "", stripped)
-            # 去掉粗體 / 斜體標記 **text** / *text*
-            stripped = re.sub(r"\*\*(.*?)\*\*", r"\1", stripped)
-            stripped = re.sub(r"\*(.*?)\*", r"\1", stripped)
-            kept.append(stripped)
-
-        # 以換行重新接回文字，以保留原本的行結構
-        joined = "\n".join(kept)
-        # 壓縮多餘的連續空白行（最多保留兩個換行）
-        joined = re.sub(r"\n{3,}", "\n\n", joined)
-        return joined
-
-    def split_sentences(text: str):
-        """改為只依原始換行切成「行」，不再用標點符號斷句。
-
-        原則：
-        - 每一行視為一個朗讀單位。
-        - 原本為空行的，保留為空字串，最後在顯示時仍是一個換行。
-        - 這樣可避免像「z.b.」這類包含句點的縮寫被誤切斷。
-        """
-        sentences = []
-        for line in text.splitlines():
-            # 直接保留原行（含空行），只做右側去除換行符號
-            sentences.append(line.rstrip("\n"))
-        return sentences
-
-    cleaned_text = clean_markdown(raw_markdown) if raw_markdown.strip() else ""
-
-    display_text = ""
-    sentences = []
-    if cleaned_text:
-        sentences = split_sentences(cleaned_text)
-        display_text = "\n".join(sentences)
-
-    # ====== 長文本提示與分段設定（自動依句數切割） ======
-    segmentation_mode = "single"  # "single" 或 "auto"
-    sentences_per_segment = 5
-    word_count = 0
+    # 清洗與分段都在 tts_pipeline.py，批次命令列也共用同一套
+    prepared = prepare_text(raw_markdown)
+    cleaned_text = prepared.cleaned_text
+    sentences = prepared.sentences
+    display_text = prepared.display_text
 
-    if cleaned_text:
-        word_count = len(cleaned_text.split())
+    # ====== 長文本提示與分段設定（依估計長度打包，或依句數切割） ======
+    segmentation_mode = "single"  # "single"、"auto" 或 "packed"
+    sentences_per_segment = 5
+    max_segment_seconds = DEFAULT_SEGMENT_SECONDS
+    max_segment_chars = DEFAULT_SEGMENT_CHARS
+    shadowing_repeats = 1
+    shadowing_gap_ms = DEFAULT_SHADOWING_GAP_MS
+    segment_plan_box = None
+    estimate_box = None
+    word_count = prepared.word_count
 
     if sentences:
         st.info(
@@ -280,10 +432,28 @@ def main():
         )
         seg_choice = st.radio(
             "長文本處理方式：",
-            ["整篇一次合成", "自動分段（建議）"],
-            index=1,
+            ["整篇一次合成", "依句數分段", "依估計長度打包（建議）"],
+            index=2,
         )
-        if seg_choice == "自動分段（建議）":
+        if seg_choice == "依估計長度打包（建議）":
+            segmentation_mode = "packed"
+            max_segment_seconds = st.slider(
+                "每段目標長度上限（秒）",
+                min_value=30,
+                max_value=540,
+                value=DEFAULT_SEGMENT_SECONDS,
+                step=30,
+                help="依字元數與 voice 語速估算每行的朗讀秒數，整行整行塞進同一段直到接近上限；不會把一行切開。"
+                "段數愈少，每次請求的固定開銷愈少；但併發合成時段數太少也會降低平行度。",
+            )
+            max_segment_chars = st.number_input(
+                "每段字元上限",
+                min_value=200,
+                max_value=10_000,
+                value=DEFAULT_SEGMENT_CHARS,
+                step=100,
+            )
+        elif seg_choice == "依句數分段":
             segmentation_mode = "auto"
             sentences_per_segment = st.slider(
                 "每段大約幾句？（較小較安全）",
@@ -293,10 +463,22 @@ def main():
                 step=1,
                 help="程式會依序每 N 句切一段，最後一段可能略短。句數愈少，單段長度愈安全。",
             )
-            approx_segments = max(1, (len(sentences) + sentences_per_segment - 1) // sentences_per_segment)
-            st.caption(
-                f"目前預估會切成約 {approx_segments} 段（實際依句數微調）。"
+        if st.checkbox(
+            "跟讀模式（每行重複數次，中間留停頓）",
+            help="相同的行只向 Azure 合成一次，重複與停頓都在本機串接，不會多花額度。"
+            "開啟後每個不重複的行自成一段，上面的分段方式不再適用。",
+        ):
+            shadowing_repeats = st.slider("每行重複次數", min_value=2, max_value=5, value=2, step=1)
+            shadowing_gap_ms = st.slider(
+                "每次重複後的停頓（毫秒）",
+                min_value=500,
+                max_value=8000,
+                value=DEFAULT_SHADOWING_GAP_MS,
+                step=250,
             )
+        # voice 在側邊欄之後才選，預估段數與長度等選完 voice 再填進來
+        segment_plan_box = st.empty()
+        estimate_box = st.empty()
 
     combined_for_description = ""
     if display_text:
@@ -338,9 +520,29 @@ def main():
         # 最終要拿來送給 Azure 的 voice 名稱
         voice = custom_voice if custom_voice.strip() else voice_options[selected_voice_label]
 
+        # 對話模式：文本中有 `A:` / `B:` 這類說話者標籤時，每個說話者各選一個 voice
+        dialogue_voices = {}
+        speakers = detect_speakers(sentences)
+        if speakers and st.checkbox(
+            f"對話模式（偵測到說話者：{'、'.join(speakers)}）",
+            value=False,
+            help="每個說話者的所有台詞合併成盡量少的請求、不同 voice 同時合成，再依原稿順序接起來；"
+            "標籤不會唸出來，字幕用文本仍保留標籤。沒有標籤的行用上面選的 voice。",
+        ):
+            speaker_voice_choices = [v for v in voice_options.values() if v != "custom"]
+            if voice not in speaker_voice_choices:
+                speaker_voice_choices.insert(0, voice)
+            for i, speaker in enumerate(speakers):
+                dialogue_voices[speaker] = st.selectbox(
+                    f"「{speaker}」的 voice：",
+                    speaker_voice_choices,
+                    index=i % len(speaker_voice_choices),
+                    key=f"dialogue_voice_{speaker}",
+                )
+
         mode = st.radio(
             "輸出類型：",
-            ["只產生 MP3 音檔", "產生黑底 MP4 影片"],
+            ["只產生音檔", "產生黑底 MP4 影片"],
             index=1,  # 預設改為「產生黑底 MP4 影片」
         )
 
@@ -352,11 +554,92 @@ def main():
             step=1,
         )
 
+        video_profile_labels = {profile.label: key for key, profile in VIDEO_PROFILES.items()}
+        selected_video_profile_label = st.selectbox(
+            "影片輸出設定檔（僅影響 MP4）：",
+            list(video_profile_labels.keys()),
+            index=list(video_profile_labels.values()).index(DEFAULT_VIDEO_PROFILE),
+            help="黑底畫面不會動，靜態畫面設定檔以每秒 1 張畫面編碼，音訊直接複製不重新編碼，速度快很多。"
+            "「逐行字幕」依字幕時間把目前這行顯示在畫面中央，每行只編碼一張畫面；需要 Pillow。",
+        )
+        video_profile_key = video_profile_labels[selected_video_profile_label]
+
+        audio_quality = st.selectbox(
+            "音訊品質：",
+            list(QUALITY_LABELS.keys()),
+            index=list(QUALITY_LABELS.keys()).index(DEFAULT_AUDIO_QUALITY),
+            format_func=QUALITY_LABELS.get,
+            help="依輸出類型向 Azure 要求對應格式：影片與音檔用 MP3（影片直接放進 MP4、不重新編碼），"
+            "品質越高檔案越大、下載越久。",
+        )
+        wav_output = st.checkbox(
+            "輸出 WAV（PCM，無壓縮，適合後製）",
+            value=False,
+            help="音檔改為無損的 WAV；搭配影片時，音訊在放進 MP4 時編碼一次成 AAC。無法邊合成邊播放。",
+        )
+        postprocess = st.checkbox(
+            "PCM 後製（統一段間停頓、整條音量正規化）",
+            value=False,
+            help="向 Azure 要 PCM，去掉各段前後多餘的靜音、接點改成固定停頓，整條音軌調整到相同響度後只編碼一次。"
+            "需要 NumPy；輸出 MP3 / 影片時另外需要 ffmpeg。無法邊合成邊播放。",
+        )
+        post_gap_ms = DEFAULT_BREAK_MS
+        post_loudness_db = DEFAULT_LOUDNESS_DB
+        if postprocess:
+            if not postprocess_available():
+                st.warning("沒有安裝 NumPy（pip install numpy），本次會略過後製。")
+            post_gap_ms = st.slider("段與段之間的停頓（毫秒）：", min_value=0, max_value=2000, value=DEFAULT_BREAK_MS, step=50)
+            post_loudness_db = st.slider(
+                "目標響度（dB，0 表示不調整）：",
+                min_value=-30.0,
+                max_value=0.0,
+                value=DEFAULT_LOUDNESS_DB,
+                step=1.0,
+                help="閘控後的平均響度（相對滿刻度）；增益受峰值上限 -1 dB 限制，不會削波。",
+            )
+        audio_format_box = st.empty()
+
+        max_concurrent_segments = st.slider(
+            "同時合成段數（併發上限）：",
+            min_value=1,
+            max_value=8,
+            value=DEFAULT_MAX_WORKERS,
+            step=1,
+            help="同時送給 Azure 的分段請求數。免費層（F0）請求頻率有限，遇到被取消時可調低。",
+        )
+
+        merge_in_memory = st.checkbox(
+            "分段音訊直接在記憶體中合併（不寫暫存檔、不需 ffmpeg）",
+            value=True,
+            help="取消勾選則改用舊流程：各段先寫成暫存 MP3，再用 ffmpeg concat 合併。",
+        )
+
+        use_ssml = st.checkbox(
+            "以 SSML 送出（行間停頓 + 每行時間戳）",
+            value=True,
+            help="每行前放 bookmark、行與行之間放停頓，另外輸出每行附開始時間的 <檔名>_timed.txt。",
+        )
+        line_break_ms = st.slider(
+            "行與行之間的停頓（毫秒）：",
+            min_value=0,
+            max_value=1500,
+            value=DEFAULT_BREAK_MS,
+            step=50,
+            disabled=not use_ssml,
+        )
+
         auto_play = st.checkbox(
             "合成完成後在網頁中立即朗讀（自動播放，可暫停/繼續）",
             value=True,
         )
 
+        progressive_playback = st.checkbox(
+            "邊合成邊播放（第一段完成就開始朗讀，需在本機瀏覽器開啟）",
+            value=True,
+            help="分段依序完成時就送進播放器，不必等整份合成與合併結束；"
+            "音訊由本機 127.0.0.1 的串流伺服器提供，從其他電腦連線時請取消勾選。",
+        )
+
         base_name = st.text_input(
             "自訂檔名前綴（選填，不填時會用 Markdown 第一個標題 + 時間戳）：",
             value="",
@@ -373,238 +656,245 @@ def main():
 
         st.markdown("---")
         with st.expander("文字用量（點我展開 / 收合）", expanded=False):
-            char_count = len(cleaned_text)
-            monthly_free_chars = 500_000  # F0 / Free Tier 每月約 0.5M 字元
-            if char_count > 0:
-                ratio = char_count / monthly_free_chars * 100
-                st.info(
-                    f"本次送給 Azure 的文字約 {char_count} 個字元。\n"
-                    f"若以每月免費 {monthly_free_chars:,} 字元計算，約占理論免費額度的 {ratio:.2f}%。"
-                )
-            else:
-                st.write("目前還沒有可送給 Azure 的文字。")
+            tier_key = st.selectbox(
+                "Azure 資源層級：",
+                list(TIERS),
+                index=list(TIERS).index(DEFAULT_TIER),
+                format_func=lambda key: TIERS[key].label,
+                help="每個送給 Azure 的請求都要先通過限速：F0 每 60 秒 20 個、S0 每秒 200 個，"
+                "併發或批次合成時不會因為超過限制而連續被取消。",
+            )
+            monthly_budget_chars = st.number_input(
+                "每月字元預算（0 表示不檢查）：",
+                min_value=0,
+                max_value=100_000_000,
+                value=TIERS[tier_key].monthly_free_chars,
+                step=50_000,
+            )
+            # 這份工作實際要送出的字元數要等分段之後才知道，先留位置
+            usage_box = st.empty()
+
+        with st.expander("分段快取（點我展開 / 收合）", expanded=False):
+            use_segment_cache = st.checkbox(
+                "重複的分段直接使用快取音檔（不再送給 Azure）",
+                value=True,
+                help="以 voice、輸出格式與分段文字計算雜湊；只改了部分文字時，只有變動的分段會重新合成。",
+            )
+            cache_limit_mb = st.number_input(
+                "快取容量上限（MB，超過時刪除最久沒用到的分段）：",
+                min_value=10,
+                max_value=10_000,
+                value=DEFAULT_MAX_BYTES // (1024 * 1024),
+                step=10,
+            )
+            segment_cache = get_segment_cache()
+            segment_cache.set_max_bytes(int(cache_limit_mb) * 1024 * 1024)
+            if st.button("清空分段快取"):
+                segment_cache.clear()
+            cache_stats_box = st.empty()
+            render_cache_stats(cache_stats_box, segment_cache)
+
+        with st.expander("輸出資料庫（點我展開 / 收合）", expanded=False):
+            reuse_outputs = st.checkbox(
+                "內容與設定都相同時直接取用之前的輸出（不重新合成）",
+                value=True,
+                help="以清洗後文本的雜湊加上 voice、音訊格式、分段與影片等設定比對；"
+                "之前的輸出檔都還在時，直接顯示舊的結果。",
+            )
+            library_limit_mb = st.number_input(
+                "輸出資料夾容量上限（MB，0 表示不限制）：",
+                min_value=0,
+                max_value=1_000_000,
+                value=DEFAULT_LIBRARY_MAX_BYTES // (1024 * 1024),
+                step=500,
+            )
+            eviction_policy = st.selectbox(
+                "超過上限時：",
+                list(EVICTION_POLICIES),
+                index=list(EVICTION_POLICIES).index(DEFAULT_EVICTION_POLICY),
+                format_func=EVICTION_POLICIES.get,
+            )
+            output_library = get_output_library()
+            evicted = output_library.set_quota(int(library_limit_mb) * 1024 * 1024, eviction_policy)
+            if evicted:
+                st.warning(f"已依容量上限刪除 {len(evicted)} 份輸出。")
+            library_stats = output_library.stats()
+            st.caption(
+                f"目前 {library_stats['entries']} 份輸出，共 {library_stats['bytes'] / 1024 / 1024:.1f} MB、"
+                f"{library_stats['audio_seconds'] / 3600:.1f} 小時音訊。"
+            )
+
+        with st.expander("本機合成服務（點我展開 / 收合）", expanded=False):
+            use_daemon = st.checkbox(
+                "使用本機合成服務（synth_daemon.py）",
+                value=False,
+                help="先在終端機執行 `python synth_daemon.py --voices de-DE-KatjaNeural`；"
+                "服務會保留預先連線好的合成 session，每段不必重新連線。",
+            )
+            daemon_url = st.text_input("服務網址：", value=DEFAULT_DAEMON_URL, disabled=not use_daemon)
+            if use_daemon:
+                render_daemon_stats(daemon_url)
+
+    spec = JobSpec(
+        raw_markdown=raw_markdown,
+        voice=voice,
+        base_name=base_name,
+        segmentation=segmentation_mode,
+        sentences_per_segment=sentences_per_segment,
+        max_segment_seconds=max_segment_seconds,
+        max_segment_chars=int(max_segment_chars),
+        max_workers=max_concurrent_segments,
+        merge_in_memory=merge_in_memory,
+        use_ssml=use_ssml,
+        line_break_ms=line_break_ms,
+        make_video=mode == "產生黑底 MP4 影片",
+        video_lead_seconds=video_lead_seconds,
+        video_profile=video_profile_key,
+        audio_quality=audio_quality,
+        wav_output=wav_output,
+        postprocess=postprocess,
+        post_gap_ms=post_gap_ms,
+        post_loudness_db=post_loudness_db,
+        dialogue_voices=dialogue_voices,
+        shadowing_repeats=shadowing_repeats,
+        shadowing_gap_ms=shadowing_gap_ms,
+    )
+    audio_format = job_audio_format(spec)
+    output_format = job_output_format(spec)
+    audio_format_box.caption(
+        f"輸出格式：{output_format.label}（每分鐘約 {output_format.megabytes_per_minute():.2f} MB）"
+        + (f"；向 Azure 要 {audio_format.label}，後製完才編碼" if audio_format != output_format else "")
+    )
+    segment_plan = prepared.plan(spec)
+    if segment_plan_box is not None and segment_plan.is_dialogue:
+        track_voices = [segment_plan.voices[seg - 1] for _line, seg in segment_plan.track]
+        turns = sum(1 for i, v in enumerate(track_voices) if i == 0 or v != track_voices[i - 1])
+        segment_plan_box.caption(
+            f"對話模式：{len(set(segment_plan.voices))} 個 voice、{len(track_voices)} 行、換人說話 {turns} 次；"
+            f"同一個 voice 的台詞打包在一起，只需 {len(segment_plan.segments)} 個請求。"
+            f"最長一段約 {segment_plan.largest_seconds:.0f} 秒。"
+        )
+    elif segment_plan_box is not None and segment_plan.track:
+        sent_chars = sum(len(segment) for segment in segment_plan.segments)
+        spoken_chars = sum(len(sentences[line]) for line, _seg in segment_plan.track) * shadowing_repeats
+        track_seconds = sum(segment_plan.estimated_seconds[seg - 1] for _line, seg in segment_plan.track)
+        gap_seconds = segment_plan.spoken_lines * shadowing_gap_ms / 1000
+        segment_plan_box.caption(
+            f"跟讀模式：{segment_plan.spoken_lines} 行中有 {len(segment_plan.segments)} 行不重複，只合成這些行；"
+            f"送出約 {sent_chars} 字元（不去重複、每次重複都合成則約 {spoken_chars} 字元）。"
+            f"成品總長約 {(track_seconds + gap_seconds) * shadowing_repeats / 60:.1f} 分鐘。"
+        )
+    elif segment_plan_box is not None:
+        caption = (
+            f"目前預估會切成 {len(segment_plan.segments)} 段，總長約 {segment_plan.total_seconds / 60:.1f} 分鐘；"
+            f"最長一段約 {segment_plan.largest_seconds:.0f} 秒（{segment_plan.largest_chars} 字元）。"
+        )
+        if segment_plan.largest_seconds > AZURE_MAX_SECONDS_PER_CALL:
+            segment_plan_box.warning(caption + "\n最長一段超過 Azure 單次約 10 分鐘的上限，建議調小每段長度或在長行中加入換行。")
+        else:
+            segment_plan_box.caption(caption)
+
+    if estimate_box is not None and segment_plan.segments:
+        render_estimate(estimate_box, get_run_history().estimate(spec, sentences, segment_plan, TIERS[tier_key]))
+
+    usage_ledger = get_usage_ledger()
+    rate_limiter = get_rate_limiter(tier_key)
+    job_chars = job_billable_chars(spec, sentences, segment_plan)
+    render_usage(usage_box, usage_ledger, usage_key_id(), int(monthly_budget_chars), job_chars, rate_limiter)
 
     # 產生 YouTube 說明欄文本（顯示在主區）
     if display_text and 'add_description' in locals() and add_description:
-        template_body = YOUTUBE_DESCRIPTION_TEMPLATES.get(
-            selected_description_template_key,
-            YOUTUBE_DESCRIPTION_TEMPLATES[DEFAULT_YT_TEMPLATE_KEY],
-        )
-        combined_for_description = f"{display_text}\n\n\n{template_body}"
+        combined_for_description = build_description(display_text, selected_description_template_key)
         st.text_area(
             "YouTube 說明欄（已包含本次文本與固定說明，可直接複製）：",
             value=combined_for_description,
             height=260,
         )
 
-    if start_clicked:
-        if not cleaned_text.strip():
-            st.error("請先輸入要轉成語音的 Markdown 文本。")
-            return
-
-        # 根據 Markdown 第一個標題 + 時間戳產生檔名基底
-        heading_match = re.search(r"^\s*#+\s+(.*)$", raw_markdown, flags=re.MULTILINE)
-        heading = heading_match.group(1).strip() if heading_match else "output"
-
-        # 使用者如有自訂前綴，優先使用
-        base_label = base_name.strip() if base_name.strip() else heading
-
-        # 簡單清理檔名：移除不適合的符號
-        def sanitize_filename(s: str) -> str:
-            s = s.strip()
-            # 只保留常見安全字元，其餘用底線代替
-            return "".join(
-                (c if c.isalnum() or c in " _-一二三四五六七八九零〇壹貳參肆伍陸柒捌玖拾百千萬億" else "_")
-                for c in s
-            ).replace(" ", "_")
-
-        safe_label = sanitize_filename(base_label) or "output"
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        final_base = f"{safe_label}_{timestamp}"
-
-        # 輸出資料夾
-        output_dir = "azure_outputs"
-        os.makedirs(output_dir, exist_ok=True)
-
-        audio_filename = os.path.join(output_dir, f"{final_base}.mp3")
-        video_filename = os.path.join(output_dir, f"{final_base}.mp4")
-        subtitle_txt_filename = os.path.join(output_dir, f"{final_base}.txt")
-
-        # 將清洗後、每句一行的文本輸出成 .txt，方便餵給 YouTube 做字幕
-        if display_text:
-            try:
-                with open(subtitle_txt_filename, "w", encoding="utf-8") as f:
-                    f.write(display_text)
-            except Exception as e:
-                st.warning(f"輸出字幕用文本檔時發生錯誤：{e}")
-
-        # 準備 Azure TTS
-        speech_config = get_speech_config()
-        if voice:
-            speech_config.speech_synthesis_voice_name = voice
-
-        # 準備要送進 TTS 的分段文本
-        def build_segments_auto(all_sentences, per_segment: int):
-            if not all_sentences:
-                return []
-            if per_segment <= 0:
-                return [" ".join(all_sentences).strip()]
-            segments = []
-            total = len(all_sentences)
-            start = 0
-            while start < total:
-                end = min(start + per_segment, total)
-                segments.append(" ".join(all_sentences[start:end]).strip())
-                start = end
-            return [s for s in segments if s]
-
-        # 依長文本模式決定分段；否則整篇一次送出
-        tts_segments = []
-        if segmentation_mode == "auto" and sentences:
-            tts_segments = build_segments_auto(sentences, sentences_per_segment)
-        else:
-            # 退而求其次，以 cleaned_text 當作單一段
-            tts_segments = [cleaned_text]
-
-        if not tts_segments:
-            st.error("沒有可用來語音合成的文本分段。")
-            return
-
-        st.info(f"本次將分成 {len(tts_segments)} 段進行語音合成。")
-
-        # 逐段合成，輸出多個臨時音檔，再之後合併
-        part_files = []
-        progress_bar = st.progress(0)
-
-        for idx, segment in enumerate(tts_segments, start=1):
-            part_path = os.path.join(output_dir, f"{final_base}_part_{idx:03d}.mp3")
-            audio_config_part = speechsdk.audio.AudioConfig(filename=part_path)
-            synthesizer_part = speechsdk.SpeechSynthesizer(
-                speech_config=speech_config,
-                audio_config=audio_config_part,
+    job_manager = get_job_manager()
+
+    def make_job_synthesizer(job_voice: str, audio_format_key: str):
+        cache = segment_cache if use_segment_cache else None
+        meter = UsageMeter(rate_limiter, usage_ledger, usage_key_id())
+        if use_daemon:
+            if not daemon_available(daemon_url):
+                st.error(f"無法連線到本機合成服務 {daemon_url}，請先執行 `python synth_daemon.py`，或取消勾選。")
+                st.stop()
+            return make_daemon_synthesizer(daemon_url, job_voice, cache, audio_format_key, meter)
+        # 準備 Azure TTS（st.secrets 只能在腳本執行緒讀取，先建好再交給背景工作）
+        return make_synthesizer(get_speech_config(job_voice, audio_format_key), cache, audio_format_key, meter)
+    my_jobs = st.session_state.setdefault("my_jobs", [])
+    autoplay_jobs = st.session_state.setdefault("autoplay_jobs", set())
+
+    tts_segments = segment_plan.segments
+    reused = output_library.find(spec) if start_clicked and reuse_outputs and tts_segments else None
+    if start_clicked and not cleaned_text.strip():
+        st.error("請先輸入要轉成語音的 Markdown 文本。")
+    elif start_clicked and not tts_segments:
+        st.error("沒有可用來語音合成的文本分段。")
+    elif start_clicked and reused is not None:
+        # 相同內容與設定之前已經做過：直接取用舊的輸出，不送給 Azure
+        output_library.touch(reused.final_base)
+        st.session_state["reused_output"] = reused.final_base
+        st.info(f"之前已用相同的文字與設定產生過：{reused.final_base}，直接取用，不重新合成。")
+    elif start_clicked:
+        # 根據自訂前綴或 Markdown 第一個標題 + 時間戳產生檔名基底
+        final_base = make_final_base(raw_markdown, base_name)
+
+        synthesizer = make_job_synthesizer(voice, audio_format.key)
+        warning = budget_warning(usage_ledger, usage_key_id(), int(monthly_budget_chars), job_chars)
+        if warning:
+            st.warning(warning)
+
+        # 邊合成邊播放：背景工作每段依序完成就推進串流，播放器在下方顯示（串流只支援 MP3）
+        live_stream = None
+        if progressive_playback and audio_format.container == "mp3":
+            stream_server = get_stream_server()
+            live_stream = stream_server.create_stream()
+
+        job_id = job_manager.submit(
+            spec,
+            synthesizer,
+            final_base=final_base,
+            on_audio=(lambda _idx, output: live_stream.push_mp3(output.audio_data)) if live_stream is not None else None,
+            on_finish=live_stream.close if live_stream is not None else None,
+        )
+        my_jobs.append(job_id)
+        st.session_state.pop("reused_output", None)
+        if live_stream is not None:
+            st.session_state["live_player"] = (job_id, stream_server.url_for(live_stream))
+        elif auto_play:
+            autoplay_jobs.add(job_id)
+        st.info(f"已送出背景工作：{final_base}（{len(tts_segments)} 段）。可以繼續編輯或送出下一份。")
+
+    # 最近一份邊合成邊播放的工作：重跑時參數不變，播放器不會重新載入，播放也不會中斷；
+    # 工作結束後串流仍保留在伺服器上，可以從頭重播，直到送出下一份工作
+    live_player = st.session_state.get("live_player")
+    if live_player is not None:
+        live_job = job_manager.get(live_player[0])
+        if live_job is not None:
+            st.caption(f"邊合成邊播放：{live_job.final_base}")
+            components.html(
+                f"""
+                <audio controls {"autoplay" if auto_play else ""} src="{live_player[1]}">
+                    Your browser does not support the audio element.
+                </audio>
+                """,
+                height=80,
             )
 
-            with st.spinner(f"Azure 正在合成第 {idx}/{len(tts_segments)} 段…"):
-                result = synthesizer_part.speak_text_async(segment).get()
-
-            if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
-                part_files.append(part_path)
-                progress_bar.progress(idx / len(tts_segments))
-            elif result.reason == speechsdk.ResultReason.Canceled:
-                cancellation = result.cancellation_details
-                st.error(
-                    f"第 {idx} 段合成被取消：{cancellation.reason} - {cancellation.error_details}"
-                )
-                return
-            else:
-                st.error(f"第 {idx} 段合成結果未知：{result.reason}")
-                return
-
-        progress_bar.progress(1.0)
-
-        # 所有分段皆成功合成後，使用 ffmpeg concat 模式合併為一個完整 MP3
-        concat_list_path = os.path.join(output_dir, f"{final_base}_concat_list.txt")
-        try:
-            with open(concat_list_path, "w", encoding="utf-8") as f:
-                for part in part_files:
-                    # ffmpeg concat 檔案列表格式：file 'path'
-                    f.write(f"file '{os.path.abspath(part)}'\n")
-
-            with st.spinner("正在合併各段音檔為完整 MP3…"):
-                subprocess.run(
-                    [
-                        "ffmpeg",
-                        "-y",
-                        "-f",
-                        "concat",
-                        "-safe",
-                        "0",
-                        "-i",
-                        concat_list_path,
-                        "-c",
-                        "copy",
-                        audio_filename,
-                    ],
-                    stdin=subprocess.DEVNULL,
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL,
-                    check=True,
-                )
-            # 合併成功後，清理中間切片檔與清單檔，只保留完整 MP3
-            for part in part_files:
-                try:
-                    os.remove(part)
-                except Exception:
-                    pass
-            try:
-                os.remove(concat_list_path)
-            except Exception:
-                pass
-        except subprocess.CalledProcessError as e:
-            st.error(f"合併分段音檔時 ffmpeg 發生錯誤：{e}")
-            return
-        except Exception as e:
-            st.error(f"合併分段音檔時發生錯誤：{e}")
-            return
+    reused_base = st.session_state.get("reused_output")
+    reused_entry = output_library.get(reused_base) if reused_base else None
+    if reused_entry is not None:
+        with st.container(border=True):
+            render_library_entry(output_library, reused_entry)
 
-        st.success(
-            f"語音合成完成，已輸出音檔：{audio_filename}\n"
-            f"字幕用純文字檔：{subtitle_txt_filename}"
-        )
+    render_library_browser(output_library)
 
-        # 播放 MP3（只顯示一個播放器；若勾選自動播放則用 HTML5 autoplay，否則用 st.audio）
-        try:
-            with open(audio_filename, "rb") as f:
-                audio_bytes = f.read()
-
-            if auto_play:
-                b64_audio = base64.b64encode(audio_bytes).decode("utf-8")
-                components.html(
-                    f"""
-                    <audio controls autoplay>
-                        <source src="data:audio/mpeg;base64,{b64_audio}" type="audio/mpeg">
-                        Your browser does not support the audio element.
-                    </audio>
-                    """,
-                    height=80,
-                )
-            else:
-                st.audio(audio_bytes, format="audio/mp3")
-        except Exception as e:
-            st.warning(f"音檔已產生，但讀取播放時發生錯誤：{e}")
-
-        # 若選擇產生影片，呼叫 ffmpeg 做黑底影片（使用合併後的完整音檔）
-        if mode == "產生黑底 MP4 影片":
-            video_progress = st.progress(0)
-            with st.spinner("正在用 ffmpeg 生成黑底影片…"):
-                try:
-                    # 將音訊延遲指定秒數，使影片開頭先有幾秒無聲畫面
-                    delay_ms = int(locals().get("video_lead_seconds", 5) * 1000)
-                    subprocess.run(
-                        [
-                            "ffmpeg",
-                            "-y",
-                            "-f",
-                            "lavfi",
-                            "-i",
-                            "color=c=black:s=1920x1080:r=30",
-                            "-i",
-                            audio_filename,
-                            "-af",
-                            f"adelay={delay_ms}|{delay_ms}",
-                            "-shortest",
-                            video_filename,
-                        ],
-                        stdin=subprocess.DEVNULL,
-                        stdout=subprocess.DEVNULL,
-                        stderr=subprocess.DEVNULL,
-                        check=True,
-                    )
-                    video_progress.progress(100)
-                    st.success(f"影片生成完成：{video_filename}")
-                    st.video(video_filename)
-                except subprocess.CalledProcessError as e:
-                    st.error(f"生成影片時 ffmpeg 發生錯誤：{e}")
+    active = job_manager.has_active()
+    st.fragment(run_every=JOB_POLL_SECONDS if active else None)(render_jobs_panel)(
+        job_manager, make_job_synthesizer, my_jobs, autoplay_jobs, active
+    )
 
 
 if __name__ == "__main__":
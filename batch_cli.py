@@ -0,0 +1,401 @@
+"""批次命令列：一次處理整個資料夾（或 glob）的 Markdown 檔，不必逐篇貼進瀏覽器。
+
+輸出與網頁介面相同（MP3 / MP4 / 字幕用 .txt），另外可輸出 YouTube 說明欄文字檔。
+Azure 金鑰優先讀環境變數 `SPEECH_KEY` / `SPEECH_REGION`，
+沒有時讀 `.streamlit/secrets.toml`。
+
+用法：
+    python batch_cli.py notes/ --jobs 2
+    python batch_cli.py "week42/*.md" --voice de-DE-ConradNeural --mp3-only
+    python batch_cli.py notes/ --template testdaf_listening --profile still_720p
+    python batch_cli.py notes/ --mp3-only --quality high     # 48 kHz / 192 kbps MP3
+    python batch_cli.py vocab.md --mp3-only --repeat 3 --gap-ms 2500   # 跟讀：每行唸 3 次
+    python batch_cli.py dialog.md --dialogue A=de-DE-KatjaNeural,B=de-DE-ConradNeural
+    python batch_cli.py notes/ --postprocess --post-gap-ms 400   # PCM 後製：統一段間停頓與音量
+    python batch_cli.py --resume    # 續傳輸出資料夾中所有未完成的工作
+    python batch_cli.py notes/ --estimate   # 只依過去的執行紀錄估計長度、耗時與字元數
+"""
+import argparse
+import glob
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List
+
+from audio_formats import DEFAULT_AUDIO_QUALITY, QUALITY_LABELS
+from azure_backend import DEFAULT_VOICE, make_daemon_synthesizer, make_speech_config, make_synthesizer
+from dialogue import parse_voice_map
+from job_manager import format_job_error
+from job_manifest import find_resumable
+from output_library import DEFAULT_EVICTION_POLICY, EVICTION_POLICIES, OutputLibrary
+from pcm_post import DEFAULT_LOUDNESS_DB
+from run_history import RunHistory, format_estimate
+from segment_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, SegmentCache
+from ssml_builder import DEFAULT_BREAK_MS
+from synth_daemon import DEFAULT_DAEMON_URL, daemon_available
+from tts_engine import DEFAULT_MAX_WORKERS
+from tts_pipeline import (
+    DEFAULT_OUTPUT_DIR,
+    DEFAULT_SEGMENT_CHARS,
+    DEFAULT_SEGMENT_SECONDS,
+    DEFAULT_SHADOWING_GAP_MS,
+    JobSpec,
+    job_audio_format,
+    job_billable_chars,
+    make_final_base,
+    prepare_text,
+    resume_job,
+    run_job,
+    spec_from_manifest,
+)
+from usage_quota import DEFAULT_TIER, TIERS, UsageLedger, UsageMeter, budget_warning, key_fingerprint, ledger_path, make_bucket
+from video_render import DEFAULT_VIDEO_PROFILE, VIDEO_PROFILES
+from youtube_templates import YOUTUBE_DESCRIPTION_TEMPLATES
+
+
+SECRETS_PATH = os.path.join(".streamlit", "secrets.toml")
+
+
+def load_credentials():
+    key = os.environ.get("SPEECH_KEY")
+    region = os.environ.get("SPEECH_REGION")
+    if (not key or not region) and os.path.exists(SECRETS_PATH):
+        try:
+            import tomllib
+        except ImportError:  # Python < 3.11
+            tomllib = None
+        if tomllib is not None:
+            with open(SECRETS_PATH, "rb") as f:
+                secrets = tomllib.load(f)
+            key = key or secrets.get("SPEECH_KEY")
+            region = region or secrets.get("SPEECH_REGION")
+    if not key or not region:
+        raise SystemExit(
+            "找不到 Azure TTS 金鑰設定。\n"
+            "請設定環境變數 SPEECH_KEY 和 SPEECH_REGION，或在 .streamlit/secrets.toml 中設定。"
+        )
+    return key, region
+
+
+def collect_inputs(patterns: List[str]) -> List[str]:
+    """資料夾展開成其中的 .md 檔；其餘當作 glob。去除重複並保持順序。"""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = sorted(glob.glob(os.path.join(pattern, "*.md")))
+        else:
+            matches = sorted(glob.glob(pattern, recursive=True))
+        paths.extend(p for p in matches if os.path.isfile(p))
+    return list(dict.fromkeys(paths))
+
+
+def print_estimates(history: RunHistory, paths, manifests, make_spec, tier, jobs: int) -> int:
+    specs = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            specs.append((path, make_spec(f.read())))
+    specs += [(m.final_base, spec_from_manifest(m)) for m in manifests]
+    total_audio = total_wall = 0.0
+    total_chars = 0
+    unknown = 0
+    for name, spec in specs:
+        prepared = prepare_text(spec.raw_markdown)
+        estimate = history.estimate(spec, prepared.sentences, prepared.plan(spec), tier)
+        print(f"{name}：{format_estimate(estimate)}")
+        total_audio += estimate.audio_seconds
+        total_chars += estimate.chars
+        if estimate.total_seconds is None:
+            unknown += 1
+        else:
+            total_wall += estimate.total_seconds
+    print("\n===== 估計摘要 =====")
+    print(f"{len(specs)} 份，成品約 {total_audio / 60:.1f} 分鐘，最多送出 {total_chars:,} 字元")
+    if unknown:
+        print(f"其中 {unknown} 份的 voice 或影片設定檔還沒有足夠的執行紀錄，無法估計耗時。")
+    if total_wall:
+        # 多份同時處理時共用同一個限速 bucket，實際上不一定能完全平行
+        print(
+            f"估計耗時約 {total_wall / 60:.1f} 分鐘（依序處理），"
+            f"同時處理 {jobs} 份時約 {total_wall / max(1, jobs) / 60:.1f} 分鐘"
+        )
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="*", help="Markdown 檔所在資料夾或 glob（例如 \"notes/*.md\"）")
+    parser.add_argument("--jobs", type=int, default=2, help="同時處理幾份文件（預設 2）")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS, help="每份文件同時合成的段數")
+    parser.add_argument("--voice", default=DEFAULT_VOICE, help=f"Azure 語音名稱（預設 {DEFAULT_VOICE}）")
+    parser.add_argument(
+        "--segmentation",
+        choices=["packed", "auto", "single"],
+        default="packed",
+        help="packed：依估計長度打包（預設）；auto：每 --per-segment 行一段；single：整篇一次合成",
+    )
+    parser.add_argument("--per-segment", type=int, default=5, help="auto 模式下每段幾行")
+    parser.add_argument("--segment-seconds", type=float, default=DEFAULT_SEGMENT_SECONDS, help="packed 模式每段長度上限（秒）")
+    parser.add_argument("--segment-chars", type=int, default=DEFAULT_SEGMENT_CHARS, help="packed 模式每段字元上限")
+    parser.add_argument("--no-ssml", action="store_true", help="以純文字送出，不加行間停頓、不輸出逐行時間戳")
+    parser.add_argument("--break-ms", type=int, default=DEFAULT_BREAK_MS, help=f"SSML 行間停頓毫秒數（預設 {DEFAULT_BREAK_MS}）")
+    parser.add_argument(
+        "--dialogue",
+        type=parse_voice_map,
+        default={},
+        metavar="A=VOICE,B=VOICE",
+        help="對話模式：行首說話者標籤對應的 voice，例如 A=de-DE-KatjaNeural,B=de-DE-ConradNeural",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=1,
+        metavar="N",
+        help="跟讀模式：每行重複 N 次（N > 1 時啟用；相同的行只合成一次）",
+    )
+    parser.add_argument(
+        "--gap-ms",
+        type=int,
+        default=DEFAULT_SHADOWING_GAP_MS,
+        help=f"跟讀模式每次重複後的停頓毫秒數（預設 {DEFAULT_SHADOWING_GAP_MS}）",
+    )
+    parser.add_argument("--mp3-only", action="store_true", help="只輸出音檔，不產生黑底 MP4")
+    parser.add_argument(
+        "--quality",
+        choices=list(QUALITY_LABELS),
+        default=DEFAULT_AUDIO_QUALITY,
+        help="音訊品質等級：small（預設）/ standard / high；影片與音檔用 MP3，--wav 時用 PCM",
+    )
+    parser.add_argument("--wav", action="store_true", help="音檔輸出無壓縮的 WAV（PCM），適合後製")
+    parser.add_argument(
+        "--postprocess",
+        action="store_true",
+        help="PCM 後製（需要 NumPy）：去掉段間多餘靜音、整條音量正規化後只編碼一次",
+    )
+    parser.add_argument(
+        "--post-gap-ms",
+        type=int,
+        default=DEFAULT_BREAK_MS,
+        help=f"後製時段與段之間的停頓毫秒數（預設 {DEFAULT_BREAK_MS}）",
+    )
+    parser.add_argument(
+        "--loudness",
+        type=float,
+        default=DEFAULT_LOUDNESS_DB,
+        help=f"後製的目標響度 dB（預設 {DEFAULT_LOUDNESS_DB:g}，0 表示不調整）",
+    )
+    parser.add_argument("--lead", type=float, default=5, help="影片開頭空白秒數")
+    parser.add_argument("--profile", default=DEFAULT_VIDEO_PROFILE, choices=list(VIDEO_PROFILES), help="影片輸出設定檔")
+    parser.add_argument(
+        "--template",
+        choices=list(YOUTUBE_DESCRIPTION_TEMPLATES),
+        help="同時輸出 <檔名>_description.txt，使用指定的 YouTube 說明欄模板",
+    )
+    parser.add_argument("--ffmpeg-concat", action="store_true", help="改用舊流程：分段寫檔後以 ffmpeg concat 合併")
+    parser.add_argument("--no-cache", action="store_true", help="不使用分段快取")
+    parser.add_argument(
+        "--daemon",
+        nargs="?",
+        const=DEFAULT_DAEMON_URL,
+        help=f"透過本機合成服務（synth_daemon.py）合成，預設網址 {DEFAULT_DAEMON_URL}",
+    )
+    parser.add_argument(
+        "--no-library",
+        action="store_true",
+        help="不使用輸出資料庫：不沿用相同內容的舊輸出，也不記錄這次的輸出",
+    )
+    parser.add_argument("--force", action="store_true", help="即使有相同內容與設定的舊輸出也重新合成")
+    parser.add_argument("--quota-mb", type=int, default=0, help="輸出資料夾容量上限（MB，0 表示不限制）")
+    parser.add_argument("--policy", choices=list(EVICTION_POLICIES), default=DEFAULT_EVICTION_POLICY, help="超過上限時先刪哪些輸出")
+    parser.add_argument("--tier", choices=list(TIERS), default=DEFAULT_TIER, help="Azure 資源層級，決定請求限速")
+    parser.add_argument(
+        "--budget",
+        type=int,
+        default=None,
+        help="每月字元預算，超過時提醒（預設為資源層級的免費額度，0 表示不檢查）",
+    )
+    parser.add_argument("--resume", action="store_true", help="續傳輸出資料夾中所有未完成的工作（只合成未完成的段落）")
+    parser.add_argument(
+        "--estimate",
+        action="store_true",
+        help="只依過去的執行紀錄估計每份文件的長度、合成與渲染時間和字元數，不合成",
+    )
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR, help=f"輸出資料夾（預設 {DEFAULT_OUTPUT_DIR}）")
+    parser.add_argument(
+        "--usage-db",
+        help="用量帳本的路徑（預設為輸出資料夾中的 .usage.sqlite3）；多個輸出資料夾共用同一把金鑰時可指向同一份",
+    )
+    args = parser.parse_args(argv)
+
+    paths = collect_inputs(args.inputs)
+    manifests = find_resumable(args.output_dir) if args.resume else []
+    if not paths and not manifests:
+        raise SystemExit("沒有找到任何 Markdown 檔或未完成的工作。")
+
+    def make_spec(raw_markdown: str) -> JobSpec:
+        return JobSpec(
+            raw_markdown=raw_markdown,
+            voice=args.voice,
+            segmentation=args.segmentation,
+            sentences_per_segment=args.per_segment,
+            max_segment_seconds=args.segment_seconds,
+            max_segment_chars=args.segment_chars,
+            max_workers=args.workers,
+            merge_in_memory=not args.ffmpeg_concat,
+            use_ssml=not args.no_ssml,
+            line_break_ms=args.break_ms,
+            make_video=not args.mp3_only,
+            video_lead_seconds=args.lead,
+            video_profile=args.profile,
+            audio_quality=args.quality,
+            wav_output=args.wav,
+            postprocess=args.postprocess,
+            post_gap_ms=args.post_gap_ms,
+            post_loudness_db=args.loudness,
+            dialogue_voices=args.dialogue,
+            shadowing_repeats=args.repeat,
+            shadowing_gap_ms=args.gap_ms,
+            description_template=args.template,
+            output_dir=args.output_dir,
+        )
+
+    history = RunHistory(args.output_dir)
+    if args.estimate:
+        return print_estimates(history, paths, manifests, make_spec, TIERS[args.tier], args.jobs)
+
+    cache = None if args.no_cache else SegmentCache(DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES)
+    library = None if args.no_library else OutputLibrary(args.output_dir, args.quota_mb * 1024 * 1024, args.policy)
+    if args.daemon:
+        if not daemon_available(args.daemon):
+            raise SystemExit(f"無法連線到本機合成服務 {args.daemon}，請先執行 python synth_daemon.py。")
+        key_id = key_fingerprint(os.environ.get("SPEECH_KEY", ""))
+    else:
+        key, region = load_credentials()
+        key_id = key_fingerprint(key)
+    # 所有文件共用同一個限速 bucket 與用量帳本：--jobs 開得再大，送給 Azure 的速度也不超過資源層級的限制
+    ledger = UsageLedger(args.usage_db or ledger_path(args.output_dir))
+    meter = UsageMeter(make_bucket(args.tier), ledger, key_id)
+    budget = TIERS[args.tier].monthly_free_chars if args.budget is None else args.budget
+
+    # 續傳的工作沿用當初的 voice 與輸出格式，所以每個組合各建一個合成後端
+    synthesizers = {}
+    synthesizers_lock = threading.Lock()
+
+    def synthesizer_for(voice: str, audio_format: str):
+        voice = voice or args.voice
+        with synthesizers_lock:
+            if (voice, audio_format) not in synthesizers:
+                if args.daemon:
+                    synthesizer = make_daemon_synthesizer(args.daemon, voice, cache, audio_format, meter)
+                else:
+                    synthesizer = make_synthesizer(
+                        make_speech_config(key, region, voice, audio_format), cache, audio_format, meter
+                    )
+                synthesizers[voice, audio_format] = synthesizer
+            return synthesizers[voice, audio_format]
+
+    # 同一批次裡標題相同、又在同一秒開始的文件，檔名基底加上序號避免互相覆蓋
+    used_bases = set()
+    used_lock = threading.Lock()
+
+    def process(path: str):
+        with open(path, encoding="utf-8") as f:
+            raw_markdown = f.read()
+        spec = make_spec(raw_markdown)
+        if library is not None and not args.force:
+            reused = library.find(spec)
+            if reused is not None:
+                library.touch(reused.final_base)
+                return reused.to_result()
+        prepared = prepare_text(raw_markdown)
+        job_chars = job_billable_chars(spec, prepared.sentences, prepared.plan(spec))
+        warning = budget_warning(ledger, key_id, budget, job_chars)
+        if warning:
+            print(f"    注意（{path}）：{warning}", file=sys.stderr)
+        with used_lock:
+            base = make_final_base(raw_markdown)
+            candidate, n = base, 1
+            while candidate in used_bases:
+                n += 1
+                candidate = f"{base}_{n}"
+            used_bases.add(candidate)
+        result = run_job(spec, synthesizer_for(args.voice, job_audio_format(spec).key), final_base=candidate)
+        return record(spec, result)
+
+    def resume(manifest):
+        spec = spec_from_manifest(manifest)
+        result = resume_job(manifest, synthesizer_for(manifest.spec.get("voice", ""), manifest.audio_format))
+        return record(spec, result)
+
+    def record(spec: JobSpec, result):
+        # 以實際合成的段落更新估計模型（命中快取與續傳沿用的段落不算）
+        history.record(spec, result)
+        if library is not None:
+            evicted = library.add(spec, result)
+            if evicted:
+                result.warnings.append(
+                    f"超過容量上限，已刪除 {len(evicted)} 份較舊的輸出：" + "、".join(e.final_base for e in evicted)
+                )
+        return result
+
+    tasks = [(path, process, path) for path in paths]
+    tasks += [(m.final_base, resume, m) for m in manifests]
+
+    print(
+        f"共 {len(paths)} 份文件、{len(manifests)} 份續傳工作，"
+        f"同時處理 {args.jobs} 份，每份最多同時合成 {args.workers} 段。"
+    )
+    started = time.perf_counter()
+    succeeded, failed = [], []
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        futures = {pool.submit(fn, arg): name for name, fn, arg in tasks}
+        for future in as_completed(futures):
+            path = futures[future]
+            done = len(succeeded) + len(failed) + 1
+            try:
+                result = future.result()
+            except Exception as e:
+                failed.append(path)
+                print(f"[{done}/{len(tasks)}] 失敗 {path}：{format_job_error(e)}", file=sys.stderr)
+                continue
+            succeeded.append(result)
+            outputs = ", ".join(
+                p
+                for p in (
+                    result.audio_path,
+                    result.timing_path,
+                    result.srt_path,
+                    result.vtt_path,
+                    result.video_path,
+                    result.description_path,
+                    result.report_path,
+                )
+                if p
+            )
+            resumed = f"，沿用 {result.resumed_segments} 段" if result.resumed_segments else ""
+            print(f"[{done}/{len(tasks)}] 完成 {path} → {outputs}（{result.elapsed_seconds:.1f} 秒{resumed}）")
+            for warning in result.warnings:
+                print(f"    注意：{warning}", file=sys.stderr)
+
+    wall = time.perf_counter() - started
+    audio_minutes = sum(r.audio_seconds for r in succeeded) / 60
+    chars = sum(r.char_count for r in succeeded)
+    print("\n===== 批次摘要 =====")
+    print(f"成功 {len(succeeded)} 份，失敗 {len(failed)} 份，總耗時 {wall:.1f} 秒")
+    print(f"吞吐量：{len(succeeded) / wall * 3600:.1f} 份 / 小時，音訊 {audio_minutes:.1f} 分鐘，{chars:,} 字元")
+    totals = ledger.month_totals(key_id)
+    limiter = meter.bucket.stats()
+    print(
+        f"本月用量：{totals['chars']:,} 字元"
+        + (f" / 預算 {budget:,}" if budget > 0 else "")
+        + f"，{totals['requests']} 個請求；限速等待 {limiter['waited']} 次、共 {limiter['wait_seconds']:.1f} 秒"
+    )
+    if cache is not None:
+        stats = cache.stats()
+        print(f"分段快取：命中 {stats['hits']} / 未命中 {stats['misses']}，省下 {stats['chars_saved']:,} 字元")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
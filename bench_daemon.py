@@ -0,0 +1,81 @@
+"""常駐合成服務壓測：用本機假 session 比較「每段新建連線」與連線池（未預熱 / 預熱）的延遲。
+
+假 session 第一次使用前要付 `--connect-delay` 秒的連線時間，模擬 SpeechSynthesizer 的連線與 TLS 交握。
+
+用法：
+    python bench_daemon.py --segments 40 --workers 4 --connect-delay 0.3 --latency 0.5
+"""
+import argparse
+import time
+
+from fake_backend import FakeSession, make_fake_session_factory
+from run_report import percentile
+from synth_daemon import DaemonServer, DaemonSynthesizer, SynthesisDaemon
+from tts_engine import SynthesisOutput, synthesize_segments
+
+
+VOICE = "de-DE-KatjaNeural"
+
+
+class PerRequestSession:
+    """對照組：跟原本的 `AzureSynthesizer` 一樣，每個請求都建立新的 session。"""
+
+    def __init__(self, **session_kwargs):
+        self.session_kwargs = session_kwargs
+        self.timings = []
+
+    def synthesize(self, text: str) -> SynthesisOutput:
+        started = time.perf_counter()
+        output, first_byte = FakeSession(**self.session_kwargs).synthesize(text)
+        total = time.perf_counter() - started
+        self.timings.append({"queue": 0.0, "first_byte": first_byte, "total": total, "roundtrip": total})
+        return output
+
+
+def report(name: str, wall: float, timings):
+    def pct(key, p):
+        return percentile([t[key] for t in timings], p) * 1000
+
+    print(
+        f"{name:<16} {wall:>8.2f} "
+        f"{pct('queue', 50):>8.0f} {pct('first_byte', 50):>8.0f} {pct('first_byte', 95):>8.0f} "
+        f"{pct('total', 50):>8.0f} {pct('total', 95):>8.0f} {pct('roundtrip', 95):>8.0f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--segments", type=int, default=40, help="段落數")
+    parser.add_argument("--workers", type=int, default=4, help="同時合成段數（也是連線池大小）")
+    parser.add_argument("--connect-delay", type=float, default=0.3, help="每個 session 的連線秒數")
+    parser.add_argument("--latency", type=float, default=0.5, help="每個請求的合成秒數")
+    args = parser.parse_args()
+
+    segments = [f"Das ist der Testsatz Nummer {i} für die Hörübung." for i in range(args.segments)]
+    session_kwargs = {"connect_delay": args.connect_delay, "latency": args.latency}
+
+    print(f"{'':<16} {'wall(s)':>8} {'queue50':>8} {'fb50':>8} {'fb95':>8} {'total50':>8} {'total95':>8} {'rt95':>8}  (ms)")
+
+    baseline = PerRequestSession(**session_kwargs)
+    started = time.perf_counter()
+    synthesize_segments(segments, baseline, on_audio=lambda *_: None, max_workers=args.workers)
+    report("每段新建連線", time.perf_counter() - started, baseline.timings)
+
+    for warm in (False, True):
+        daemon = SynthesisDaemon(make_fake_session_factory(**session_kwargs), pool_size=args.workers)
+        server = DaemonServer(daemon, port=0)
+        server.start_background()
+        if warm:
+            daemon.pool(VOICE).warm()
+        client = DaemonSynthesizer(server.url, VOICE)
+        started = time.perf_counter()
+        synthesize_segments(segments, client, on_audio=lambda *_: None, max_workers=args.workers)
+        report("連線池（預熱）" if warm else "連線池（未預熱）", time.perf_counter() - started, client.timings)
+        stats = daemon.stats()[VOICE]
+        assert stats["sessions"] <= args.workers, "session 數超過連線池上限"
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
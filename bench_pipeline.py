@@ -0,0 +1,197 @@
+"""端到端壓測：用本機假 Azure 後端跑完整流程（清洗 → 分段 → 合成 → 合併 → 影片 → 說明欄）。
+
+不花 Azure 額度、不依賴網路。對每種大小的自動產生語料重複執行 `run_job`，
+彙整每次的 `<檔名>_report.json`，列出各階段耗時的 p50 / p95 與吞吐量，以及每段請求延遲。
+分段方式、併發數、快取、影片設定檔都可以從命令列切換，用來比較改動前後的差異。
+找不到 ffmpeg 時跳過影片階段，MP3 改用記憶體合併。
+
+用法：
+    python bench_pipeline.py --sizes 5000 20000 80000 --repeat 3
+    python bench_pipeline.py --latency 0.8 --jitter 0.3 --fail-rate 0.05 --workers 8
+    python bench_pipeline.py --cache --repeat 3            # 第二次之後的執行會命中分段快取
+    python bench_pipeline.py --json bench_pipeline.json    # 另存彙整結果與每次的完整報告
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+
+from audio_formats import DEFAULT_AUDIO_QUALITY, QUALITY_LABELS
+from fake_backend import FakeSynthesizer
+from run_report import percentile
+from segment_cache import CachedSynthesizer, SegmentCache
+from tts_engine import DEFAULT_MAX_WORKERS, SynthesisCanceled
+from tts_pipeline import DEFAULT_VOICE, JobSpec, ffmpeg_available, job_audio_format, run_job
+from video_render import DEFAULT_VIDEO_PROFILE, VIDEO_PROFILES
+from youtube_templates import DEFAULT_YT_TEMPLATE_KEY
+
+
+STAGES = ("preprocess", "synthesize", "playback", "concat", "subtitles", "video", "description")
+
+WORDS = (
+    "der die das und ist nicht ein eine mit auf für heute morgen Zug Bahnhof Familie Wochenende "
+    "München Berlin Wasser Arbeit Schule Kinder möchte können gehen fahren treffen lernen schnell "
+    "langsam immer wieder wirklich gern später zusammen Straße Wetter Sommer Winter Frühstück"
+).split()
+
+
+def make_corpus(target_chars: int, seed: int) -> str:
+    """產生約 `target_chars` 字元、含標題、清單、粗體與 emoji 的德語 Markdown。"""
+    rng = random.Random(seed)
+    parts = ["# Hörübung Deutsch\n\n"]
+    size, section = len(parts[0]), 0
+    while size < target_chars:
+        lines = [f"## Abschnitt {section}", ""]
+        for _ in range(rng.randint(4, 10)):
+            words = [rng.choice(WORDS) for _ in range(rng.randint(5, 16))]
+            sentence = " ".join(words).capitalize() + rng.choice(".?!")
+            style = rng.random()
+            if style < 0.2:
+                sentence = f"- **{words[0]}:** {sentence}"
+            elif style < 0.3:
+                sentence = f"* *{sentence}*"
+            elif style < 0.35:
+                sentence = f"✅ {sentence}"
+            lines.append(sentence)
+        lines.append("")
+        block = "\n".join(lines) + "\n"
+        parts.append(block)
+        size += len(block)
+        section += 1
+    return "".join(parts)
+
+
+def summarize(reports):
+    """把同一種語料多次執行的報告彙整成各階段的 p50 / p95。"""
+    done = [r for r in reports if r["status"] == "done"]
+    stages = {}
+    for name in STAGES:
+        timings = [t for r in done for t in r["stages"] if t["name"] == name]
+        if not timings:
+            continue
+        walls = [t["wall_seconds"] for t in timings]
+        stages[name] = {
+            "wall_p50_seconds": percentile(walls, 50),
+            "wall_p95_seconds": percentile(walls, 95),
+            "chars_per_second": percentile([t["chars_per_second"] for t in timings], 50),
+            "bytes_per_second": percentile([t["bytes_per_second"] for t in timings], 50),
+            "audio_seconds_per_wall_second": percentile([t["audio_seconds_per_wall_second"] for t in timings], 50),
+        }
+    segment_walls = [
+        s["wall_seconds"] for r in done for s in r["segments"] if not s["cached"] and not s["resumed"]
+    ]
+    totals = [r["totals"]["wall_seconds"] for r in done]
+    return {
+        "runs": len(reports),
+        "failed": len(reports) - len(done),
+        "wall_p50_seconds": percentile(totals, 50),
+        "wall_p95_seconds": percentile(totals, 95),
+        "audio_seconds": done[0]["totals"]["audio_seconds"] if done else 0.0,
+        "segments": done[0]["totals"]["segments"] if done else 0,
+        "segments_cached": sum(r["totals"]["segments_cached"] for r in done),
+        "segment_p50_seconds": percentile(segment_walls, 50),
+        "segment_p95_seconds": percentile(segment_walls, 95),
+        "stages": stages,
+    }
+
+
+def print_summary(size: int, summary):
+    print(
+        f"\n語料 {size} 字元：{summary['segments']} 段、音訊 {summary['audio_seconds'] / 60:.1f} 分鐘；"
+        f"{summary['runs']} 次執行（失敗 {summary['failed']}、快取命中 {summary['segments_cached']} 段）"
+    )
+    print(
+        f"  整體 p50 {summary['wall_p50_seconds']:.2f} s / p95 {summary['wall_p95_seconds']:.2f} s；"
+        f"每段請求 p50 {summary['segment_p50_seconds'] * 1000:.0f} ms / p95 {summary['segment_p95_seconds'] * 1000:.0f} ms"
+    )
+    print(f"  {'stage':<12} {'p50(ms)':>9} {'p95(ms)':>9} {'chars/s':>11} {'MB/s':>9} {'audio×':>9}")
+    for name, stage in summary["stages"].items():
+        print(
+            f"  {name:<12} {stage['wall_p50_seconds'] * 1000:>9.1f} {stage['wall_p95_seconds'] * 1000:>9.1f} "
+            f"{stage['chars_per_second']:>11.0f} {stage['bytes_per_second'] / 1e6:>9.1f} "
+            f"{stage['audio_seconds_per_wall_second']:>9.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5000, 20000, 80000], help="語料大小（字元）")
+    parser.add_argument("--repeat", type=int, default=3, help="每種語料執行次數")
+    parser.add_argument("--seed", type=int, default=0, help="語料與假後端的亂數種子")
+    parser.add_argument("--latency", type=float, default=0.3, help="每個請求的模擬往返秒數")
+    parser.add_argument("--jitter", type=float, default=0.1, help="往返秒數的隨機擾動")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="每個請求被取消的機率（會觸發重試）")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS, help="同時合成段數")
+    parser.add_argument("--segmentation", choices=["packed", "auto", "single"], default="packed")
+    parser.add_argument("--no-ssml", action="store_true", help="以純文字送出")
+    parser.add_argument("--ffmpeg-concat", action="store_true", help="用 ffmpeg concat 合併，而不是記憶體合併")
+    parser.add_argument("--no-video", action="store_true", help="跳過影片階段")
+    parser.add_argument("--video-profile", choices=list(VIDEO_PROFILES), default=DEFAULT_VIDEO_PROFILE)
+    parser.add_argument("--quality", choices=list(QUALITY_LABELS), default=DEFAULT_AUDIO_QUALITY, help="音訊品質等級")
+    parser.add_argument("--wav", action="store_true", help="輸出 WAV（PCM）")
+    parser.add_argument("--cache", action="store_true", help="同一種語料的多次執行共用分段快取")
+    parser.add_argument("--json", metavar="PATH", help="另存彙整結果與每次執行的完整報告")
+    args = parser.parse_args()
+
+    make_video = not args.no_video
+    if make_video and not ffmpeg_available():
+        print("找不到 ffmpeg：跳過影片階段，MP3 改用記憶體合併。")
+        make_video = False
+
+    work_dir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    results = {"settings": vars(args), "corpora": {}}
+    try:
+        for size in args.sizes:
+            raw = make_corpus(size, args.seed)
+            cache = SegmentCache(os.path.join(work_dir, f"cache_{size}")) if args.cache else None
+            reports = []
+            for run in range(args.repeat):
+                spec = JobSpec(
+                    raw_markdown=raw,
+                    voice=DEFAULT_VOICE,
+                    segmentation=args.segmentation,
+                    use_ssml=not args.no_ssml,
+                    max_workers=args.workers,
+                    merge_in_memory=not args.ffmpeg_concat,
+                    make_video=make_video,
+                    video_profile=args.video_profile,
+                    audio_quality=args.quality,
+                    wav_output=args.wav,
+                    description_template=DEFAULT_YT_TEMPLATE_KEY,
+                    output_dir=os.path.join(work_dir, f"out_{size}"),
+                )
+                audio_format = job_audio_format(spec)
+                synthesizer = FakeSynthesizer(
+                    latency=args.latency,
+                    jitter=args.jitter,
+                    fail_rate=args.fail_rate,
+                    seed=args.seed + run,
+                    audio_format=audio_format.key,
+                )
+                if cache is not None:
+                    synthesizer = CachedSynthesizer(
+                        synthesizer, cache, voice=DEFAULT_VOICE, output_format=audio_format.sdk_name
+                    )
+                final_base = f"bench_{size}_{run}"
+                try:
+                    reports.append(run_job(spec, synthesizer, on_audio=lambda *_: None, final_base=final_base).report)
+                except SynthesisCanceled:
+                    # 重試後仍失敗：失敗的工作也有報告，一併計入
+                    with open(os.path.join(spec.output_dir, f"{final_base}_report.json"), encoding="utf-8") as f:
+                        reports.append(json.load(f))
+            summary = summarize(reports)
+            print_summary(size, summary)
+            results["corpora"][str(size)] = {"summary": summary, "reports": reports}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n已寫入 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""預處理重跑延遲壓測：模擬 Streamlit 每次重跑時的文字處理成本。
+
+比較三種情境（每種取中位數）：
+- 無快取：每次都從頭清洗、切行、數詞、分段、組說明欄（舊版每次重跑的做法）
+- 文字沒變：只動了側邊欄元件（例如換 voice、拉影片開頭秒數）
+- 改一行：在文字中間改了一行
+
+用法：
+    python bench_preprocess.py --sizes 100 1000 --repeat 5
+"""
+import argparse
+import statistics
+import time
+
+from tts_pipeline import JobSpec, PreparedText, _clean_chunk, build_description, prepare_text
+
+SAMPLE_PARAGRAPH = """## Abschnitt {n}
+
+- **Wichtig:** Der Zug nach München fährt heute z.B. erst um {n} Uhr ab.
+* Wir treffen uns *vor* dem Bahnhof, nicht dahinter.
+Am Wochenende möchte ich mit meiner Familie an den See fahren.
+✅ Bewertung: gut verständlich
+---
+
+"""
+
+
+def make_markdown(target_kb: int) -> str:
+    parts = ["# Hörübung Deutsch\n\n"]
+    size, n = len(parts[0]), 0
+    while size < target_kb * 1024:
+        block = SAMPLE_PARAGRAPH.format(n=n)
+        parts.append(block)
+        size += len(block.encode("utf-8"))
+        n += 1
+    return "".join(parts)
+
+
+def edit_middle_line(text: str, n: int) -> str:
+    lines = text.split("\n")
+    mid = len(lines) // 2
+    lines[mid] = f"{lines[mid]} (bearbeitet {n})"
+    return "\n".join(lines)
+
+
+def rerun(prepared: PreparedText, spec: JobSpec):
+    """一次重跑中用到的所有預處理結果。"""
+    prepared.plan(spec)
+    build_description(prepared.display_text)
+
+
+def timed(fn, repeat: int) -> float:
+    samples = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000], help="輸入大小（KB）")
+    parser.add_argument("--repeat", type=int, default=5, help="每種情境重複次數")
+    args = parser.parse_args()
+
+    print(f"{'size':>8} {'lines':>7} {'無快取(ms)':>11} {'文字沒變(ms)':>13} {'改一行(ms)':>11}")
+    for size_kb in args.sizes:
+        raw = make_markdown(size_kb)
+        spec = JobSpec(raw_markdown=raw)
+
+        def uncached(_i):
+            _clean_chunk.cache_clear()
+            build_description.cache_clear()
+            rerun(PreparedText(raw), spec)
+
+        prepare_text.cache_clear()
+        rerun(prepare_text(raw), spec)
+
+        # Streamlit 每次重跑都拿到新的字串物件；先準備好，避免把複製的時間算進去
+        copies = [raw.encode("utf-8").decode("utf-8") for _ in range(args.repeat)]
+        edits = [edit_middle_line(raw, i) for i in range(args.repeat)]
+
+        def unchanged(i):
+            rerun(prepare_text(copies[i]), spec)
+
+        def edited(i):
+            rerun(prepare_text(edits[i]), spec)
+
+        cold = timed(uncached, args.repeat)
+        same = timed(unchanged, args.repeat)
+        edit = timed(edited, args.repeat)
+        lines = raw.count("\n") + 1
+        print(f"{size_kb:>6}KB {lines:>7} {cold:>11.1f} {same:>13.2f} {edit:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Markdown 清洗吞吐量壓測：多 MB 的輸入與刻意構造的最差情況。
+
+- 一般語料：把包含標題、清單、連結、程式碼、表格、引用、HTML 的段落重複到指定大小，
+  清空區塊快取後從頭清洗，列出 MB/s。
+- 最差情況：一整行只有未配對的 `[`、反引號、`<a `、`<!--`、`**` 等，長度加倍時耗時也應該只加倍
+  （「倍率」一欄接近 2 表示線性；若某個樣式會回頭重掃，這裡會看到 4 以上）。
+
+用法：
+    python bench_speech_text.py --sizes 1 4 16 --repeat 3
+"""
+import argparse
+import statistics
+import time
+
+from tts_pipeline import _clean_chunk, clean_markdown
+
+SAMPLE_BLOCK = """## Abschnitt {n}
+
+> **Hinweis:** Lies den Text *zweimal* laut.
+- [x] Der Zug nach [München](https://de.wikipedia.org/wiki/M%C3%BCnchen) fährt um `{n}` Uhr ab.
+* Wir treffen uns vor dem Bahnhof &amp; trinken <b>einen</b> Kaffee.<br>
+| Wort | Artikel | Bedeutung |
+|------|:-------:|-----------|
+| Zug | der | train |
+![Bild {n}](bilder/{n}.png) <!-- Kommentar {n} -->
+```
+print({n})
+```
+A: Am Wochenende möchte ich mit meiner Familie an den See fahren.
+✅ Bewertung: gut verständlich
+---
+
+"""
+
+# 每種最差情況的一個重複單位；整行沒有換行，區塊快取也幫不上忙
+PATHOLOGICAL = {
+    "[": "[a ",
+    "](": "[a](b ",
+    "`": "`a ",
+    "``": "``a ",
+    "<a": "<a b ",
+    "<!--": "x <!-- ",
+    "&": "&amp ",
+    "**": "**a ",
+    "_": "a_ _b ",
+}
+
+
+def make_markdown(target_mb: float) -> str:
+    parts = ["# Hörübung Deutsch\n\n"]
+    size, n = len(parts[0]), 0
+    while size < target_mb * 1024 * 1024:
+        block = SAMPLE_BLOCK.format(n=n)
+        parts.append(block)
+        size += len(block.encode("utf-8"))
+        n += 1
+    return "".join(parts)
+
+
+def timed(text: str, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        _clean_chunk.cache_clear()
+        start = time.perf_counter()
+        clean_markdown(text)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 4, 16], help="一般語料大小（MB）")
+    parser.add_argument("--worst-kb", type=int, default=256, help="最差情況的起始長度（KB），另測兩倍長度")
+    parser.add_argument("--repeat", type=int, default=3, help="每種情境重複次數（取中位數）")
+    args = parser.parse_args()
+
+    print(f"{'size':>8} {'lines':>9} {'耗時(s)':>9} {'MB/s':>8}")
+    for size_mb in args.sizes:
+        raw = make_markdown(size_mb)
+        seconds = timed(raw, args.repeat)
+        mb = len(raw.encode("utf-8")) / 1024 / 1024
+        print(f"{size_mb:>6g}MB {raw.count(chr(10)) + 1:>9} {seconds:>9.3f} {mb / seconds:>8.1f}")
+
+    print()
+    print(f"{'最差情況':>10} {args.worst_kb:>7}KB(s) {args.worst_kb * 2:>7}KB(s) {'倍率':>6}")
+    for name, unit in PATHOLOGICAL.items():
+        small = unit * (args.worst_kb * 1024 // len(unit))
+        first = timed(small, args.repeat)
+        second = timed(small * 2, args.repeat)
+        print(f"{name:>10} {first:>11.3f} {second:>11.3f} {second / first:>6.2f}")
+
+
+if __name__ == "__main__":
+    main()
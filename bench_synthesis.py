@@ -0,0 +1,39 @@
+"""分段併發合成壓測：用本機假後端比較不同併發上限的總耗時。
+
+用法：
+    python bench_synthesis.py --segments 40 --latency 0.5 --workers 1 2 4 8
+"""
+import argparse
+import time
+
+from fake_backend import FakeSynthesizer
+from tts_engine import synthesize_segments
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--segments", type=int, default=40, help="段落數")
+    parser.add_argument("--latency", type=float, default=0.5, help="每段模擬往返秒數")
+    parser.add_argument("--jitter", type=float, default=0.2, help="往返秒數的隨機擾動")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="要比較的併發上限")
+    args = parser.parse_args()
+
+    segments = [f"Das ist der Testsatz Nummer {i} für die Hörübung." for i in range(args.segments)]
+    print(f"{'workers':>8} {'wall(s)':>9} {'seg/s':>8}")
+    for workers in args.workers:
+        synthesizer = FakeSynthesizer(latency=args.latency, jitter=args.jitter, seed=0)
+        order = []
+        start = time.perf_counter()
+        synthesize_segments(
+            segments,
+            synthesizer,
+            on_audio=lambda idx, _out: order.append(idx),
+            max_workers=workers,
+        )
+        wall = time.perf_counter() - start
+        assert order == list(range(1, args.segments + 1)), "音訊交付順序錯誤"
+        print(f"{workers:>8} {wall:>9.2f} {args.segments / wall:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
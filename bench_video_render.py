@@ -0,0 +1,100 @@
+"""MP4 渲染壓測：比較各影片設定檔每分鐘音訊需要的渲染時間（需要 ffmpeg）。
+
+`legacy` 就是原本 `color=c=black:s=1920x1080:r=30` 的流程；`karaoke` 每 `--line-seconds` 秒換一行字幕
+（需要 Pillow）。「預期」是依設定檔算出的影格數，「實際」是 `ffprobe -count_frames` 數出的編碼影格數
+（沒有 ffprobe 時顯示 -），逐行字幕應該只跟行數有關。
+
+用法：
+    python bench_video_render.py --minutes 5 --lead 5
+    python bench_video_render.py --profiles karaoke still legacy --line-seconds 3
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+
+from mp3_frames import silent_mp3
+from subtitles import Cue
+from video_render import VIDEO_PROFILES, render_video
+
+SAMPLE_LINES = (
+    "Der Zug nach München fährt um acht Uhr ab.",
+    "Wir treffen uns vor dem Bahnhof und trinken einen Kaffee.",
+    "Am Wochenende möchte ich mit meiner Familie an den See fahren.",
+    "Können Sie mir bitte sagen, wie ich zum Rathaus komme?",
+)
+
+
+def make_cues(seconds: float, line_seconds: float):
+    count = int(seconds // line_seconds)
+    return [
+        Cue(i * line_seconds, (i + 1) * line_seconds, f"{i + 1}. {SAMPLE_LINES[i % len(SAMPLE_LINES)]}")
+        for i in range(count)
+    ]
+
+
+def expected_frames(profile, seconds: float, cues) -> int:
+    # 逐行字幕：每個字幕一張，加上開頭的黑畫面
+    if profile.karaoke:
+        return len(cues) + 1
+    return int(seconds * profile.fps)
+
+
+def encoded_frames(video_path: str):
+    """以 ffprobe 實際解碼數出影片串流的影格數；沒有 ffprobe 或讀不出來時回傳 None。"""
+    if shutil.which("ffprobe") is None:
+        return None
+    result = subprocess.run(
+        [
+            "ffprobe", "-v", "error", "-count_frames", "-select_streams", "v:0",
+            "-show_entries", "stream=nb_read_frames", "-of", "default=nokey=1:noprint_wrappers=1",
+            video_path,
+        ],
+        capture_output=True,
+        text=True,
+    )
+    try:
+        return int(result.stdout.strip())
+    except ValueError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=5.0, help="測試音訊長度（分鐘）")
+    parser.add_argument("--lead", type=float, default=5.0, help="影片開頭空白秒數")
+    parser.add_argument("--line-seconds", type=float, default=4.0, help="逐行字幕每行顯示秒數")
+    parser.add_argument("--profiles", nargs="+", default=list(VIDEO_PROFILES), choices=list(VIDEO_PROFILES))
+    args = parser.parse_args()
+
+    if shutil.which("ffmpeg") is None:
+        raise SystemExit("找不到 ffmpeg，無法執行影片渲染壓測。")
+
+    work_dir = tempfile.mkdtemp(prefix="bench_video_")
+    try:
+        audio_path = os.path.join(work_dir, "audio.mp3")
+        with open(audio_path, "wb") as f:
+            f.write(silent_mp3(args.minutes * 60))
+
+        cues = make_cues(args.minutes * 60, args.line_seconds)
+        print(f"{'profile':>14} {'預期':>8} {'實際':>8} {'wall(s)':>9} {'s / audio min':>14} {'size(MB)':>9}")
+        for key in args.profiles:
+            video_path = os.path.join(work_dir, f"{key}.mp4")
+            # 開頭片段快取放在暫存目錄裡：第一次量到的是含渲染開頭片段的時間
+            wall = render_video(
+                audio_path, video_path, args.lead, key, leadin_cache_dir=os.path.join(work_dir, "cache"), cues=cues
+            )
+            size_mb = os.path.getsize(video_path) / 1024 / 1024
+            expected = expected_frames(VIDEO_PROFILES[key], args.minutes * 60 + args.lead, cues)
+            encoded = encoded_frames(video_path)
+            encoded_text = "-" if encoded is None else str(encoded)
+            print(
+                f"{key:>14} {expected:>8} {encoded_text:>8} {wall:>9.2f} {wall / args.minutes:>14.2f} {size_mb:>9.2f}"
+            )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""對話稿：以 `A:` / `B:` 這類說話者標籤開頭的行，依說話者換成不同的 voice。
+
+原本整份文本只用側邊欄選的一個 voice；聽力用的對話要先分別合成每個角色，再手動剪接。
+這裡把每行開頭的標籤對應到 voice（`voice_map`），沒有標籤或標籤不在對應表裡的行
+由預設 voice（旁白）朗讀。標籤本身不唸出來，但字幕用的文本仍保留標籤。
+
+分段與合成在 `tts_pipeline.dialogue_plan`：同一個 voice 的所有行打包成盡量少的請求，
+不同 voice 併發合成，再依 bookmark 切回每一行、照原稿順序接起來。
+"""
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Sequence
+
+
+# 行首的說話者標籤：不含空白、最多 20 個字元，後面接半形或全形冒號
+_SPEAKER_RE = re.compile(r"^\s*([^\s:：]{1,20})\s*[:：]\s*(.*)$")
+# 偵測說話者時，至少要有這麼多行以同一個標籤開頭，才當作對話角色（避免把「Hinweis:」當成角色）
+MIN_SPEAKER_LINES = 2
+
+
+@dataclass(frozen=True)
+class DialogueLine:
+    line_index: int
+    # 沒有標籤（旁白）時為空字串
+    speaker: str
+    voice: str
+    # 實際送去朗讀的文字（已去掉標籤）
+    text: str
+
+
+def split_speaker(line: str):
+    """`"A: Hallo"` → `("A", "Hallo")`；沒有標籤時回傳 `("", line)`。"""
+    match = _SPEAKER_RE.match(line)
+    if not match or not match.group(2).strip():
+        return "", line.strip()
+    return match.group(1), match.group(2).strip()
+
+
+def detect_speakers(sentences: Sequence[str], min_lines: int = MIN_SPEAKER_LINES) -> List[str]:
+    """找出文本中的說話者標籤，依第一次出現的順序排列。"""
+    counts: Dict[str, int] = {}
+    for line in sentences:
+        speaker, _text = split_speaker(line)
+        if speaker:
+            counts[speaker] = counts.get(speaker, 0) + 1
+    return [speaker for speaker, count in counts.items() if count >= min_lines]
+
+
+def parse_dialogue(sentences: Sequence[str], voice_map: Mapping[str, str], default_voice: str) -> List[DialogueLine]:
+    """逐行決定 voice；空行略過。只有 `voice_map` 裡的標籤會被拿掉，其餘整行照唸。"""
+    lines = []
+    for i, line in enumerate(sentences):
+        if not line.strip():
+            continue
+        speaker, text = split_speaker(line)
+        if speaker and voice_map.get(speaker):
+            lines.append(DialogueLine(i, speaker, voice_map[speaker], text))
+        else:
+            lines.append(DialogueLine(i, "", default_voice, line.strip()))
+    return lines
+
+
+def count_turns(lines: Sequence[DialogueLine]) -> int:
+    """換人說話的次數（連續同一個 voice 的行算一次）。"""
+    turns = 0
+    previous = None
+    for line in lines:
+        if line.voice != previous:
+            turns += 1
+            previous = line.voice
+    return turns
+
+
+def parse_voice_map(text: str) -> Dict[str, str]:
+    """命令列格式 `A=de-DE-KatjaNeural,B=de-DE-ConradNeural` → 對應表。"""
+    voice_map = {}
+    for item in text.split(","):
+        if not item.strip():
+            continue
+        speaker, sep, voice = item.partition("=")
+        if not sep or not speaker.strip() or not voice.strip():
+            raise ValueError(f"無法解析說話者對應「{item.strip()}」，格式應為 標籤=voice")
+        voice_map[speaker.strip()] = voice.strip()
+    return voice_map
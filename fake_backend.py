@@ -0,0 +1,281 @@
+"""本機假合成後端：不連 Azure，用固定延遲模擬請求，方便測試與壓測。
+
+`FakeSpeechSynthesizer` 模仿 `speechsdk.SpeechSynthesizer` 的介面與結果欄位，
+`FakeSynthesizer` 則跟 `azure_backend.AzureSynthesizer` 一樣把結果轉成 `SynthesisOutput`，
+整條流程（含 bookmark、逐字時間換算與取消處理）都走與 Azure 相同的路徑。
+"""
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Optional
+
+from audio_formats import AUDIO_FORMATS, DEFAULT_AUDIO_FORMAT, silent_audio
+from tts_engine import SynthesisCanceled, SynthesisOutput
+
+
+# 與 azure_backend.TICKS_PER_SECOND 相同；這裡不能 import azure_backend（需要 Azure SDK）
+TICKS_PER_SECOND = 10_000_000
+
+
+_SSML_TOKEN_RE = re.compile(
+    r'<bookmark mark="(?P<mark>[^"]*)"\s*/>|<break time="(?P<break>\d+)ms"\s*/>|<[^>]*>|(?P<text>[^<]+)'
+)
+_WORD_RE = re.compile(r"\S+")
+
+
+class ResultReason:
+    """對應 `speechsdk.ResultReason` 中會用到的兩個值。"""
+
+    SynthesizingAudioCompleted = "SynthesizingAudioCompleted"
+    Canceled = "Canceled"
+
+
+@dataclass
+class CancellationDetails:
+    reason: str
+    error_details: str
+
+
+@dataclass
+class FakeSynthesisResult:
+    """與 `speechsdk.SpeechSynthesisResult` 相同的欄位：`reason`、`audio_data`、`audio_duration`（timedelta）。"""
+
+    reason: str
+    audio_data: bytes = b""
+    audio_duration: timedelta = timedelta(0)
+    cancellation_details: Optional[CancellationDetails] = None
+    result_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+
+
+@dataclass
+class BookmarkEvent:
+    """對應 `SpeechSynthesisBookmarkEventArgs`；`audio_offset` 以 100 奈秒（tick）為單位。"""
+
+    text: str
+    audio_offset: int
+
+
+@dataclass
+class WordBoundaryEvent:
+    """對應 `SpeechSynthesisWordBoundaryEventArgs`；`audio_offset` 以 tick 為單位，`duration` 是 timedelta。"""
+
+    text: str
+    audio_offset: int
+    duration: timedelta
+    boundary_type: str = "Word"
+
+
+class EventSignal:
+    """對應 SDK 的 `EventSignal`，只支援 `connect`。"""
+
+    def __init__(self):
+        self._callbacks = []
+
+    def connect(self, callback):
+        self._callbacks.append(callback)
+
+    def fire(self, evt):
+        for callback in self._callbacks:
+            callback(evt)
+
+
+class ResultFuture:
+    def __init__(self, run):
+        self._run = run
+
+    def get(self) -> FakeSynthesisResult:
+        return self._run()
+
+
+class FakeSpeechSynthesizer:
+    """與 `speechsdk.SpeechSynthesizer` 相同的介面：`speak_text_async(...).get()`、`bookmark_reached` 事件。
+
+    睡 `latency`（± `jitter`）秒後依字數回傳 `audio_format` 格式的靜音；以 `fail_rate` 的機率回傳 Canceled 結果。
+    `rng` 與 `lock` 由 `FakeSynthesizer` 傳入，讓同一組設定下的多個實例共用同一個亂數序列。
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.2,
+        jitter: float = 0.0,
+        fail_rate: float = 0.0,
+        chars_per_second: float = 14.0,
+        audio_format: str = DEFAULT_AUDIO_FORMAT,
+        rng: Optional[random.Random] = None,
+        lock: Optional[threading.Lock] = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.chars_per_second = chars_per_second
+        self.audio_format = AUDIO_FORMATS[audio_format]
+        self._rng = rng or random.Random()
+        self._lock = lock or threading.Lock()
+        self.synthesizing = EventSignal()
+        self.bookmark_reached = EventSignal()
+        self.synthesis_word_boundary = EventSignal()
+
+    def speak_text_async(self, text: str) -> ResultFuture:
+        return ResultFuture(lambda: self._speak([(None, None, text)]))
+
+    def speak_ssml_async(self, ssml: str) -> ResultFuture:
+        tokens = [(t.group("mark"), t.group("break"), t.group("text")) for t in _SSML_TOKEN_RE.finditer(ssml)]
+        return ResultFuture(lambda: self._speak(tokens))
+
+    def _speak(self, tokens) -> FakeSynthesisResult:
+        with self._lock:
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+            failed = self._rng.random() < self.fail_rate
+        time.sleep(delay)
+        if failed:
+            return FakeSynthesisResult(
+                reason=ResultReason.Canceled,
+                cancellation_details=CancellationDetails("Error", "FakeSpeechSynthesizer 模擬的取消"),
+            )
+        # 依 SSML 中的文字、`<break>` 與 `<bookmark>` 累加時間；純文字只有一個文字 token
+        offset = 0.0
+        for mark, break_ms, text in tokens:
+            if mark is not None:
+                self.bookmark_reached.fire(BookmarkEvent(mark, int(offset * TICKS_PER_SECOND)))
+            elif break_ms is not None:
+                offset += int(break_ms) / 1000
+            elif text:
+                # 每個以空白分開的字依字數分到一段時間，與 Azure 一樣逐字回報
+                for word in _WORD_RE.finditer(text.strip()):
+                    start = offset + word.start() / self.chars_per_second
+                    duration = len(word.group()) / self.chars_per_second
+                    self.synthesis_word_boundary.fire(
+                        WordBoundaryEvent(word.group(), int(start * TICKS_PER_SECOND), timedelta(seconds=duration))
+                    )
+                offset += len(text.strip()) / self.chars_per_second
+        # 與 Azure 對應輸出格式相同的參數，可直接餵給 Mp3Joiner / WavJoiner / ffmpeg
+        audio = silent_audio(self.audio_format, offset)
+        self.synthesizing.fire(None)
+        return FakeSynthesisResult(
+            reason=ResultReason.SynthesizingAudioCompleted,
+            audio_data=audio,
+            # 不重新解析 frame，假後端本身的開銷不該算進壓測結果
+            audio_duration=timedelta(seconds=offset),
+        )
+
+
+def result_to_output(result: FakeSynthesisResult) -> SynthesisOutput:
+    """與 `azure_backend.AzureSynthesizer._to_output` 相同的轉換。"""
+    if result.reason == ResultReason.SynthesizingAudioCompleted:
+        return SynthesisOutput(audio_data=result.audio_data, audio_duration=result.audio_duration.total_seconds())
+    if result.reason == ResultReason.Canceled:
+        cancellation = result.cancellation_details
+        raise SynthesisCanceled(cancellation.reason, cancellation.error_details)
+    raise SynthesisCanceled(result.reason, "合成結果未知")
+
+
+def _collect_word(words: list):
+    """與 `azure_backend.word_boundary_handler` 相同的轉換。"""
+    return lambda evt: words.append((evt.audio_offset / TICKS_PER_SECOND, evt.duration.total_seconds(), evt.text))
+
+
+class FakeSynthesizer:
+    """模擬 `azure_backend.AzureSynthesizer`：每次呼叫建立一個 `FakeSpeechSynthesizer`。
+
+    - `latency` / `jitter`：每次請求的往返秒數與隨機擾動。
+    - `chars_per_second`：用來估算假音訊長度（德語朗讀大約每秒 14 個字元）。
+    - `fail_rate`：每次請求被「取消」的機率，可用來驗證重試與取消流程。
+    - `audio_format`：`audio_formats.AUDIO_FORMATS` 的鍵，決定回傳 MP3 或 WAV 與其參數。
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.2,
+        jitter: float = 0.0,
+        fail_rate: float = 0.0,
+        chars_per_second: float = 14.0,
+        seed=None,
+        audio_format: str = DEFAULT_AUDIO_FORMAT,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.chars_per_second = chars_per_second
+        self.audio_format = audio_format
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _new_synthesizer(self) -> FakeSpeechSynthesizer:
+        with self._lock:
+            self.calls += 1
+        return FakeSpeechSynthesizer(
+            latency=self.latency,
+            jitter=self.jitter,
+            fail_rate=self.fail_rate,
+            chars_per_second=self.chars_per_second,
+            audio_format=self.audio_format,
+            rng=self._rng,
+            lock=self._lock,
+        )
+
+    def synthesize(self, text: str) -> SynthesisOutput:
+        synthesizer = self._new_synthesizer()
+        words = []
+        synthesizer.synthesis_word_boundary.connect(_collect_word(words))
+        output = result_to_output(synthesizer.speak_text_async(text).get())
+        output.words = sorted(words)
+        return output
+
+    def synthesize_ssml(self, ssml: str) -> SynthesisOutput:
+        synthesizer = self._new_synthesizer()
+        bookmarks = []
+        words = []
+        synthesizer.bookmark_reached.connect(
+            lambda evt: bookmarks.append((evt.text, evt.audio_offset / TICKS_PER_SECOND))
+        )
+        synthesizer.synthesis_word_boundary.connect(_collect_word(words))
+        output = result_to_output(synthesizer.speak_ssml_async(ssml).get())
+        output.bookmarks = sorted(bookmarks, key=lambda item: item[1])
+        output.words = sorted(words)
+        return output
+
+
+class FakeSession:
+    """模擬 `azure_backend.AzureSession`：第一次使用前要先「連線」（`connect_delay` 秒）。
+
+    用來在不連 Azure 的情況下驗證 `synth_daemon.py` 的連線池與預熱邏輯：
+    預熱過的 session 直接處理請求，沒預熱的第一個請求會多付一次連線時間。
+    第一個音訊片段在 `first_byte_fraction` × 請求延遲時到達。
+    """
+
+    def __init__(self, connect_delay: float = 0.3, first_byte_fraction: float = 0.3, **synth_kwargs):
+        self.connect_delay = connect_delay
+        self.first_byte_fraction = first_byte_fraction
+        self.backend = FakeSynthesizer(**synth_kwargs)
+        self.connected = False
+        self.connects = 0
+
+    def warm_up(self):
+        if not self.connected:
+            time.sleep(self.connect_delay)
+            self.connected = True
+            self.connects += 1
+
+    def synthesize(self, payload: str, ssml: bool = False):
+        started = time.perf_counter()
+        self.warm_up()
+        synthesize = self.backend.synthesize_ssml if ssml else self.backend.synthesize
+        output = synthesize(payload)
+        request_seconds = time.perf_counter() - started
+        first_byte = request_seconds - self.backend.latency * (1 - self.first_byte_fraction)
+        return output, max(0.0, first_byte)
+
+    def close(self):
+        self.connected = False
+
+
+def make_fake_session_factory(**session_kwargs):
+    def factory(_voice: str, audio_format: str = DEFAULT_AUDIO_FORMAT) -> FakeSession:
+        return FakeSession(audio_format=audio_format, **session_kwargs)
+
+    return factory
@@ -0,0 +1,233 @@
+"""背景工作管理：合成與影片渲染在工作執行緒中進行，狀態存在腳本重跑之外。
+
+Streamlit 每動一次元件就從頭重跑腳本；若在腳本執行緒裡同步合成，任何互動都會讓
+進行中的工作被丟掉。`JobManager` 由 `st.cache_resource` 保存成整個程序共用的單例，
+網頁只負責送出工作與定期讀取進度，工作本身不受重跑影響，多份文件也能排隊依序處理。
+"""
+import sqlite3
+import subprocess
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import Callable, Dict, List, Optional
+
+from tts_engine import AudioSink, SegmentSynthesizer, SynthesisCanceled
+from job_manifest import JobManifest
+from output_library import OutputLibrary
+from run_history import RunHistory
+from tts_pipeline import JobResult, JobSpec, make_final_base, prepare_text, run_job, spec_from_manifest
+
+
+# 同時執行的工作數；每份工作本身已併發合成多段，免費層（F0）下同時跑太多份容易被限流
+DEFAULT_MAX_JOBS = 1
+# 保留最近幾筆已結束的工作紀錄
+DEFAULT_MAX_HISTORY = 50
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+STATUS_CANCELED = "canceled"
+
+STATUS_LABELS = {
+    STATUS_QUEUED: "排隊中",
+    STATUS_RUNNING: "執行中",
+    STATUS_DONE: "完成",
+    STATUS_FAILED: "失敗",
+    STATUS_CANCELED: "已取消",
+}
+
+
+@dataclass
+class JobRecord:
+    """一份工作的狀態；`JobManager` 對外只交出複本，讀取時不必加鎖。"""
+
+    job_id: str
+    final_base: str
+    segment_count: int
+    status: str = STATUS_QUEUED
+    stage: str = ""
+    completed: int = 0
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[JobResult] = None
+    error: str = ""
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in (STATUS_QUEUED, STATUS_RUNNING)
+
+    @property
+    def progress(self) -> float:
+        if self.status == STATUS_DONE:
+            return 1.0
+        return self.completed / self.segment_count if self.segment_count else 0.0
+
+    @property
+    def elapsed_seconds(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+
+def format_job_error(exc: BaseException) -> str:
+    """把工作中拋出的例外轉成顯示給使用者的訊息。"""
+    if isinstance(exc, SynthesisCanceled):
+        return f"第 {exc.index} 段合成被取消：{exc.reason} - {exc.details}"
+    if isinstance(exc, subprocess.CalledProcessError):
+        return f"呼叫 ffmpeg 時發生錯誤：{exc}"
+    if isinstance(exc, (OSError, ValueError)):
+        return f"合併分段音檔或生成影片時發生錯誤：{exc}"
+    return f"未預期的錯誤：{exc!r}"
+
+
+class JobManager:
+    """以固定大小的執行緒池依序執行 `run_job`，並記錄每份工作的進度。"""
+
+    def __init__(
+        self,
+        max_jobs: int = DEFAULT_MAX_JOBS,
+        max_history: int = DEFAULT_MAX_HISTORY,
+        library: Optional[OutputLibrary] = None,
+        run_history: Optional[RunHistory] = None,
+    ):
+        self.max_history = max_history
+        # 完成的工作記進輸出資料庫，並依容量上限刪除舊的輸出
+        self.library = library
+        # 完成的工作的實際耗時記進執行紀錄，下一份工作送出前據此估計
+        self.run_history = run_history
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_jobs), thread_name_prefix="tts-job")
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, JobRecord]" = OrderedDict()
+        self._futures: Dict[str, Future] = {}
+
+    def submit(
+        self,
+        spec: JobSpec,
+        synthesizer: SegmentSynthesizer,
+        final_base: Optional[str] = None,
+        on_audio: Optional[AudioSink] = None,
+        on_finish: Optional[Callable[[], None]] = None,
+    ) -> str:
+        """送出一份工作並立即回傳 job_id。
+
+        `on_audio` 與 `on_finish` 會在工作執行緒中呼叫，不能直接操作 Streamlit 元件。
+        """
+        record = JobRecord(
+            job_id=uuid.uuid4().hex[:12],
+            final_base=final_base or make_final_base(spec.raw_markdown, spec.base_name),
+            segment_count=len(prepare_text(spec.raw_markdown).plan(spec).segments),
+        )
+        with self._lock:
+            self._jobs[record.job_id] = record
+            self._prune_locked()
+            future = self._executor.submit(self._run, record.job_id, spec, synthesizer, on_audio, on_finish)
+            self._futures[record.job_id] = future
+        if on_finish is not None:
+            # 排隊中就被取消時 _run 不會執行，仍要通知呼叫端收尾
+            def finish_if_canceled(f: Future):
+                if f.cancelled():
+                    on_finish()
+
+            future.add_done_callback(finish_if_canceled)
+        return record.job_id
+
+    def resume(
+        self,
+        manifest: JobManifest,
+        synthesizer: SegmentSynthesizer,
+        on_audio: Optional[AudioSink] = None,
+        on_finish: Optional[Callable[[], None]] = None,
+    ) -> str:
+        """以清單檔的設定與檔名基底重新送出工作；已完成的段落會直接沿用。"""
+        return self.submit(
+            spec_from_manifest(manifest),
+            synthesizer,
+            final_base=manifest.final_base,
+            on_audio=on_audio,
+            on_finish=on_finish,
+        )
+
+    def _run(self, job_id, spec, synthesizer, on_audio, on_finish):
+        record = self._update(job_id, status=STATUS_RUNNING, started_at=time.time())
+        try:
+            result = run_job(
+                spec,
+                synthesizer,
+                on_progress=lambda _idx, completed, total: self._update(
+                    job_id, completed=completed, segment_count=total
+                ),
+                on_stage=lambda name: self._update(job_id, stage=name),
+                on_audio=on_audio,
+                final_base=record.final_base,
+            )
+        except Exception as e:
+            self._update(job_id, status=STATUS_FAILED, error=format_job_error(e), finished_at=time.time())
+        else:
+            if self.run_history is not None:
+                try:
+                    self.run_history.record(spec, result)
+                except sqlite3.Error as e:
+                    result.warnings.append(f"記錄執行紀錄（用於估計）時發生錯誤：{e}")
+            if self.library is not None:
+                try:
+                    evicted = self.library.add(spec, result)
+                except (OSError, sqlite3.Error) as e:
+                    result.warnings.append(f"記錄到輸出資料庫時發生錯誤：{e}")
+                else:
+                    if evicted:
+                        result.warnings.append(
+                            f"輸出資料夾超過容量上限，已刪除 {len(evicted)} 份較舊的輸出："
+                            + "、".join(entry.final_base for entry in evicted)
+                        )
+            self._update(job_id, status=STATUS_DONE, result=result, finished_at=time.time())
+        finally:
+            with self._lock:
+                self._futures.pop(job_id, None)
+            if on_finish is not None:
+                on_finish()
+
+    def _update(self, job_id: str, **changes) -> JobRecord:
+        with self._lock:
+            record = self._jobs[job_id]
+            for name, value in changes.items():
+                setattr(record, name, value)
+            return replace(record)
+
+    def _prune_locked(self):
+        finished = [job_id for job_id, record in self._jobs.items() if not record.is_active]
+        for job_id in finished[: max(0, len(self._jobs) - self.max_history)]:
+            del self._jobs[job_id]
+
+    def cancel(self, job_id: str) -> bool:
+        """取消還在排隊的工作；已開始執行的工作無法中途停止。"""
+        with self._lock:
+            future = self._futures.get(job_id)
+            if future is None or not future.cancel():
+                return False
+            self._futures.pop(job_id, None)
+            record = self._jobs[job_id]
+            record.status = STATUS_CANCELED
+            record.finished_at = time.time()
+            return True
+
+    def get(self, job_id: str) -> Optional[JobRecord]:
+        with self._lock:
+            record = self._jobs.get(job_id)
+            return replace(record) if record is not None else None
+
+    def list_jobs(self) -> List[JobRecord]:
+        """所有工作的複本，最新送出的在前面。"""
+        with self._lock:
+            return [replace(record) for record in reversed(self._jobs.values())]
+
+    def has_active(self) -> bool:
+        with self._lock:
+            return any(record.is_active for record in self._jobs.values())
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
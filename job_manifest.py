@@ -0,0 +1,306 @@
+"""工作清單檔（manifest）：記錄每份工作的分段、文字雜湊與完成狀態，讓失敗的工作可以續傳。
+
+每份工作在 `<輸出資料夾>/.jobs/<final_base>/` 底下有：
+- `manifest.json`：工作設定（`JobSpec`，原文除外）與每段的狀態、長度、bookmark、逐字時間；
+- `progress.jsonl`：每完成一段附加一行（長度、bookmark、逐字時間），不必每段都重寫整份清單檔；
+  讀取清單檔時依序套用，建立與失敗時才合併回 `manifest.json` 並清空；
+- `source.md`：原始 Markdown，只寫一次，清單檔更新時不必重寫整份原文；
+- `part_NNN.mp3`（或 `.wav`）：已完成的分段音訊，每段完成就立刻寫入，只在續傳時讀回。
+
+例如 40 段中的第 37 段被取消時，前面完成的段落都已在磁碟上；
+續傳時只合成雜湊對得上、但還沒完成的段落，再做合併與影片。工作成功後整個資料夾會被刪除。
+
+分段檔每次執行都會寫，成功的工作等於多了 N 次建立與一次 `rmtree`。這是刻意的：
+只在失敗或取消時才寫，程式被強制結束或當機時就什麼都沒留下，續傳也就無從談起。
+分段檔以 `_atomic_write`（暫存檔 + `os.replace`）寫入，中斷時不會留下寫到一半的分段檔；
+進度那一行在分段檔就位之後才附加，所以有進度紀錄的段落一定有完整的分段檔。
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from audio_formats import AUDIO_FORMATS, DEFAULT_AUDIO_FORMAT
+from tts_engine import SynthesisOutput
+
+
+MANIFEST_VERSION = 1
+JOBS_DIRNAME = ".jobs"
+MANIFEST_FILENAME = "manifest.json"
+SOURCE_FILENAME = "source.md"
+PROGRESS_FILENAME = "progress.jsonl"
+
+SEGMENT_PENDING = "pending"
+SEGMENT_DONE = "done"
+SEGMENT_FAILED = "failed"
+
+JOB_RUNNING = "running"
+JOB_FAILED = "failed"
+
+
+def payload_hash(payload: str) -> str:
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def job_dir_for(output_dir: str, final_base: str) -> str:
+    return os.path.join(output_dir, JOBS_DIRNAME, final_base)
+
+
+def part_path_for(job_dir: str, index: int, audio_format: str) -> str:
+    return os.path.join(job_dir, f"part_{index:03d}.{AUDIO_FORMATS[audio_format].extension}")
+
+
+@dataclass
+class SegmentEntry:
+    index: int
+    text_hash: str
+    chars: int
+    state: str = SEGMENT_PENDING
+    # 這一段在幾次工作（含續傳）中重試後仍失敗；不含引擎內部的退避重試
+    attempts: int = 0
+    duration: float = 0.0
+    bookmarks: List[Tuple[str, float]] = field(default_factory=list)
+    words: List[Tuple[float, float, str]] = field(default_factory=list)
+    error: str = ""
+
+    def apply_done(self, duration: float, bookmarks, words) -> None:
+        self.state = SEGMENT_DONE
+        self.duration = duration
+        self.bookmarks = [tuple(b) for b in bookmarks]
+        self.words = [tuple(w) for w in words]
+        self.error = ""
+
+
+class JobManifest:
+    """單份工作的清單檔；只由執行該工作的執行緒修改，寫入時先寫暫存檔再改名。"""
+
+    def __init__(
+        self,
+        job_dir: str,
+        final_base: str,
+        spec: Dict,
+        segments: List[SegmentEntry],
+        status: str = JOB_RUNNING,
+        error: str = "",
+        created_at: Optional[float] = None,
+        updated_at: Optional[float] = None,
+        audio_format: str = DEFAULT_AUDIO_FORMAT,
+    ):
+        self.job_dir = job_dir
+        self.final_base = final_base
+        self.spec = spec
+        self.segments = segments
+        self.audio_format = audio_format
+        self.status = status
+        self.error = error
+        self.created_at = created_at or time.time()
+        self.updated_at = updated_at or self.created_at
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.job_dir, MANIFEST_FILENAME)
+
+    @property
+    def source_path(self) -> str:
+        return os.path.join(self.job_dir, SOURCE_FILENAME)
+
+    def read_source(self) -> str:
+        with open(self.source_path, encoding="utf-8") as f:
+            return f.read()
+
+    def part_path(self, index: int) -> str:
+        return part_path_for(self.job_dir, index, self.audio_format)
+
+    @property
+    def progress_path(self) -> str:
+        return os.path.join(self.job_dir, PROGRESS_FILENAME)
+
+    def part_paths(self) -> List[str]:
+        return [self.part_path(entry.index) for entry in self.segments]
+
+    @property
+    def done_count(self) -> int:
+        return sum(1 for entry in self.segments if entry.state == SEGMENT_DONE)
+
+    def pending_indices(self) -> List[int]:
+        return [entry.index for entry in self.segments if entry.state != SEGMENT_DONE]
+
+    @property
+    def failed_segment(self) -> Optional[SegmentEntry]:
+        return next((entry for entry in self.segments if entry.state == SEGMENT_FAILED), None)
+
+    @classmethod
+    def load(cls, path: str) -> "JobManifest":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != MANIFEST_VERSION:
+            raise ValueError(f"不支援的工作清單版本：{data.get('version')}")
+        segments = [
+            SegmentEntry(
+                **{
+                    **entry,
+                    "bookmarks": [tuple(b) for b in entry["bookmarks"]],
+                    "words": [tuple(w) for w in entry.get("words", [])],
+                }
+            )
+            for entry in data["segments"]
+        ]
+        _replay_progress(os.path.join(os.path.dirname(path), PROGRESS_FILENAME), segments)
+        return cls(
+            job_dir=os.path.dirname(path),
+            final_base=data["final_base"],
+            spec=data["spec"],
+            segments=segments,
+            status=data.get("status", JOB_RUNNING),
+            error=data.get("error", ""),
+            created_at=data.get("created_at"),
+            updated_at=data.get("updated_at"),
+            # 加入格式選擇之前的清單檔一律是預設的 MP3 格式
+            audio_format=data.get("audio_format", DEFAULT_AUDIO_FORMAT),
+        )
+
+    @classmethod
+    def create(
+        cls,
+        output_dir: str,
+        final_base: str,
+        spec: Dict,
+        raw_markdown: str,
+        payloads: Sequence[str],
+        audio_format: str = DEFAULT_AUDIO_FORMAT,
+    ) -> "JobManifest":
+        """建立新的清單檔；同名工作已有清單檔時沿用其中雜湊相同、分段檔也還在的已完成段落。
+
+        `spec` 為不含原文的工作設定，原文另存成 `source.md`。輸出格式與上次不同時不沿用任何段落。
+        """
+        job_dir = job_dir_for(output_dir, final_base)
+        previous: Dict[int, SegmentEntry] = {}
+        created_at = None
+        path = os.path.join(job_dir, MANIFEST_FILENAME)
+        if os.path.exists(path):
+            try:
+                old = cls.load(path)
+            except (OSError, ValueError, KeyError, TypeError):
+                old = None
+            if old is not None:
+                created_at = old.created_at
+                if old.audio_format == audio_format:
+                    previous = {entry.index: entry for entry in old.segments}
+        os.makedirs(job_dir, exist_ok=True)
+
+        segments = []
+        for index, payload in enumerate(payloads, start=1):
+            entry = SegmentEntry(index=index, text_hash=payload_hash(payload), chars=len(payload))
+            old_entry = previous.get(index)
+            if old_entry is not None and old_entry.text_hash == entry.text_hash:
+                entry.attempts = old_entry.attempts
+                if old_entry.state == SEGMENT_DONE and os.path.exists(part_path_for(job_dir, index, audio_format)):
+                    entry.apply_done(old_entry.duration, old_entry.bookmarks, old_entry.words)
+            segments.append(entry)
+        manifest = cls(job_dir, final_base, spec, segments, created_at=created_at, audio_format=audio_format)
+        manifest._atomic_write(manifest.source_path, raw_markdown.encode("utf-8"))
+        manifest.save()
+        return manifest
+
+    def save(self):
+        """寫出完整的清單檔；`progress.jsonl` 已合併進來，隨後清空。"""
+        self.updated_at = time.time()
+        data = {
+            "version": MANIFEST_VERSION,
+            "final_base": self.final_base,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "audio_format": self.audio_format,
+            "spec": self.spec,
+            "segments": [asdict(entry) for entry in self.segments],
+        }
+        self._atomic_write(self.path, json.dumps(data, ensure_ascii=False, indent=1).encode("utf-8"))
+        try:
+            os.remove(self.progress_path)
+        except FileNotFoundError:
+            pass
+
+    def _atomic_write(self, path: str, payload: bytes):
+        fd, tmp_path = tempfile.mkstemp(dir=self.job_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def mark_done(self, index: int, output: SynthesisOutput, duration: float):
+        """以原子寫入存下分段檔，再附加一行進度；進度那一行寫完之前中斷的段落續傳時會重新合成。"""
+        self._atomic_write(self.part_path(index), output.audio_data)
+        self.segments[index - 1].apply_done(duration, output.bookmarks, output.words)
+        line = {"index": index, "duration": duration, "bookmarks": output.bookmarks, "words": output.words}
+        with open(self.progress_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+    def mark_failed(self, error: str, index: Optional[int] = None):
+        if index is not None and self.segments[index - 1].state != SEGMENT_DONE:
+            self.segments[index - 1].state = SEGMENT_FAILED
+            self.segments[index - 1].error = error
+            self.segments[index - 1].attempts += 1
+        self.status = JOB_FAILED
+        self.error = error
+        self.save()
+
+    def load_output(self, index: int) -> SynthesisOutput:
+        """讀回上次完成的分段（續傳時沿用）；本次合成的段落直接用記憶體中的結果。"""
+        entry = self.segments[index - 1]
+        with open(self.part_path(index), "rb") as f:
+            return SynthesisOutput(
+                audio_data=f.read(),
+                audio_duration=entry.duration,
+                bookmarks=list(entry.bookmarks),
+                words=list(entry.words),
+            )
+
+    def remove(self):
+        """工作完成後刪除清單檔與分段檔。"""
+        shutil.rmtree(self.job_dir, ignore_errors=True)
+
+
+def _replay_progress(path: str, segments: List[SegmentEntry]) -> None:
+    """依序套用 `progress.jsonl`；最後一行寫到一半（程式在寫入時中斷）時略過。"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return
+    for line in lines:
+        try:
+            done = json.loads(line)
+            entry = segments[done["index"] - 1]
+        except (ValueError, KeyError, IndexError):
+            continue
+        entry.apply_done(done["duration"], done["bookmarks"], done["words"])
+
+
+def find_resumable(output_dir: str) -> List[JobManifest]:
+    """輸出資料夾中所有未完成的工作，最近更新的在前面。"""
+    root = os.path.join(output_dir, JOBS_DIRNAME)
+    manifests = []
+    try:
+        names = os.listdir(root)
+    except FileNotFoundError:
+        return []
+    for name in names:
+        path = os.path.join(root, name, MANIFEST_FILENAME)
+        try:
+            manifests.append(JobManifest.load(path))
+        except (OSError, ValueError, KeyError, TypeError):
+            continue
+    manifests.sort(key=lambda m: m.updated_at, reverse=True)
+    return manifests
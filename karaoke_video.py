@@ -0,0 +1,184 @@
+"""逐行字幕（karaoke）影片的靜態畫面：每個字幕預先畫成一張圖，再依字幕時間排成 concat 清單。
+
+黑底影片只有聲音，拿來練習跟讀時看不到正在唸哪一行；若用 ffmpeg `drawtext` 逐格疊字，
+每秒 30 格都要重畫、重新編碼，本來就慢的影片步驟會更慢。
+
+字幕在一行唸完之前不會變，所以這裡每個字幕只畫一張 PNG（目前這行白色置中，上一行與下一行灰色），
+`video_render` 再以 concat demuxer 的 `duration` 指定每張圖顯示多久、以可變影格率編碼：
+編碼的影格數等於字幕數，與影片長度、每秒格數無關。
+
+畫圖需要 Pillow（選用，`pip install pillow`）；沒有時 `tts_pipeline` 改用一般的靜態黑底畫面。
+時間點取自 `subtitles.Cue`，與 `.srt` / `.vtt` 相同；concat demuxer 以圖片的 1/25 秒時基換算，
+換行的時間點誤差在半格（20 ms）以內。
+"""
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:  # 逐行字幕影片是選用功能，沒有 Pillow 時改用黑底畫面
+    Image = None
+
+from subtitles import Cue
+
+
+# 依序嘗試的字型；都找不到時用 Pillow 內建字型
+FONT_CANDIDATES = (
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/System/Library/Fonts/Helvetica.ttc",
+    "C:\\Windows\\Fonts\\arial.ttf",
+    "C:\\Windows\\Fonts\\msjh.ttc",
+)
+# 畫面只有黑白灰，以灰階（"L"）畫圖：PNG 要壓縮的資料只有 RGB 的三分之一，寫一張約快 3 倍
+BACKGROUND = 0
+CURRENT_COLOR = 255
+CONTEXT_COLOR = 110
+# 目前這行的字高約為畫面高度的 1/14，上下文的字小一點
+CURRENT_SIZE_RATIO = 1 / 14
+CONTEXT_SIZE_RATIO = 1 / 22
+# 左右各留畫面寬度的 8%
+MARGIN_RATIO = 0.08
+
+# 圖片路徑（None 表示全黑畫面）與顯示秒數
+TimelineEntry = Tuple[Optional[str], float]
+
+
+def karaoke_available() -> bool:
+    return Image is not None
+
+
+def load_font(size: int, font_path: Optional[str] = None):
+    for path in ((font_path,) if font_path else FONT_CANDIDATES):
+        if path and os.path.exists(path):
+            return ImageFont.truetype(path, size)
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow 10.1 之前的內建字型不能調整大小
+        return ImageFont.load_default()
+
+
+def _wrap(draw, text: str, font, max_width: int) -> List[str]:
+    """依實際字寬折行；單一個字就超過寬度時照樣單獨一行。"""
+    lines: List[str] = []
+    current = ""
+    for word in text.split():
+        candidate = f"{current} {word}" if current else word
+        if current and draw.textlength(candidate, font=font) > max_width:
+            lines.append(current)
+            current = word
+        else:
+            current = candidate
+    if current:
+        lines.append(current)
+    return lines
+
+
+def _context(cues: Sequence[Cue], position: int, step: int) -> str:
+    """往前（step=-1）或往後找第一個文字不同的字幕；跟讀模式重複的同一行不算上下文。"""
+    text = cues[position].text
+    position += step
+    while 0 <= position < len(cues):
+        if cues[position].text != text:
+            return cues[position].text
+        position += step
+    return ""
+
+
+class StillRenderer:
+    """畫出一個字幕的畫面並寫成 PNG；同樣內容的畫面只畫一次。"""
+
+    def __init__(self, width: int, height: int, out_dir: str, font_path: Optional[str] = None):
+        if Image is None:
+            raise RuntimeError("逐行字幕影片需要 Pillow（pip install pillow）")
+        self.width = width
+        self.height = height
+        self.out_dir = out_dir
+        self.current_font = load_font(int(height * CURRENT_SIZE_RATIO), font_path)
+        self.context_font = load_font(int(height * CONTEXT_SIZE_RATIO), font_path)
+        self._paths: Dict[Tuple[str, str, str], str] = {}
+
+    def _block(self, draw, text: str, font) -> Tuple[List[str], int]:
+        lines = _wrap(draw, " ".join(text.split()), font, int(self.width * (1 - 2 * MARGIN_RATIO)))
+        ascent, descent = font.getmetrics()
+        return lines, ascent + descent
+
+    def _draw_lines(self, draw, lines: List[str], line_height: int, top: int, font, color) -> None:
+        for row, line in enumerate(lines):
+            left = (self.width - draw.textlength(line, font=font)) / 2
+            draw.text((left, top + row * line_height), line, font=font, fill=color)
+
+    def render(self, previous: str, current: str, following: str) -> str:
+        key = (previous, current, following)
+        if key in self._paths:
+            return self._paths[key]
+        image = Image.new("L", (self.width, self.height), BACKGROUND)
+        draw = ImageDraw.Draw(image)
+        lines, line_height = self._block(draw, current, self.current_font)
+        gap = line_height // 2
+        top = (self.height - line_height * len(lines)) // 2
+        self._draw_lines(draw, lines, line_height, top, self.current_font, CURRENT_COLOR)
+        if previous:
+            above, context_height = self._block(draw, previous, self.context_font)
+            self._draw_lines(
+                draw, above, context_height, top - gap - context_height * len(above), self.context_font, CONTEXT_COLOR
+            )
+        if following:
+            below, context_height = self._block(draw, following, self.context_font)
+            bottom = top + line_height * len(lines) + gap
+            self._draw_lines(draw, below, context_height, bottom, self.context_font, CONTEXT_COLOR)
+        path = os.path.join(self.out_dir, f"still_{len(self._paths):05d}.png")
+        # 壓縮等級 1：PNG 只是交給 x264 的中繼檔，寫得快比檔案小重要
+        image.save(path, compress_level=1)
+        self._paths[key] = path
+        return path
+
+    @property
+    def count(self) -> int:
+        return len(self._paths)
+
+
+def build_timeline(
+    cues: Sequence[Cue],
+    renderer: StillRenderer,
+    lead_seconds: float,
+    total_seconds: float,
+) -> List[TimelineEntry]:
+    """每個字幕從開始顯示到下一個字幕開始；第一個字幕之前（含影片開頭空白）是全黑畫面。
+
+    `total_seconds` 是含開頭空白的影片長度；最後一個字幕一直顯示到結尾。
+    相鄰兩個畫面相同時（跟讀重複的同一行）合併成一個項目。
+    """
+    timeline: List[TimelineEntry] = []
+
+    def append(path: Optional[str], duration: float):
+        if timeline and timeline[-1][0] == path:
+            timeline[-1] = (path, timeline[-1][1] + duration)
+        else:
+            timeline.append((path, duration))
+
+    starts = []
+    for cue in cues:
+        starts.append(min(max(cue.start + lead_seconds, starts[-1] if starts else 0.0), total_seconds))
+    append(None, starts[0] if starts else total_seconds)
+    for index, cue in enumerate(cues):
+        duration = (starts[index + 1] if index + 1 < len(cues) else total_seconds) - starts[index]
+        if duration > 0:
+            append(renderer.render(_context(cues, index, -1), cue.text, _context(cues, index, 1)), duration)
+    return [entry for entry in timeline if entry[1] > 0]
+
+
+def write_concat_list(list_path: str, timeline: Sequence[TimelineEntry], blank_path: str) -> None:
+    """寫出 concat demuxer 清單；最後一張圖要再列一次，否則它的 `duration` 會被忽略。"""
+    with open(list_path, "w", encoding="utf-8") as f:
+        for path, duration in timeline:
+            f.write(f"file '{os.path.abspath(path or blank_path)}'\nduration {duration:.6f}\n")
+        if timeline:
+            f.write(f"file '{os.path.abspath(timeline[-1][0] or blank_path)}'\n")
+
+
+def render_blank(width: int, height: int, out_dir: str) -> str:
+    path = os.path.join(out_dir, "still_blank.png")
+    Image.new("L", (width, height), BACKGROUND).save(path, compress_level=1)
+    return path
@@ -0,0 +1,250 @@
+"""純 Python 的 MP3（MPEG Audio Layer III）frame 解析與串接。
+
+Azure 回傳的每段 MP3 都是完整的獨立檔案，可能帶有：
+- 開頭的 ID3v2 標籤、結尾的 ID3v1 標籤（`TAG`）；
+- 第一個 frame 內的 Xing / Info / VBRI 標頭（記錄「這一段」的 frame 數與長度）。
+直接把位元組接在一起時，這些標頭會讓播放器把整個檔案的長度誤判成第一段的長度，
+或在段落交界處讀到雜訊。這裡把每段拆回純音訊 frame 再依序寫出，
+效果等同 `ffmpeg -f concat -c copy`，但不需要暫存分段檔、也不需要啟動 ffmpeg。
+
+合併後的檔案不再寫入新的 Xing 標頭；Azure 輸出為固定位元率（CBR），
+播放器可直接由位元率推算長度。
+"""
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+
+# Layer III 位元率表（kbps），索引為 header 中的 4-bit bitrate index
+_BITRATES_V1 = [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320]
+_BITRATES_V2 = [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],  # MPEG-1
+    2: [22050, 24000, 16000],  # MPEG-2
+    0: [11025, 12000, 8000],  # MPEG-2.5
+}
+
+
+@dataclass(frozen=True)
+class FrameHeader:
+    version: int  # 3 = MPEG-1, 2 = MPEG-2, 0 = MPEG-2.5
+    bitrate: int  # bps
+    sample_rate: int
+    padding: int
+    channels: int
+    protected: bool  # 有 CRC 時 header 後面多 2 bytes
+
+    @property
+    def frame_length(self) -> int:
+        coef = 144 if self.version == 3 else 72
+        return coef * self.bitrate // self.sample_rate + self.padding
+
+    @property
+    def samples(self) -> int:
+        return 1152 if self.version == 3 else 576
+
+    @property
+    def side_info_length(self) -> int:
+        if self.version == 3:
+            return 17 if self.channels == 1 else 32
+        return 9 if self.channels == 1 else 17
+
+
+def parse_header(data, offset: int = 0) -> Optional[FrameHeader]:
+    """解析 offset 處的 4-byte frame header；不是合法的 Layer III header 時回傳 None。"""
+    if offset + 4 > len(data):
+        return None
+    b0, b1, b2, b3 = data[offset], data[offset + 1], data[offset + 2], data[offset + 3]
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    version = (b1 >> 3) & 0x03
+    layer = (b1 >> 1) & 0x03
+    if version == 1 or layer != 0x01:
+        return None
+    bitrate_index = (b2 >> 4) & 0x0F
+    sample_rate_index = (b2 >> 2) & 0x03
+    if bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    table = _BITRATES_V1 if version == 3 else _BITRATES_V2
+    return FrameHeader(
+        version=version,
+        bitrate=table[bitrate_index] * 1000,
+        sample_rate=_SAMPLE_RATES[version][sample_rate_index],
+        padding=(b2 >> 1) & 0x01,
+        channels=1 if (b3 >> 6) == 0x03 else 2,
+        protected=(b1 & 0x01) == 0,
+    )
+
+
+def _id3v2_length(data) -> int:
+    if len(data) < 10 or bytes(data[:3]) != b"ID3":
+        return 0
+    size = 0
+    for b in data[6:10]:
+        size = (size << 7) | (b & 0x7F)
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _is_vbr_info_frame(data, offset: int, header: FrameHeader) -> bool:
+    pos = offset + 4 + (2 if header.protected else 0) + header.side_info_length
+    if bytes(data[pos:pos + 4]) in (b"Xing", b"Info"):
+        return True
+    return bytes(data[offset + 36:offset + 40]) == b"VBRI"
+
+
+def iter_frames(data) -> Iterator[Tuple[int, int, FrameHeader]]:
+    """依序產生 (offset, length, header)，略過 ID3 標籤、Xing/Info/VBRI frame 與無法同步的雜訊。"""
+    view = memoryview(data)
+    start = _id3v2_length(view)
+    end = len(view)
+    if end - start >= 128 and bytes(view[end - 128:end - 125]) == b"TAG":
+        end -= 128
+
+    offset = start
+    first = True
+    while offset + 4 <= end:
+        header = parse_header(view, offset)
+        if header is None:
+            offset += 1
+            continue
+        length = header.frame_length
+        if offset + length > end:
+            break
+        # 重新同步時，要求下一個 frame 也合法，避免把音訊資料中的 0xFFE 誤認為 header
+        nxt = offset + length
+        if nxt + 4 <= end and parse_header(view, nxt) is None:
+            offset += 1
+            continue
+        if first and _is_vbr_info_frame(view, offset, header):
+            first = False
+            offset = nxt
+            continue
+        first = False
+        yield offset, length, header
+        offset = nxt
+
+
+def audio_frames(data) -> Tuple[List[memoryview], int, Optional[FrameHeader]]:
+    """回傳 (frame 切片列表, 總取樣數, 第一個 frame 的 header)。"""
+    view = memoryview(data)
+    frames = []
+    samples = 0
+    first_header = None
+    for offset, length, header in iter_frames(view):
+        if first_header is None:
+            first_header = header
+        frames.append(view[offset:offset + length])
+        samples += header.samples
+    return frames, samples, first_header
+
+
+def mp3_duration(data) -> float:
+    """依 frame 數計算 MP3 長度（秒）。"""
+    _frames, samples, header = audio_frames(data)
+    return samples / header.sample_rate if header else 0.0
+
+
+def split_mp3(data, boundaries: Sequence[float]) -> List[bytes]:
+    """在 `boundaries`（遞增的秒數）切開，回傳 len(boundaries) + 1 段；不重新編碼，只掃過一次。
+
+    每個 frame 依開始時間歸到所在的那一段，所以切點只能落在 frame 邊界上
+    （16 kHz 時約 72 ms 一格）；呼叫端應盡量把切點放在停頓裡。
+    """
+    view = memoryview(data)
+    pieces: List[List[memoryview]] = [[] for _ in range(len(boundaries) + 1)]
+    piece = 0
+    position = 0.0
+    for offset, length, header in iter_frames(view):
+        while piece < len(boundaries) and position >= boundaries[piece]:
+            piece += 1
+        pieces[piece].append(view[offset:offset + length])
+        position += header.samples / header.sample_rate
+    return [b"".join(frames) for frames in pieces]
+
+
+# Azure 的 Audio16Khz32KBitRateMonoMp3 對應的 frame 參數
+AZURE_16K_MONO = FrameHeader(version=2, bitrate=32000, sample_rate=16000, padding=0, channels=1, protected=False)
+
+
+def encode_header(header: FrameHeader) -> bytes:
+    table = _BITRATES_V1 if header.version == 3 else _BITRATES_V2
+    b1 = 0xE0 | (header.version << 3) | (0x01 << 1) | (0 if header.protected else 1)
+    b2 = (table.index(header.bitrate // 1000) << 4) | (_SAMPLE_RATES[header.version].index(header.sample_rate) << 2)
+    b2 |= header.padding << 1
+    b3 = 0xC0 if header.channels == 1 else 0x00
+    return bytes([0xFF, b1, b2, b3])
+
+
+def silent_mp3(seconds: float, template: FrameHeader = AZURE_16K_MONO) -> bytes:
+    """產生與 `template` 相同參數、長度約 `seconds` 秒的靜音 MP3。
+
+    side info 全為 0（part2_3_length = 0、global_gain = 0）的 frame 解碼後就是靜音，
+    不需要任何編碼器。
+    """
+    header = FrameHeader(template.version, template.bitrate, template.sample_rate, 0, template.channels, False)
+    frame = encode_header(header) + bytes(header.frame_length - 4)
+    count = max(0, round(seconds * header.sample_rate / header.samples))
+    return frame * count
+
+
+class Mp3Joiner:
+    """把依序交付的各段 MP3 拆成純音訊 frame，串流寫進單一輸出檔。
+
+    可直接當作 `tts_engine.synthesize_segments` 的 `on_audio` sink 使用；
+    寫入暫存檔，`with` 區塊正常結束時才 `os.replace` 成正式檔名，失敗則刪除暫存檔。
+    """
+
+    def __init__(self, output_path: str):
+        self.output_path = output_path
+        self.sample_rate: Optional[int] = None
+        self.channels: Optional[int] = None
+        self.total_samples = 0
+        self.bytes_written = 0
+        directory = os.path.dirname(os.path.abspath(output_path))
+        fd, self._tmp_path = tempfile.mkstemp(dir=directory, suffix=".mp3.tmp")
+        self._file = os.fdopen(fd, "wb")
+
+    def __call__(self, index: int, output) -> None:
+        self.append(output.audio_data, label=f"第 {index} 段")
+
+    def append(self, data: bytes, label: str = "分段") -> None:
+        frames, samples, header = audio_frames(data)
+        if header is None:
+            raise ValueError(f"{label}沒有可辨識的 MP3 音訊 frame")
+        if self.sample_rate is None:
+            self.sample_rate, self.channels = header.sample_rate, header.channels
+        elif (header.sample_rate, header.channels) != (self.sample_rate, self.channels):
+            raise ValueError(
+                f"{label}的取樣率 / 聲道（{header.sample_rate} Hz, {header.channels}ch）"
+                f"與前面的分段不同，無法直接串接"
+            )
+        self._file.writelines(frames)
+        self.total_samples += samples
+        self.bytes_written += sum(len(f) for f in frames)
+
+    @property
+    def duration(self) -> float:
+        return self.total_samples / self.sample_rate if self.sample_rate else 0.0
+
+    def commit(self) -> None:
+        self._file.close()
+        os.replace(self._tmp_path, self.output_path)
+
+    def abort(self) -> None:
+        self._file.close()
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+        return False
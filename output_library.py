@@ -0,0 +1,466 @@
+"""輸出資料庫：用一個 SQLite 索引記錄 `azure_outputs/` 裡每份工作的輸出，並限制總容量。
+
+原本每次執行都在 `azure_outputs/` 多出一組有時間戳的 MP3 / MP4 / .txt，從不刪除，
+用久了資料夾裡有上千個大檔，也很難找回之前做過的東西。這裡每份完成的工作記下
+標題、voice、音訊格式、文字雜湊、長度、檔案大小與各輸出檔路徑：
+
+- 依標題或檔名搜尋、依 voice / 是否有影片篩選，直接從索引查，不必掃資料夾；
+- 文字與影響輸出的設定都相同時（`job_key` 相同），直接取用舊的輸出，不再合成；
+- 設定容量上限後，超過時依「最舊的先刪」或「最少使用的先刪」刪除整組輸出檔。
+
+索引檔在 `<輸出資料夾>/.library.sqlite3`；`scan()` 可把加入索引前就存在的輸出補進來。
+用法：
+    python output_library.py Bahnhof               # 搜尋標題或檔名
+    python output_library.py --scan                # 把資料夾中既有的輸出補進索引
+    python output_library.py --quota-mb 5000 --policy least_used   # 依容量上限刪除
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+from tts_pipeline import DEFAULT_OUTPUT_DIR, JobResult, JobSpec, extract_heading, job_output_format, prepare_text
+
+
+LIBRARY_FILENAME = ".library.sqlite3"
+# 0 表示不限制容量；刪的是使用者自己的成品，預設不自動刪除
+DEFAULT_LIBRARY_MAX_BYTES = 0
+
+EVICTION_POLICIES = {
+    "oldest": "最舊的先刪",
+    "least_used": "最少使用的先刪",
+}
+DEFAULT_EVICTION_POLICY = "oldest"
+_EVICTION_ORDER = {
+    "oldest": "created_at ASC",
+    "least_used": "use_count ASC, last_used_at ASC",
+}
+
+# 不影響音訊與影片內容的設定，不列入 `job_key`
+_SETTINGS_NOT_IN_KEY = {"raw_markdown", "base_name", "output_dir", "max_workers", "merge_in_memory"}
+# 同一組輸出的各個檔案（`<final_base>` 後面接的部分）
+_OUTPUT_SUFFIXES = {
+    "audio": (".mp3", ".wav"),
+    "video": (".mp4",),
+    "subtitle": (".txt",),
+    "timing": ("_timed.txt",),
+    "srt": (".srt",),
+    "vtt": (".vtt",),
+    "description": ("_description.txt",),
+    "report": ("_report.json",),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outputs (
+    final_base TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    voice TEXT NOT NULL,
+    audio_format TEXT NOT NULL,
+    text_hash TEXT NOT NULL,
+    job_key TEXT,
+    char_count INTEGER NOT NULL DEFAULT 0,
+    audio_seconds REAL NOT NULL DEFAULT 0,
+    total_bytes INTEGER NOT NULL DEFAULT 0,
+    files TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL,
+    use_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS outputs_job_key ON outputs (job_key);
+CREATE INDEX IF NOT EXISTS outputs_text_hash ON outputs (text_hash);
+CREATE INDEX IF NOT EXISTS outputs_created_at ON outputs (created_at);
+"""
+
+
+def text_hash(display_text: str) -> str:
+    """清洗後、每句一行的文本（也就是字幕用 .txt 的內容）的雜湊；只差在空白的文本視為相同。"""
+    normalized = "\n".join(" ".join(line.split()) for line in display_text.strip().splitlines())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def job_key(display_text_hash: str, settings: Dict) -> str:
+    """文字雜湊加上所有會影響輸出的設定；相同時可直接沿用之前的輸出。
+
+    舊的執行報告裡沒有的設定以 `JobSpec` 的預設值補上，後來新增的選項不會讓舊輸出全部對不上。
+    """
+    merged = {**asdict(JobSpec(raw_markdown="")), **settings}
+    relevant = {name: value for name, value in merged.items() if name not in _SETTINGS_NOT_IN_KEY}
+    payload = json.dumps([display_text_hash, relevant], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def spec_key(spec: JobSpec) -> str:
+    return job_key(text_hash(prepare_text(spec.raw_markdown).display_text), asdict(spec))
+
+
+@dataclass
+class LibraryEntry:
+    final_base: str
+    title: str
+    voice: str
+    audio_format: str
+    text_hash: str
+    job_key: Optional[str]
+    char_count: int
+    audio_seconds: float
+    total_bytes: int
+    # 種類（audio / video / subtitle / timing / srt / vtt / description / report）→ 檔案路徑
+    files: Dict[str, str] = field(default_factory=dict)
+    created_at: float = 0.0
+    last_used_at: float = 0.0
+    use_count: int = 0
+
+    @property
+    def audio_path(self) -> Optional[str]:
+        return self.files.get("audio")
+
+    @property
+    def video_path(self) -> Optional[str]:
+        return self.files.get("video")
+
+    def files_exist(self) -> bool:
+        return all(os.path.exists(path) for path in self.files.values())
+
+    def to_result(self) -> JobResult:
+        """把舊的輸出當成這次的結果交回去（沿用時不重新合成）。"""
+        return JobResult(
+            final_base=self.final_base,
+            audio_path=self.files.get("audio", ""),
+            subtitle_path=self.files.get("subtitle", ""),
+            video_path=self.files.get("video"),
+            description_path=self.files.get("description"),
+            timing_path=self.files.get("timing"),
+            srt_path=self.files.get("srt"),
+            vtt_path=self.files.get("vtt"),
+            report_path=self.files.get("report"),
+            char_count=self.char_count,
+            audio_seconds=self.audio_seconds,
+            warnings=[f"文字與設定都和 {self.final_base} 相同，直接沿用之前的輸出，未重新合成。"],
+        )
+
+
+def _files_for(result: JobResult) -> Dict[str, str]:
+    files = {
+        "audio": result.audio_path,
+        "video": result.video_path,
+        "subtitle": result.subtitle_path,
+        "timing": result.timing_path,
+        "srt": result.srt_path,
+        "vtt": result.vtt_path,
+        "description": result.description_path,
+        "report": result.report_path,
+    }
+    return {kind: path for kind, path in files.items() if path and os.path.exists(path)}
+
+
+def _scanned_audio_format(settings: Dict, audio_path: str) -> str:
+    """有執行報告時依當時的設定算出格式；沒有時只能以副檔名表示。"""
+    known = {name: value for name, value in settings.items() if name in JobSpec.__dataclass_fields__}
+    known.pop("raw_markdown", None)
+    if known:
+        return job_output_format(JobSpec(raw_markdown="", **known)).key
+    return os.path.splitext(audio_path)[1][1:]
+
+
+def _total_bytes(files: Dict[str, str]) -> int:
+    total = 0
+    for path in files.values():
+        try:
+            total += os.path.getsize(path)
+        except OSError:
+            pass
+    return total
+
+
+class OutputLibrary:
+    """執行緒安全：背景工作執行緒寫入，網頁的腳本執行緒查詢，共用同一個連線並以鎖保護。"""
+
+    def __init__(
+        self,
+        output_dir: str = DEFAULT_OUTPUT_DIR,
+        max_bytes: int = DEFAULT_LIBRARY_MAX_BYTES,
+        policy: str = DEFAULT_EVICTION_POLICY,
+    ):
+        self.output_dir = output_dir
+        self.max_bytes = max_bytes
+        self.policy = policy if policy in EVICTION_POLICIES else DEFAULT_EVICTION_POLICY
+        self._lock = threading.Lock()
+        os.makedirs(output_dir, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(output_dir, LIBRARY_FILENAME), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._db:
+            self._db.executescript(_SCHEMA)
+
+    @staticmethod
+    def _entry(row: sqlite3.Row) -> LibraryEntry:
+        values = dict(row)
+        values["files"] = json.loads(values["files"])
+        return LibraryEntry(**values)
+
+    def _insert_locked(self, entry: LibraryEntry) -> None:
+        values = asdict(entry)
+        values["files"] = json.dumps(entry.files, ensure_ascii=False)
+        columns = ", ".join(values)
+        placeholders = ", ".join(f":{name}" for name in values)
+        with self._db:
+            self._db.execute(f"INSERT OR REPLACE INTO outputs ({columns}) VALUES ({placeholders})", values)
+
+    def add(self, spec: JobSpec, result: JobResult) -> List[LibraryEntry]:
+        """記錄一份完成的工作，並依容量上限刪除舊的輸出；回傳被刪除的項目。"""
+        prepared = prepare_text(spec.raw_markdown)
+        files = _files_for(result)
+        now = time.time()
+        entry = LibraryEntry(
+            final_base=result.final_base,
+            title=extract_heading(spec.raw_markdown),
+            voice=spec.voice,
+            audio_format=job_output_format(spec).key,
+            text_hash=text_hash(prepared.display_text),
+            job_key=spec_key(spec),
+            char_count=result.char_count,
+            audio_seconds=result.audio_seconds,
+            total_bytes=_total_bytes(files),
+            files=files,
+            created_at=now,
+            last_used_at=now,
+            use_count=1,
+        )
+        with self._lock:
+            self._insert_locked(entry)
+            return self._evict_locked(keep=entry.final_base)
+
+    def find(self, spec: JobSpec) -> Optional[LibraryEntry]:
+        """找內容與設定都相同、檔案也都還在的舊輸出；檔案已被手動刪掉的項目順便移出索引。
+
+        要做影片時，影片沒做成的那次輸出（只有音檔）不算命中，但仍留在索引中。
+        """
+        key = spec_key(spec)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM outputs WHERE job_key = ? ORDER BY created_at DESC", (key,)
+            ).fetchall()
+            for row in rows:
+                entry = self._entry(row)
+                if entry.files_exist():
+                    if spec.make_video and not entry.video_path:
+                        continue
+                    return entry
+                with self._db:
+                    self._db.execute("DELETE FROM outputs WHERE final_base = ?", (entry.final_base,))
+        return None
+
+    def touch(self, final_base: str) -> None:
+        """記錄一次取用（重新下載或直接沿用），「最少使用的先刪」依此排序。"""
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE outputs SET use_count = use_count + 1, last_used_at = ? WHERE final_base = ?",
+                (time.time(), final_base),
+            )
+
+    def get(self, final_base: str) -> Optional[LibraryEntry]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM outputs WHERE final_base = ?", (final_base,)).fetchone()
+        return self._entry(row) if row is not None else None
+
+    def search(
+        self,
+        query: str = "",
+        voice: str = "",
+        with_video: Optional[bool] = None,
+        limit: int = 50,
+    ) -> List[LibraryEntry]:
+        """依標題或檔名（部分比對、不分大小寫）搜尋，最新的在前面。"""
+        conditions, params = [], []
+        if query.strip():
+            pattern = "%" + query.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            conditions.append("(title LIKE ? ESCAPE '\\' OR final_base LIKE ? ESCAPE '\\')")
+            params += [pattern, pattern]
+        if voice:
+            conditions.append("voice = ?")
+            params.append(voice)
+        if with_video is not None:
+            conditions.append("files LIKE ?" if with_video else "files NOT LIKE ?")
+            params.append('%"video"%')
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT * FROM outputs {where} ORDER BY created_at DESC LIMIT ?", (*params, limit)
+            ).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def voices(self) -> List[str]:
+        with self._lock:
+            rows = self._db.execute("SELECT DISTINCT voice FROM outputs WHERE voice != '' ORDER BY voice").fetchall()
+        return [row[0] for row in rows]
+
+    def remove(self, final_base: str) -> None:
+        """刪除一組輸出檔並移出索引。"""
+        with self._lock:
+            self._remove_locked(final_base)
+
+    def _remove_locked(self, final_base: str) -> Optional[LibraryEntry]:
+        row = self._db.execute("SELECT * FROM outputs WHERE final_base = ?", (final_base,)).fetchone()
+        if row is None:
+            return None
+        entry = self._entry(row)
+        for path in entry.files.values():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        with self._db:
+            self._db.execute("DELETE FROM outputs WHERE final_base = ?", (final_base,))
+        return entry
+
+    def set_quota(self, max_bytes: int, policy: Optional[str] = None) -> List[LibraryEntry]:
+        with self._lock:
+            self.max_bytes = max_bytes
+            if policy in EVICTION_POLICIES:
+                self.policy = policy
+            return self._evict_locked()
+
+    def _evict_locked(self, keep: Optional[str] = None) -> List[LibraryEntry]:
+        if self.max_bytes <= 0:
+            return []
+        (total,) = self._db.execute("SELECT COALESCE(SUM(total_bytes), 0) FROM outputs").fetchone()
+        if total <= self.max_bytes:
+            return []
+        evicted = []
+        rows = self._db.execute(
+            f"SELECT final_base, total_bytes FROM outputs ORDER BY {_EVICTION_ORDER[self.policy]}"
+        ).fetchall()
+        for final_base, size in rows:
+            if total <= self.max_bytes:
+                break
+            # 剛完成的那一份一定保留，即使它本身就超過上限
+            if final_base == keep:
+                continue
+            entry = self._remove_locked(final_base)
+            if entry is not None:
+                evicted.append(entry)
+                total -= size
+        return evicted
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, total, seconds = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(total_bytes), 0), COALESCE(SUM(audio_seconds), 0) FROM outputs"
+            ).fetchone()
+        return {
+            "entries": count,
+            "bytes": total,
+            "audio_seconds": seconds,
+            "max_bytes": self.max_bytes,
+            "policy": self.policy,
+        }
+
+    def scan(self) -> int:
+        """把輸出資料夾中還沒列入索引的輸出補進來；回傳新增的筆數。
+
+        以音檔（.mp3 / .wav）為準找同名的其他輸出；有 `_report.json` 時從中取出設定與長度，
+        才能算出 `job_key`，沒有報告的舊輸出只能搜尋，不會被直接沿用。
+        """
+        try:
+            names = set(os.listdir(self.output_dir))
+        except OSError:
+            return 0
+        with self._lock:
+            known = {row[0] for row in self._db.execute("SELECT final_base FROM outputs")}
+        added = 0
+        for name in sorted(names):
+            base, ext = os.path.splitext(name)
+            if ext not in _OUTPUT_SUFFIXES["audio"] or base in known:
+                continue
+            files = {
+                kind: os.path.join(self.output_dir, base + suffix)
+                for kind, suffixes in _OUTPUT_SUFFIXES.items()
+                for suffix in suffixes
+                if base + suffix in names and (kind != "audio" or suffix == ext)
+            }
+            entry = self._scanned_entry(base, files)
+            if entry is not None:
+                with self._lock:
+                    self._insert_locked(entry)
+                known.add(base)
+                added += 1
+        return added
+
+    @staticmethod
+    def _scanned_entry(final_base: str, files: Dict[str, str]) -> Optional[LibraryEntry]:
+        display_text = ""
+        if "subtitle" in files:
+            try:
+                with open(files["subtitle"], encoding="utf-8") as f:
+                    display_text = f.read()
+            except (OSError, UnicodeDecodeError):
+                pass
+        report = {}
+        if "report" in files:
+            try:
+                with open(files["report"], encoding="utf-8") as f:
+                    report = json.load(f)
+            except (OSError, ValueError):
+                pass
+        settings = report.get("settings", {})
+        totals = report.get("totals", {})
+        digest = text_hash(display_text)
+        try:
+            created_at = os.path.getmtime(files["audio"])
+        except OSError:
+            return None
+        lines = display_text.strip().splitlines()
+        return LibraryEntry(
+            final_base=final_base,
+            title=lines[0] if lines else final_base,
+            voice=settings.get("voice", ""),
+            audio_format=_scanned_audio_format(settings, files["audio"]),
+            text_hash=digest,
+            job_key=job_key(digest, settings) if settings and report.get("status") == "done" else None,
+            char_count=len(display_text),
+            audio_seconds=totals.get("audio_seconds", 0.0),
+            total_bytes=_total_bytes(files),
+            files=files,
+            created_at=created_at,
+            last_used_at=created_at,
+            use_count=0,
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("query", nargs="?", default="", help="搜尋標題或檔名")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR, help=f"輸出資料夾（預設 {DEFAULT_OUTPUT_DIR}）")
+    parser.add_argument("--voice", default="", help="只列出這個 voice 的輸出")
+    parser.add_argument("--scan", action="store_true", help="把資料夾中既有的輸出補進索引")
+    parser.add_argument("--quota-mb", type=int, default=0, help="容量上限（MB），超過時依 --policy 刪除輸出")
+    parser.add_argument("--policy", choices=list(EVICTION_POLICIES), default=DEFAULT_EVICTION_POLICY)
+    parser.add_argument("--limit", type=int, default=50, help="最多列出幾筆")
+    args = parser.parse_args(argv)
+
+    library = OutputLibrary(args.output_dir)
+    if args.scan:
+        print(f"已補進 {library.scan()} 份輸出。")
+    if args.quota_mb > 0:
+        for entry in library.set_quota(args.quota_mb * 1024 * 1024, args.policy):
+            print(f"已刪除 {entry.final_base}（{entry.total_bytes / 1024 / 1024:.1f} MB）")
+    for entry in library.search(args.query, voice=args.voice, limit=args.limit):
+        print(
+            f"{entry.final_base}  {entry.voice or '-'}  {entry.audio_seconds / 60:.1f} 分鐘  "
+            f"{entry.total_bytes / 1024 / 1024:.1f} MB  使用 {entry.use_count} 次"
+        )
+    stats = library.stats()
+    print(f"共 {stats['entries']} 份輸出，{stats['bytes'] / 1024 / 1024:.1f} MB。")
+    library.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""選用的 PCM 後製：段間靜音與整條音軌的音量，以 NumPy 處理解碼後的取樣，最後只編碼一次。
+
+記憶體合併（`Mp3Joiner` / `WavJoiner`）與 ffmpeg concat 都是原樣串接，每個接點都帶著
+Azure 產生的前後靜音，各段的音量也可能不一樣；要修正就得再對整個輸出檔跑幾次 ffmpeg。
+
+開啟後製時改向 Azure 要同取樣率的 PCM（見 `audio_formats.pcm_counterpart`），各段依序交給
+`PcmPostProcessor`：
+- 以 10 ms 為單位找出有聲音的範圍，去掉前後靜音（各留一點邊緣），段與段之間改成固定的停頓；
+  整段都是靜音的片段（例如跟讀模式的停頓）視為刻意的停頓，取代固定停頓；
+- 段內的 bookmark 與逐字時間減去去掉的開頭靜音，落在去掉的範圍裡的夾到保留範圍的頭尾；
+- 處理後的取樣寫進暫存檔，同時累計每 100 ms 的能量與峰值；
+- `commit` 時依整條音軌的響度算出一個增益（不超過峰值上限），邊讀暫存檔邊套用增益並交給編碼器，
+  WAV 直接寫出、MP3 經 ffmpeg 編碼一次。
+記憶體中只有目前這一段與每 100 ms 一個能量值，一小時的音軌也不需要整條波形放進 RAM。
+
+響度以 ITU-R BS.1770 的閘控方式（400 ms 區塊、-70 dB 絕對閘、-10 dB 相對閘）計算，
+但沒有 K 加權，單位是相對滿刻度的 dB；對語音來說與 LUFS 相差約 1–2 dB。
+"""
+import os
+import subprocess
+import tempfile
+from dataclasses import replace
+from typing import List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # 後製是選用功能，沒有 NumPy 時整個階段停用
+    np = None
+
+from wav_pcm import PcmFormat, parse_wav, wav_header
+
+
+DEFAULT_LOUDNESS_DB = -18.0
+PEAK_CEILING_DB = -1.0
+SILENCE_THRESHOLD_DB = -50.0
+# 去掉靜音時在有聲音的範圍前後各保留這麼多，避免切掉字首的氣音與字尾的尾音
+EDGE_PAD_MS = 40
+_FRAME_MS = 10
+_LOUDNESS_HOP_MS = 100
+_LOUDNESS_BLOCK_HOPS = 4
+_ABSOLUTE_GATE_DB = -70.0
+_RELATIVE_GATE_DB = -10.0
+# commit 時每次讀回、套用增益並送進編碼器的取樣數（16-bit 約 2 MB）
+_ENCODE_CHUNK_SAMPLES = 1 << 20
+_FULL_SCALE = 32768.0
+
+
+def postprocess_available() -> bool:
+    return np is not None
+
+
+def _db_to_power(db: float) -> float:
+    return 10 ** (db / 10)
+
+
+class PcmPostProcessor:
+    """依序接收各段 PCM WAV，寫出去掉段間多餘靜音、整條音量正規化後的音檔；介面與 `WavJoiner` 相同。
+
+    `__call__` 另外回傳 (這段保留的音訊在最終音軌中的開始秒數, bookmark 與逐字時間改成相對於保留範圍的這段)，
+    呼叫端以兩者相加換算每行、每個字在最終音軌中的時間。
+    `loudness_db` 為 0 時不做音量正規化。`bitrate` 為 0 時輸出 WAV，否則以 ffmpeg 編碼成 MP3。
+    """
+
+    def __init__(
+        self,
+        output_path: str,
+        gap_ms: int,
+        loudness_db: float = DEFAULT_LOUDNESS_DB,
+        bitrate: int = 0,
+    ):
+        if np is None:
+            raise RuntimeError("PCM 後製需要 NumPy（pip install numpy）")
+        self.output_path = output_path
+        self.gap_ms = gap_ms
+        self.loudness_db = loudness_db
+        self.bitrate = bitrate
+        self.format: Optional[PcmFormat] = None
+        self.samples_written = 0
+        self.trimmed_seconds = 0.0
+        self.gain_db = 0.0
+        self.measured_db: Optional[float] = None
+        self._pending = 0
+        self._pending_explicit = False
+        self._peak = 0
+        self._energies: List["np.ndarray"] = []
+        self._carry = np.zeros(0, dtype=np.float64)
+        directory = os.path.dirname(os.path.abspath(output_path))
+        fd, self._raw_path = tempfile.mkstemp(dir=directory, suffix=".pcm.tmp")
+        self._raw = os.fdopen(fd, "w+b")
+        self._out_path: Optional[str] = None
+
+    def __call__(self, index: int, output):
+        start, head, kept = self.append(output.audio_data, label=f"第 {index} 段")
+
+        def place(offset: float) -> float:
+            return min(max(offset - head, 0.0), kept)
+
+        return start, replace(
+            output,
+            audio_duration=kept,
+            bookmarks=[(mark, place(offset)) for mark, offset in output.bookmarks],
+            words=[(place(offset), length, text) for offset, length, text in output.words],
+        )
+
+    def _samples_per(self, ms: int) -> int:
+        return max(1, self.format.sample_rate * ms // 1000)
+
+    def _speech_bounds(self, samples) -> tuple:
+        """有聲音的範圍 [head, tail)（已加上邊緣）；整段都是靜音時 head >= tail。"""
+        frame = self._samples_per(_FRAME_MS)
+        count = len(samples) // frame
+        if count == 0:
+            return 0, 0
+        frames = samples[:count * frame].reshape(count, frame).astype(np.float32) / _FULL_SCALE
+        power = np.mean(frames * frames, axis=1)
+        voiced = np.flatnonzero(power > _db_to_power(SILENCE_THRESHOLD_DB))
+        if voiced.size == 0:
+            return 0, 0
+        pad = self._samples_per(EDGE_PAD_MS)
+        head = max(0, int(voiced[0]) * frame - pad)
+        tail = min(len(samples), (int(voiced[-1]) + 1) * frame + pad)
+        return head, tail
+
+    def _write(self, samples) -> None:
+        if not len(samples):
+            return
+        self._raw.write(samples.astype("<i2", copy=False).tobytes())
+        self.samples_written += len(samples)
+        self._peak = max(self._peak, int(np.abs(samples.astype(np.int32)).max()))
+        hop = self._samples_per(_LOUDNESS_HOP_MS)
+        values = np.concatenate([self._carry, samples.astype(np.float64) / _FULL_SCALE])
+        count = len(values) // hop
+        if count:
+            self._energies.append(np.mean(values[:count * hop].reshape(count, hop) ** 2, axis=1))
+        self._carry = values[count * hop:]
+
+    def append(self, data: bytes, label: str = "分段") -> Tuple[float, float, float]:
+        """回傳 (保留的音訊在音軌中的開始秒數, 去掉的開頭秒數, 保留的秒數)。"""
+        fmt, pcm = parse_wav(data)
+        if fmt is None or fmt.channels != 1 or fmt.bits_per_sample != 16:
+            raise ValueError(f"{label}不是可後製的 16-bit 單聲道 PCM WAV")
+        if self.format is None:
+            self.format = fmt
+        elif fmt != self.format:
+            raise ValueError(f"{label}的取樣率（{fmt.sample_rate} Hz）與前面的分段不同，無法串接")
+        samples = np.frombuffer(pcm, dtype="<i2")
+        head, tail = self._speech_bounds(samples)
+        if head >= tail:
+            # 刻意的停頓：取代段間的固定停頓，等下一段有聲音的片段出現時才寫出；連續的停頓累加
+            before = self._pending if self._pending_explicit else 0
+            self._pending = before + len(samples)
+            self._pending_explicit = True
+            return (self.samples_written + before) / fmt.sample_rate, 0.0, len(samples) / fmt.sample_rate
+        self._write(np.zeros(self._pending, dtype=np.int16))
+        start = self.samples_written
+        self._write(samples[head:tail])
+        self.trimmed_seconds += (len(samples) - (tail - head)) / fmt.sample_rate
+        self._pending = self._samples_per(self.gap_ms)
+        self._pending_explicit = False
+        return start / fmt.sample_rate, head / fmt.sample_rate, (tail - head) / fmt.sample_rate
+
+    @property
+    def duration(self) -> float:
+        return self.samples_written / self.format.sample_rate if self.format else 0.0
+
+    def _measure(self) -> Optional[float]:
+        """閘控後的整體響度（dB，相對滿刻度）；整條都是靜音時回傳 None。"""
+        if not self._energies:
+            return None
+        energies = np.concatenate(self._energies)
+        if len(energies) >= _LOUDNESS_BLOCK_HOPS:
+            kernel = np.full(_LOUDNESS_BLOCK_HOPS, 1 / _LOUDNESS_BLOCK_HOPS)
+            energies = np.convolve(energies, kernel, mode="valid")
+        blocks = energies[energies > _db_to_power(_ABSOLUTE_GATE_DB)]
+        if blocks.size == 0:
+            return None
+        blocks = blocks[blocks > blocks.mean() * _db_to_power(_RELATIVE_GATE_DB)]
+        return float(10 * np.log10(blocks.mean()))
+
+    def _gain_db(self) -> float:
+        self.measured_db = self._measure()
+        if not self.loudness_db or self.measured_db is None or self._peak == 0:
+            return 0.0
+        peak_db = 20 * np.log10(self._peak / _FULL_SCALE)
+        return float(min(self.loudness_db - self.measured_db, PEAK_CEILING_DB - peak_db))
+
+    def _open_encoder(self, directory: str):
+        fd, self._out_path = tempfile.mkstemp(dir=directory, suffix=".post.tmp")
+        if not self.bitrate:
+            out = os.fdopen(fd, "wb")
+            out.write(wav_header(self.format, self.samples_written * 2))
+            return out, None
+        os.close(fd)
+        process = subprocess.Popen(
+            [
+                "ffmpeg", "-y", "-loglevel", "error",
+                "-f", "s16le", "-ar", str(self.format.sample_rate), "-ac", "1", "-i", "pipe:0",
+                "-c:a", "libmp3lame", "-b:a", f"{self.bitrate // 1000}k", "-f", "mp3", self._out_path,
+            ],
+            stdin=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        return process.stdin, process
+
+    def commit(self) -> None:
+        if self._pending_explicit:
+            self._write(np.zeros(self._pending, dtype=np.int16))
+        if self.format is None:
+            self.format = PcmFormat(16000)
+        self.gain_db = self._gain_db()
+        gain = 10 ** (self.gain_db / 20)
+        out, process = self._open_encoder(os.path.dirname(os.path.abspath(self.output_path)))
+        try:
+            self._raw.seek(0)
+            while True:
+                chunk = self._raw.read(_ENCODE_CHUNK_SAMPLES * 2)
+                if not chunk:
+                    break
+                samples = np.frombuffer(chunk, dtype="<i2")
+                if gain != 1.0:
+                    scaled = np.rint(samples.astype(np.float32) * gain)
+                    samples = np.clip(scaled, -32768, 32767).astype("<i2")
+                out.write(samples.tobytes())
+            out.close()
+            if process is not None:
+                stderr = process.stderr.read()
+                if process.wait() != 0:
+                    raise RuntimeError(f"ffmpeg 編碼失敗：{stderr.decode('utf-8', 'replace').strip()}")
+        except BaseException:
+            if process is not None and process.poll() is None:
+                process.kill()
+                process.wait()
+            self.abort()
+            raise
+        self._raw.close()
+        os.remove(self._raw_path)
+        os.replace(self._out_path, self.output_path)
+        self._out_path = None
+
+    def abort(self) -> None:
+        self._raw.close()
+        for path in (self._raw_path, self._out_path):
+            if path:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        self._out_path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+        return False
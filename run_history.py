@@ -0,0 +1,299 @@
+"""從過去的執行學習的合成前估計：成品長度、合成與影片渲染時間、送出的字元數。
+
+送出前原本只看得到詞數、句數與預估段數；段長、語速都是寫死的常數，
+看不出一份文件要合成多久、影片要渲染多久，排大批次時只能猜。
+
+每份成功的工作完成後，`record` 把效能報告裡實際合成的每一段（命中快取、續傳沿用的不算）
+依 voice 記下字元數、停頓秒數、音訊秒數與請求耗時，影片則依設定檔記下影片秒數與渲染耗時，
+存在 `<輸出資料夾>/.run_history.sqlite3`。估計時每個 voice 取最近 `HISTORY_WINDOW` 段擬合：
+- 語速：音訊秒數 − 停頓 = 字元數 ÷ 每秒字元數（過原點的最小平方法）；
+- 每個請求：耗時 = 固定開銷 + 字元數 × 每字元秒數（含截距的最小平方法），
+  再依併發數與資源層級的限速換算成整份工作的合成時間；
+- 影片：耗時 = 固定開銷 + 影片秒數 × 每秒渲染秒數，依設定檔分開。
+資料不足 `MIN_SAMPLES` 筆時，語速退回 `VOICE_CHARS_PER_SECOND` 的預設值，時間則不估計。
+
+用法：
+    python run_history.py            # 列出各 voice 與影片設定檔目前學到的模型
+"""
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+from tts_pipeline import (
+    DEFAULT_OUTPUT_DIR,
+    DEFAULT_VOICE,
+    JobResult,
+    JobSpec,
+    SegmentPlan,
+    chars_per_second_for,
+    job_billable_chars,
+)
+from usage_quota import ResourceTier
+
+
+HISTORY_FILENAME = ".run_history.sqlite3"
+# 每個 voice / 影片設定檔只用最近這麼多筆擬合，語速或網路狀況改變後很快跟上
+HISTORY_WINDOW = 500
+MIN_SAMPLES = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    voice TEXT NOT NULL,
+    chars INTEGER NOT NULL,
+    pause_seconds REAL NOT NULL,
+    audio_seconds REAL NOT NULL,
+    wall_seconds REAL NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS segments_voice ON segments (voice, id);
+CREATE TABLE IF NOT EXISTS renders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    profile TEXT NOT NULL,
+    video_seconds REAL NOT NULL,
+    wall_seconds REAL NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS renders_profile ON renders (profile, id);
+"""
+
+
+@dataclass(frozen=True)
+class LinearFit:
+    """y = intercept + slope × x。"""
+
+    intercept: float
+    slope: float
+    samples: int
+
+    def predict(self, x: float) -> float:
+        return self.intercept + self.slope * x
+
+
+def fit_line(xs: Sequence[float], ys: Sequence[float]) -> Optional[LinearFit]:
+    """含截距的最小平方法；截距或斜率算出負值（資料太集中）時改成過原點的比例。"""
+    n = len(xs)
+    if n < MIN_SAMPLES:
+        return None
+    mean_x, mean_y = sum(xs) / n, sum(ys) / n
+    var_x = sum((x - mean_x) ** 2 for x in xs)
+    if var_x > 0:
+        slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var_x
+        intercept = mean_y - slope * mean_x
+        if slope >= 0 and intercept >= 0:
+            return LinearFit(intercept, slope, n)
+    total_x = sum(xs)
+    if total_x <= 0:
+        return LinearFit(mean_y, 0.0, n)
+    return LinearFit(0.0, sum(ys) / total_x, n)
+
+
+def fit_rate(xs: Sequence[float], ys: Sequence[float]) -> Optional[float]:
+    """過原點的最小平方法 y = k × x，回傳 k；資料不足時回傳 None。"""
+    if len(xs) < MIN_SAMPLES:
+        return None
+    denominator = sum(x * x for x in xs)
+    return sum(x * y for x, y in zip(xs, ys)) / denominator if denominator > 0 else None
+
+
+@dataclass(frozen=True)
+class VoiceModel:
+    voice: str
+    chars_per_second: float
+    # 單一請求的耗時；None 表示還沒有足夠的紀錄
+    request: Optional[LinearFit]
+    samples: int
+
+    @property
+    def learned(self) -> bool:
+        return self.samples >= MIN_SAMPLES
+
+
+@dataclass
+class JobEstimate:
+    """一份工作的合成前估計；`None` 的欄位表示還沒有足夠的紀錄可以估。"""
+
+    audio_seconds: float
+    synth_seconds: Optional[float]
+    render_seconds: Optional[float]
+    chars: int
+    requests: int
+    # 以歷史紀錄估計語速的 voice；不在這裡的 voice 用預設語速
+    learned_voices: List[str] = field(default_factory=list)
+
+    @property
+    def total_seconds(self) -> Optional[float]:
+        if self.synth_seconds is None:
+            return None
+        return self.synth_seconds + (self.render_seconds or 0.0)
+
+
+class RunHistory:
+    """執行緒安全；多個程序同時寫入時由 SQLite 的鎖保護。"""
+
+    def __init__(self, output_dir: str = DEFAULT_OUTPUT_DIR):
+        self.path = os.path.join(output_dir, HISTORY_FILENAME)
+        self._lock = threading.Lock()
+        os.makedirs(output_dir, exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        with self._db:
+            self._db.executescript(_SCHEMA)
+
+    def record(self, spec: JobSpec, result: JobResult) -> int:
+        """記下一份成功工作的實際數據，回傳記錄的分段數。"""
+        now = time.time()
+        rows = [
+            (
+                segment.get("voice") or spec.voice or DEFAULT_VOICE,
+                segment["chars"],
+                segment.get("pause_seconds", 0.0),
+                segment["audio_seconds"],
+                segment["wall_seconds"],
+                now,
+            )
+            for segment in result.report.get("segments", [])
+            # 命中快取與續傳沿用的段落沒有送出請求，耗時不能代表 Azure
+            if not segment["cached"] and not segment["resumed"] and segment["wall_seconds"] > 0
+        ]
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT INTO segments (voice, chars, pause_seconds, audio_seconds, wall_seconds, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            if result.video_path and result.render_seconds > 0:
+                self._db.execute(
+                    "INSERT INTO renders (profile, video_seconds, wall_seconds, created_at) VALUES (?, ?, ?, ?)",
+                    (spec.video_profile, result.audio_seconds + spec.video_lead_seconds, result.render_seconds, now),
+                )
+        return len(rows)
+
+    def voice_model(self, voice: str) -> VoiceModel:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT chars, pause_seconds, audio_seconds, wall_seconds FROM segments "
+                "WHERE voice = ? ORDER BY id DESC LIMIT ?",
+                (voice, HISTORY_WINDOW),
+            ).fetchall()
+        chars = [row[0] for row in rows]
+        seconds_per_char = fit_rate(chars, [max(0.0, audio - pause) for _c, pause, audio, _w in rows])
+        return VoiceModel(
+            voice=voice,
+            chars_per_second=1 / seconds_per_char if seconds_per_char else chars_per_second_for(voice),
+            request=fit_line(chars, [row[3] for row in rows]),
+            samples=len(rows),
+        )
+
+    def render_model(self, profile: str) -> Optional[LinearFit]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT video_seconds, wall_seconds FROM renders WHERE profile = ? ORDER BY id DESC LIMIT ?",
+                (profile, HISTORY_WINDOW),
+            ).fetchall()
+        return fit_line([row[0] for row in rows], [row[1] for row in rows])
+
+    def estimate(
+        self, spec: JobSpec, sentences: Sequence[str], plan: SegmentPlan, tier: Optional[ResourceTier] = None
+    ) -> JobEstimate:
+        """依目前的分段結果估計；命中分段快取的段落也算在內，所以合成時間與字元數是上限。"""
+        voices = plan.voices or [spec.voice or DEFAULT_VOICE] * len(plan.segments)
+        models: Dict[str, VoiceModel] = {voice: self.voice_model(voice) for voice in set(voices)}
+        pauses = plan.pause_seconds or [0.0] * len(plan.segments)
+        segment_audio = [
+            len(text) / models[voice].chars_per_second + pause
+            for text, voice, pause in zip(plan.segments, voices, pauses)
+        ]
+        if plan.track and not plan.is_dialogue:
+            # 跟讀模式：每行重複 shadowing_repeats 次，每次後面接一段停頓
+            gap = spec.shadowing_gap_ms / 1000
+            audio_seconds = sum(segment_audio[index - 1] + gap for _line, index in plan.track) * spec.shadowing_repeats
+        else:
+            audio_seconds = sum(segment_audio)
+
+        synth_seconds = None
+        if plan.segments and all(models[voice].request is not None for voice in models):
+            walls = [models[voice].request.predict(len(text)) for text, voice in zip(plan.segments, voices)]
+            workers = max(1, min(spec.max_workers, len(walls)))
+            synth_seconds = max(max(walls), sum(walls) / workers)
+            if tier is not None and len(walls) > tier.burst:
+                # 超過一次可連發的數量之後，請求只能照資源層級的速率送出
+                synth_seconds = max(synth_seconds, (len(walls) - tier.burst) / tier.requests_per_second)
+
+        render_seconds = None
+        if spec.make_video:
+            render = self.render_model(spec.video_profile)
+            if render is not None:
+                render_seconds = render.predict(audio_seconds + spec.video_lead_seconds)
+
+        return JobEstimate(
+            audio_seconds=audio_seconds,
+            synth_seconds=synth_seconds,
+            render_seconds=render_seconds,
+            chars=job_billable_chars(spec, sentences, plan),
+            requests=len(plan.segments),
+            learned_voices=sorted(voice for voice, model in models.items() if model.learned),
+        )
+
+    def voices(self) -> List[str]:
+        with self._lock:
+            rows = self._db.execute("SELECT DISTINCT voice FROM segments ORDER BY voice").fetchall()
+        return [row[0] for row in rows]
+
+    def profiles(self) -> List[str]:
+        with self._lock:
+            rows = self._db.execute("SELECT DISTINCT profile FROM renders ORDER BY profile").fetchall()
+        return [row[0] for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def _format_seconds(seconds: float) -> str:
+    return f"{seconds:.1f} 秒" if seconds < 10 else f"{seconds:.0f} 秒"
+
+
+def format_estimate(estimate: JobEstimate) -> str:
+    """網頁與命令列共用的一行摘要。"""
+    parts = [f"成品約 {estimate.audio_seconds / 60:.1f} 分鐘"]
+    if estimate.synth_seconds is not None:
+        parts.append(f"合成約 {_format_seconds(estimate.synth_seconds)}")
+    if estimate.render_seconds is not None:
+        parts.append(f"影片渲染約 {_format_seconds(estimate.render_seconds)}")
+    parts.append(f"最多送出 {estimate.chars:,} 字元、{estimate.requests} 個請求")
+    return "，".join(parts) + "。"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR, help=f"輸出資料夾（預設 {DEFAULT_OUTPUT_DIR}）")
+    args = parser.parse_args(argv)
+
+    history = RunHistory(args.output_dir)
+    voices = history.voices()
+    if not voices:
+        print("還沒有任何紀錄；合成過的工作完成後會自動記錄。")
+    for voice in voices:
+        model = history.voice_model(voice)
+        request = (
+            f"每個請求 {model.request.intercept:.2f} 秒 + 每千字元 {model.request.slope * 1000:.2f} 秒"
+            if model.request
+            else "請求耗時資料不足"
+        )
+        print(f"{voice}：{model.samples} 段，每秒 {model.chars_per_second:.1f} 字元，{request}")
+    for profile in history.profiles():
+        render = history.render_model(profile)
+        if render is not None:
+            print(
+                f"影片 {profile}：{render.samples} 支，固定 {render.intercept:.1f} 秒 + "
+                f"每分鐘影片 {render.slope * 60:.1f} 秒"
+            )
+    history.close()
+
+
+if __name__ == "__main__":
+    main()
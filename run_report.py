@@ -0,0 +1,145 @@
+"""每次執行的效能報告：記錄各階段耗時、產出位元組、送出字元與音訊長度，寫成 `<final_base>_report.json`。
+
+階段名稱：
+- preprocess：Markdown 清洗與分段；
+- synthesize：併發合成（記憶體合併時，MP3 frame 也在這個階段邊收邊寫）；
+- playback：把分段推進邊合成邊播放串流所花的時間（包含在 synthesize 之內）；
+- concat：完成 MP3（記憶體合併的收尾，或 ffmpeg concat；PCM 後製時包含音量正規化與最後一次編碼）；
+- subtitles：輸出逐行時間戳文本；
+- video：ffmpeg 渲染 MP4；
+- description：輸出 YouTube 說明欄。
+另外逐段記錄字元數、位元組、音訊秒數、請求耗時，以及是否命中快取或沿用續傳。
+"""
+import json
+import math
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Sequence
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """最近秩法的百分位數；沒有資料時回傳 0。"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    # 先乘再除：pct × n 是整數時不會因為 0.95 之類的浮點誤差多進一位
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct * len(ordered) / 100) - 1))
+    return ordered[rank]
+
+
+def _ratio(numerator: float, denominator: float) -> float:
+    return numerator / denominator if denominator > 0 else 0.0
+
+
+@dataclass
+class StageTiming:
+    name: str
+    wall_seconds: float = 0.0
+    chars: int = 0
+    bytes: int = 0
+    audio_seconds: float = 0.0
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        data["chars_per_second"] = _ratio(self.chars, self.wall_seconds)
+        data["bytes_per_second"] = _ratio(self.bytes, self.wall_seconds)
+        # 每秒實際時間處理了幾秒音訊，大於 1 代表比即時快
+        data["audio_seconds_per_wall_second"] = _ratio(self.audio_seconds, self.wall_seconds)
+        return data
+
+
+@dataclass
+class SegmentTiming:
+    index: int
+    chars: int
+    bytes: int
+    audio_seconds: float
+    wall_seconds: float
+    cached: bool = False
+    resumed: bool = False
+    voice: str = ""
+    # 行與行之間的停頓秒數（audio_seconds 中不是朗讀的部分）
+    pause_seconds: float = 0.0
+
+
+class RunReport:
+    """只在執行工作的那個執行緒中更新，不需要加鎖。"""
+
+    def __init__(self, final_base: str, settings: Optional[Dict] = None):
+        self.final_base = final_base
+        self.settings = settings or {}
+        self.started_at = datetime.now()
+        self._started = time.perf_counter()
+        self.stages: Dict[str, StageTiming] = {}
+        self.segments: List[SegmentTiming] = []
+        self.status = "running"
+        self.error = ""
+
+    def _stage(self, name: str) -> StageTiming:
+        if name not in self.stages:
+            self.stages[name] = StageTiming(name)
+        return self.stages[name]
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[StageTiming]:
+        """量測一個階段的耗時；區塊中可以直接填入 chars / bytes / audio_seconds。"""
+        timing = self._stage(name)
+        started = time.perf_counter()
+        try:
+            yield timing
+        finally:
+            timing.wall_seconds += time.perf_counter() - started
+
+    def add_time(self, name: str, seconds: float, chars: int = 0, bytes: int = 0, audio_seconds: float = 0.0):
+        """累加分散在其他階段中的時間（例如每段推進播放串流）。"""
+        timing = self._stage(name)
+        timing.wall_seconds += seconds
+        timing.chars += chars
+        timing.bytes += bytes
+        timing.audio_seconds += audio_seconds
+
+    def record_segment(self, segment: SegmentTiming):
+        self.segments.append(segment)
+
+    @property
+    def wall_seconds(self) -> float:
+        return time.perf_counter() - self._started
+
+    def to_dict(self) -> Dict:
+        wall = self.wall_seconds
+        synthesized = [s for s in self.segments if not s.cached and not s.resumed]
+        seg_walls = [s.wall_seconds for s in synthesized]
+        audio_seconds = sum(s.audio_seconds for s in self.segments)
+        return {
+            "final_base": self.final_base,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "status": self.status,
+            "error": self.error,
+            "settings": self.settings,
+            "totals": {
+                "wall_seconds": wall,
+                "segments": len(self.segments),
+                "segments_synthesized": len(synthesized),
+                "segments_cached": sum(1 for s in self.segments if s.cached),
+                "segments_resumed": sum(1 for s in self.segments if s.resumed),
+                "chars_sent": sum(s.chars for s in synthesized),
+                "audio_bytes": sum(s.bytes for s in self.segments),
+                "audio_seconds": audio_seconds,
+                "audio_seconds_per_wall_second": _ratio(audio_seconds, wall),
+            },
+            "stages": [timing.to_dict() for timing in self.stages.values()],
+            "segment_latency": {
+                "p50_seconds": percentile(seg_walls, 50),
+                "p95_seconds": percentile(seg_walls, 95),
+                "max_seconds": max(seg_walls, default=0.0),
+            },
+            "segments": [asdict(s) for s in sorted(self.segments, key=lambda s: s.index)],
+        }
+
+    def write(self, path: str) -> Dict:
+        data = self.to_dict()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        return data
@@ -0,0 +1,207 @@
+"""分段音訊的內容定址（content-addressed）磁碟快取。
+
+快取鍵是 (voice, 輸出格式, 正規化後的段落文字) 的 SHA-256，
+所以只改了一個錯字時，重新合成只會送出有變動的那幾段，其餘直接從磁碟取回，
+同時省下時間與 Azure 的字元額度。
+
+- 寫入一律先寫暫存檔再 `os.replace`，中途當掉也不會留下半個檔案。
+- 以檔案 mtime 當作最近使用時間，超過容量上限時從最久沒用到的開始刪（LRU）。
+- SSML 分段的 bookmark 時間位置與逐字時間另存在同名的 `.json`，命中快取時一併取回。
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+from tts_engine import SegmentSynthesizer, SynthesisOutput
+
+
+DEFAULT_CACHE_DIR = os.path.join("azure_outputs", ".segment_cache")
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+
+def normalize_segment_text(text: str) -> str:
+    """統一 Unicode 形式並壓縮空白；只差在空白的兩段文字會得到同一個快取鍵。"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def make_cache_key(voice: str, output_format: str, text: str) -> str:
+    payload = "\0".join([voice, output_format, normalize_segment_text(text)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SegmentCache:
+    """執行緒安全的分段音訊快取，可被多個合成 worker 同時讀寫。"""
+
+    def __init__(self, root: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.chars_saved = 0
+        self._lock = threading.Lock()
+        # key -> 檔案大小，依最近使用時間由舊到新排列
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        os.makedirs(root, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.bin")
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.json")
+
+    def _remove_files(self, key: str) -> None:
+        for path in (self._path(key), self._meta_path(key)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _load_index(self):
+        found = []
+        for dirpath, _dirnames, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.endswith(".bin"):
+                    continue
+                try:
+                    st = os.stat(os.path.join(dirpath, name))
+                except OSError:
+                    continue
+                found.append((st.st_mtime, name[:-4], st.st_size))
+        for _mtime, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                self.misses += 1
+                if key in self._entries:
+                    self._total_bytes -= self._entries.pop(key)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        return data
+
+    def get_meta(self, key: str) -> Optional[dict]:
+        try:
+            with open(self._meta_path(key), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _atomic_write(path: str, data: bytes) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def put(self, key: str, data: bytes, meta: Optional[dict] = None) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先寫 meta 再寫音訊：讀到音訊時 meta 一定已經就緒
+        if meta is not None:
+            self._atomic_write(self._meta_path(key), json.dumps(meta).encode("utf-8"))
+        self._atomic_write(path, data)
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)
+            self._entries[key] = len(data)
+            self._total_bytes += len(data)
+            self._evict_locked()
+
+    def _evict_locked(self):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self._remove_files(key)
+
+    def record_chars_saved(self, count: int) -> None:
+        with self._lock:
+            self.chars_saved += count
+
+    def set_max_bytes(self, max_bytes: int) -> None:
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict_locked()
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._entries):
+                self._remove_files(key)
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "chars_saved": self.chars_saved,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+class CachedSynthesizer:
+    """包住任一 `SegmentSynthesizer`：命中快取就不呼叫後端，未命中則合成後寫回快取。"""
+
+    def __init__(self, inner: SegmentSynthesizer, cache: SegmentCache, voice: str, output_format: str):
+        self.inner = inner
+        self.cache = cache
+        self.voice = voice
+        self.output_format = output_format
+
+    def synthesize(self, text: str) -> SynthesisOutput:
+        key = make_cache_key(self.voice, self.output_format, text)
+        data = self.cache.get(key)
+        if data is not None:
+            self.cache.record_chars_saved(len(text))
+            meta = self.cache.get_meta(key) or {}
+            return SynthesisOutput(audio_data=data, words=[tuple(w) for w in meta.get("words", [])], cached=True)
+        output = self.inner.synthesize(text)
+        self.cache.put(key, output.audio_data, meta={"words": output.words} if output.words else None)
+        return output
+
+    def synthesize_ssml(self, ssml: str) -> SynthesisOutput:
+        key = make_cache_key(self.voice, self.output_format, ssml)
+        data = self.cache.get(key)
+        if data is not None:
+            meta = self.cache.get_meta(key) or {}
+            self.cache.record_chars_saved(len(ssml))
+            return SynthesisOutput(
+                audio_data=data,
+                bookmarks=[(mark, offset) for mark, offset in meta.get("bookmarks", [])],
+                words=[tuple(w) for w in meta.get("words", [])],
+                cached=True,
+            )
+        output = self.inner.synthesize_ssml(ssml)
+        self.cache.put(key, output.audio_data, meta={"bookmarks": output.bookmarks, "words": output.words})
+        return output
@@ -0,0 +1,258 @@
+"""Markdown → 朗讀用文字：逐行、單次掃描的正規化。
+
+原本的清洗只認得標題、項目符號、粗體 / 斜體與程式區塊標記，每行跑好幾次 `re.sub`；
+連結、行內程式碼、表格、引用、HTML 標籤與實體都原樣留下，被 Azure 一個字一個字唸出來。
+
+這裡每行只做一次行首判斷（引用、標題、分隔線、程式區塊、表格、參考定義、項目符號），
+行內則用一個合併的 `_INLINE_RE` 由左到右掃過一次：每個替代樣式都停在下一個同類分隔符號前，
+不會回頭重掃，處理時間與輸入長度成正比（`bench_speech_text.py` 附有刻意構造的最差情況）。
+
+朗讀的原則是「唸出畫面上看得到的字」：
+- 連結、圖片只留文字 / 替代文字，網址不唸；自動連結 `<https://…>` 畫面上就是網址，照唸。
+- 行內程式碼去掉反引號、保留內容；程式區塊（``` / ~~~）整塊略過。
+- 表格每列一行，儲存格以「, 」連接；對齊列略過。
+- HTML 標籤與註解去掉，實體（`&amp;`、`&nbsp;`）還原成字元。
+
+輸出仍是一行對一行（見 `tts_pipeline.split_sentences`）：一行輸入最多產生一行輸出，
+跨行的狀態只有「目前在程式區塊或 HTML 註解裡」，由呼叫端傳入、傳出（`block`）。
+
+`python speech_text.py --check` 以 `golden/speech_text/` 中的範例核對整個清洗流程，
+改了規則之後用 `--update` 重新產生預期輸出（記得逐一看過差異）。
+"""
+import argparse
+import glob
+import os
+import re
+import sys
+import unicodedata
+from html import unescape
+from typing import Tuple
+
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden", "speech_text")
+
+_SENTENCE_END = (".", "!", "?", "。", "！", "？")
+
+# `-` / `*` / `+` 後面要有空白才是項目符號，否則 `**A:** ...` 開頭的粗體會被吃掉一個 `*`
+_BULLET_RE = re.compile(r"^(?:[-*+]\s+|[•✅▶✔]\ufe0f?\s*)")
+_TASK_RE = re.compile(r"^\[[ xX]\]\s+")
+_QUOTE_RE = re.compile(r"^(?:>\s?)+")
+_FENCE_RE = re.compile(r"^(`{3,}|~{3,})")
+_CLOSING_HASHES_RE = re.compile(r"\s+#+$")
+# 分隔線（`---`、`* * *`、`___`）與 setext 標題的底線（`===`）
+_BREAK_RE = re.compile(r"^(?:(?:-[ \t]*){3,}|(?:\*[ \t]*){3,}|(?:_[ \t]*){3,}|=+)$")
+_TABLE_SEP_CHARS = frozenset("|-: \t")
+_CELL_SPLIT_RE = re.compile(r"(?<!\\)\|")
+# 參考式連結與註腳的定義行：`[id]: https://…`、`[^1]: …`
+_REF_DEF_RE = re.compile(r"^\[[^\]]+\]:\s*\S")
+
+# 連結網址：允許一層括號，例如 Wikipedia 的 `Zug_(Eisenbahn)`
+_URL = r"\((?:[^()\n]|\([^()\n]*\))*\)"
+_INLINE_RE = re.compile(
+    r"\\(?P<escaped>[!-/:-@\[-`{-~])"
+    r"|``(?P<code2>.+?)``"
+    r"|`(?P<code>[^`]+)`"
+    # 包住圖片的連結（徽章）：[![alt](img)](url)
+    r"|\[!\[(?P<badge>[^\[\]]*)\]" + _URL + r"\]" + _URL +
+    r"|!\[(?P<image>[^\[\]]*)\]" + _URL +
+    r"|\[(?P<link>[^\[\]]*)\]" + _URL +
+    r"|(?P<footnote>\[\^[^\[\]]+\])"
+    r"|\[(?P<ref>[^\[\]]+)\]\[[^\[\]]*\]"
+    # 沒有結尾的註解吃到行尾，下一行起由 `block` 接手
+    r"|(?P<comment><!--(?:.*?-->|.*))"
+    r"|<(?P<autolink>[A-Za-z][A-Za-z0-9+.-]{1,31}:[^\s<>]*|[^\s<>@]+@[^\s<>@]+)>"
+    r"|(?P<br><br\s*/?>)"
+    r"|(?P<tag></?[A-Za-z][A-Za-z0-9-]*(?:\s[^<>]*)?/?>)"
+    r"|(?P<entity>&(?:#[0-9]{1,7}|#[xX][0-9a-fA-F]{1,6}|[A-Za-z][A-Za-z0-9]{1,31});)"
+    r"|(?P<emphasis>\*{1,3}|_{1,3}|~~)"
+)
+# 沒有這些字元的行不必進 `_INLINE_RE`（大部分的正文行）
+_INLINE_CHARS_RE = re.compile(r"[\\`\[!<&*_~]")
+
+_KEEP_GROUPS = ("escaped", "code2", "code", "badge", "image", "link", "ref", "autolink")
+
+
+def _inline_token(match, paired) -> str:
+    kind = match.lastgroup
+    if kind in _KEEP_GROUPS:
+        return match.group(kind).strip() if kind == "code2" else match.group(kind)
+    if kind == "entity":
+        return unescape(match.group())
+    if kind == "br":
+        return " "
+    if kind == "emphasis":
+        # 沒有配對的 `*` / `_` 是字面上的符號（`3*2`、`9,99 €*`），照原樣留下
+        return "" if match.start() in paired else match.group()
+    # footnote / comment / tag
+    return ""
+
+
+def _is_punct(ch: str) -> bool:
+    return unicodedata.category(ch)[0] in "PS"
+
+
+def _delimiter_roles(text: str, run: str, start: int, end: int) -> Tuple[bool, bool]:
+    """強調分隔符號能否開啟 / 關閉強調，依 CommonMark 的 left-/right-flanking 規則。"""
+    before = text[start - 1] if start else " "
+    after = text[end] if end < len(text) else " "
+    left = not after.isspace() and (not _is_punct(after) or before.isspace() or _is_punct(before))
+    right = not before.isspace() and (not _is_punct(before) or after.isspace() or _is_punct(after))
+    if run[0] == "_":
+        # 字中的底線（`snake_case`）不開也不關
+        return left and (not right or _is_punct(before)), right and (not left or _is_punct(after))
+    return left, right
+
+
+def _paired_emphasis(text: str, matches) -> set:
+    """找出有配對的強調分隔符號，回傳它們的起點。
+
+    每種分隔符號（`*`、`**`、`_`、`~~` …）各一個開啟者堆疊；關閉者配對最近的同種開啟者，
+    夾在中間、沒配到的開啟者一併捨棄（CommonMark 也是這樣），每個分隔符號最多進出堆疊一次。
+    """
+    openers = {}
+    paired = set()
+    for match in matches:
+        if match.lastgroup != "emphasis":
+            continue
+        run = match.group()
+        start, end = match.span()
+        can_open, can_close = _delimiter_roles(text, run, start, end)
+        if can_close and openers.get(run):
+            opener = openers[run].pop()
+            paired.update((opener, start))
+            for starts in openers.values():
+                while starts and starts[-1] > opener:
+                    starts.pop()
+        elif can_open:
+            openers.setdefault(run, []).append(start)
+    return paired
+
+
+def inline_text(text: str) -> str:
+    """行內標記 → 朗讀文字，並把連續空白壓成一個空白。"""
+    if _INLINE_CHARS_RE.search(text):
+        matches = list(_INLINE_RE.finditer(text))
+        paired = _paired_emphasis(text, matches)
+        parts = []
+        last = 0
+        for match in matches:
+            parts.append(text[last:match.start()])
+            parts.append(_inline_token(match, paired))
+            last = match.end()
+        parts.append(text[last:])
+        text = "".join(parts)
+    return " ".join(text.split())
+
+
+def _table_row(stripped: str) -> str:
+    cells = (inline_text(cell) for cell in _CELL_SPLIT_RE.split(stripped.strip("|")))
+    return ", ".join(cell for cell in cells if cell)
+
+
+def _opens_comment(stripped: str) -> bool:
+    opened = stripped.rfind("<!--")
+    return opened >= 0 and stripped.find("-->", opened + 4) < 0
+
+
+def clean_line(stripped: str, block: str = "") -> Tuple[str, str, str]:
+    """清洗單一（已 strip）行，回傳 (種類, 文字, block)。
+
+    種類為 "text" / "heading" / "drop"；空字串的 "text" 是段落分隔。
+    `block` 是這行開始時所在的程式區塊圍欄（例如 "```"）或 "<!--"，回傳這行結束後的狀態。
+    標題是否為「第一個標題」由呼叫端判斷。
+    """
+    if block == "<!--":
+        end = stripped.find("-->")
+        if end < 0:
+            return "drop", "", block
+        rest = stripped[end + 3:].strip()
+        if not rest:
+            return "drop", "", ""
+        return clean_line(rest)
+    stripped = _QUOTE_RE.sub("", stripped) if stripped.startswith(">") else stripped
+    if block:
+        # 結尾圍欄：同一種字元、至少一樣長，後面沒有其他文字
+        if stripped.startswith(block) and not stripped.strip(block[0]):
+            return "drop", "", ""
+        return "drop", "", block
+    if not stripped:
+        return "text", "", ""
+    # 評分提示這類行直接丟掉
+    if stripped.startswith("✅"):
+        return "drop", "", ""
+    fence = _FENCE_RE.match(stripped)
+    if fence:
+        return "drop", "", fence.group(1)
+    if stripped.startswith("#"):
+        heading_text = inline_text(_CLOSING_HASHES_RE.sub("", stripped.lstrip("#")))
+        # 若標題末尾沒有句號等，補上一個句號，方便之後切句
+        if heading_text and not heading_text.endswith(_SENTENCE_END):
+            heading_text += "."
+        return "heading", heading_text, ""
+    if _BREAK_RE.match(stripped):
+        return "drop", "", ""
+    if "|" in stripped:
+        if "-" in stripped and _TABLE_SEP_CHARS.issuperset(stripped):
+            return "drop", "", ""
+        if stripped.startswith("|"):
+            row = _table_row(stripped)
+            return ("text", row, "") if row else ("drop", "", "")
+    if stripped.startswith("[") and _REF_DEF_RE.match(stripped):
+        return "drop", "", ""
+    next_block = "<!--" if "<!--" in stripped and _opens_comment(stripped) else ""
+    # 去掉常見項目符號、emoji bullet 與待辦清單的方框
+    stripped = _BULLET_RE.sub("", stripped)
+    if stripped.startswith("["):
+        stripped = _TASK_RE.sub("", stripped)
+    cleaned = inline_text(stripped)
+    # 整行只有 HTML 標籤或註解時不留空行，免得多出段落分隔
+    return ("text", cleaned, next_block) if cleaned else ("drop", "", next_block)
+
+
+def _golden_cases():
+    for md_path in sorted(glob.glob(os.path.join(GOLDEN_DIR, "*.md"))):
+        yield md_path, md_path[:-3] + ".txt"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="以 golden/speech_text/ 的範例核對 Markdown 清洗結果。")
+    parser.add_argument("--check", action="store_true", help="比對每個 .md 的清洗結果與對應的 .txt（預設）")
+    parser.add_argument("--update", action="store_true", help="以目前的清洗結果覆寫預期輸出")
+    args = parser.parse_args(argv)
+
+    # 在這裡才匯入，避免 tts_pipeline ↔ speech_text 互相匯入
+    from tts_pipeline import clean_markdown
+
+    failed = 0
+    cases = list(_golden_cases())
+    for md_path, txt_path in cases:
+        with open(md_path, encoding="utf-8") as f:
+            actual = clean_markdown(f.read())
+        name = os.path.basename(md_path)
+        if args.update:
+            with open(txt_path, "w", encoding="utf-8") as f:
+                f.write(actual + "\n")
+            print(f"已更新 {os.path.basename(txt_path)}")
+            continue
+        expected = ""
+        if os.path.exists(txt_path):
+            with open(txt_path, encoding="utf-8") as f:
+                expected = f.read()[:-1]
+        if actual == expected:
+            print(f"通過 {name}")
+            continue
+        failed += 1
+        print(f"不符 {name}")
+        for line_no, (want, got) in enumerate(zip(expected.split("\n"), actual.split("\n")), start=1):
+            if want != got:
+                print(f"  第 {line_no} 行\n    預期：{want!r}\n    實際：{got!r}")
+                break
+        else:
+            print(f"  行數不同：預期 {expected.count(chr(10)) + 1} 行，實際 {actual.count(chr(10)) + 1} 行")
+    if not args.update:
+        print(f"{len(cases) - failed} / {len(cases)} 個範例相符。")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
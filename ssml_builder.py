@@ -0,0 +1,75 @@
+"""把多行文字打包成一個 SSML 請求，每行前面放 `<bookmark>`，行與行之間放 `<break>`。
+
+純文字送出時，各行會被空白接成一整段，原本 `split_sentences` 保留下來的行界線就不見了。
+改用 SSML 之後，一次請求仍可包含很多行，而 Azure 在唸到每個 bookmark 時
+會回報它在這段音訊中的時間位置，所以不需要另外做一次對齊，就能得到每行的開始時間。
+
+bookmark 依這段中第幾個有文字的行命名（`L0`、`L1`…），不用原文的行號：
+SSML 同時是分段快取的鍵，用絕對行號的話，前面插入或刪掉一行就會讓後面每一段的 SSML 都變掉，
+全部得重新送給 Azure。換回原文行號由呼叫端以 `spoken_line_indices` 對照。
+"""
+import re
+from typing import Iterable, List, Sequence, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+
+DEFAULT_BREAK_MS = 300
+
+_MARK_RE = re.compile(r"^L(\d+)$")
+
+
+def line_mark(position: int) -> str:
+    return f"L{position}"
+
+
+def parse_line_mark(mark: str):
+    """`L12` → 12（這段中的第幾行）；不是本模組產生的 bookmark 時回傳 None。"""
+    match = _MARK_RE.match(mark)
+    return int(match.group(1)) if match else None
+
+
+def spoken_line_indices(lines: Iterable[Tuple[int, str]]) -> List[int]:
+    """有文字的行的原文行號，依 bookmark 順序；第 k 個就是 `L{k}` 所在的行。"""
+    return [line_index for line_index, text in lines if text.strip()]
+
+
+def voice_locale(voice: str) -> str:
+    """由 voice 名稱取出語系，例如 de-DE-KatjaNeural → de-DE。"""
+    parts = voice.split("-")
+    return "-".join(parts[:2]) if len(parts) >= 3 else "de-DE"
+
+
+def build_ssml(
+    lines: Iterable[Tuple[int, str]],
+    voice: str,
+    break_ms: int = DEFAULT_BREAK_MS,
+) -> str:
+    """`lines` 為 (行號, 文字)；空行會略過，不產生 bookmark。"""
+    body: List[str] = []
+    position = 0
+    for _line_index, text in lines:
+        text = text.strip()
+        if not text:
+            continue
+        if body and break_ms > 0:
+            body.append(f'<break time="{int(break_ms)}ms"/>')
+        body.append(f'<bookmark mark="{line_mark(position)}"/>{escape(text)}')
+        position += 1
+    return (
+        f'<speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" xml:lang={quoteattr(voice_locale(voice))}>'
+        f"<voice name={quoteattr(voice)}>{''.join(body)}</voice></speak>"
+    )
+
+
+def range_lines(sentences: Sequence[str], line_range: Tuple[int, int]) -> List[Tuple[int, str]]:
+    start, end = line_range
+    return [(i, sentences[i]) for i in range(start, end)]
+
+
+def build_ssml_for_range(
+    sentences: Sequence[str],
+    line_range: Tuple[int, int],
+    voice: str,
+    break_ms: int = DEFAULT_BREAK_MS,
+) -> str:
+    return build_ssml(range_lines(sentences, line_range), voice, break_ms)
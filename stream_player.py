@@ -0,0 +1,127 @@
+"""邊合成邊播放：本機 HTTP 串流伺服器。
+
+每個合成工作對應一條 `AudioStream`。分段依順序完成時就把 MP3 frame 推進去，
+瀏覽器的 `<audio>` 以一般 HTTP 連線讀取，資料還沒到時連線會等待，
+所以聽到第一句的時間只取決於第一段的合成延遲，而不是整份工作。
+
+音訊以原始位元組經由 HTTP 傳送，不必再把整個 MP3 做 base64 塞進頁面。
+伺服器只綁定 127.0.0.1，因此只適用於在本機瀏覽器開啟 Streamlit 的情況。
+"""
+import threading
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, List, Optional
+
+from mp3_frames import audio_frames
+
+
+# 保留最近幾條串流，讓使用者合成完之後還能從頭重播
+MAX_RETAINED_STREAMS = 4
+
+
+class AudioStream:
+    """可同時被多個讀者從頭讀取的追加式音訊串流。"""
+
+    def __init__(self, stream_id: str):
+        self.stream_id = stream_id
+        self._chunks: List[bytes] = []
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def push(self, data: bytes) -> None:
+        with self._cond:
+            self._chunks.append(data)
+            self._cond.notify_all()
+
+    def push_mp3(self, data: bytes) -> None:
+        """推入一段完整的 MP3，先去掉 ID3 / Xing 標頭，讓接起來的串流保持乾淨。"""
+        frames, _samples, _header = audio_frames(data)
+        self.push(b"".join(frames))
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def iter_chunks(self, timeout: float = 300.0) -> Iterator[bytes]:
+        pos = 0
+        while True:
+            with self._cond:
+                while pos >= len(self._chunks) and not self._closed:
+                    if not self._cond.wait(timeout):
+                        return
+                if pos >= len(self._chunks):
+                    return
+                chunk = self._chunks[pos]
+            pos += 1
+            yield chunk
+
+
+class _StreamHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        stream_id = self.path.strip("/").split("/")[-1].split(".")[0]
+        stream = self.server.get_stream(stream_id)
+        if stream is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        try:
+            for chunk in stream.iter_chunks():
+                self.wfile.write(chunk)
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        # 不把每個請求印到 Streamlit 的終端機
+        pass
+
+
+class AudioStreamServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _StreamHandler)
+        self._streams: "OrderedDict[str, AudioStream]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self.serve_forever, name="tts-audio-stream", daemon=True)
+        self._thread.start()
+
+    def create_stream(self) -> AudioStream:
+        stream = AudioStream(uuid.uuid4().hex)
+        with self._lock:
+            self._streams[stream.stream_id] = stream
+            while len(self._streams) > MAX_RETAINED_STREAMS:
+                _old_id, old = self._streams.popitem(last=False)
+                old.close()
+        return stream
+
+    def get_stream(self, stream_id: str) -> Optional[AudioStream]:
+        with self._lock:
+            return self._streams.get(stream_id)
+
+    def url_for(self, stream: AudioStream) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/stream/{stream.stream_id}.mp3"
+
+
+_server: Optional[AudioStreamServer] = None
+_server_lock = threading.Lock()
+
+
+def get_stream_server() -> AudioStreamServer:
+    """整個行程共用一個伺服器，第一次呼叫時才啟動。"""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = AudioStreamServer()
+        return _server
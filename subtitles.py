@@ -0,0 +1,159 @@
+"""逐字時間 → SRT / WebVTT 字幕。
+
+原本只輸出沒有時間的 `<final_base>.txt`，YouTube 要自己對時，德語的長複合字常常對不準；
+影片開頭的空白（`video_lead_seconds`）也沒有任何字幕檔算進去。
+
+合成時後端訂閱 Azure 的 word boundary 事件，每段的 `SynthesisOutput.words` 記錄
+(在這段音訊中的開始秒數, 長度秒數, 文字)。`run_job` 每把一段接進音軌，就以這段在音軌中的位置
+交給 `WordCollector`；它只存兩個浮點數陣列與文字清單，跨段累積整份文件的逐字時間。
+最後 `cues` 依原文的行（bookmark）與長度、時間上限組成字幕，`to_srt` / `to_vtt` 寫出時再整體平移開頭空白。
+不需要另外跑對齊：逐字時間就是同一次合成順帶回報的。
+
+後端沒有回報逐字時間時（例如建立快取時還沒有這個功能的舊分段），改以每行的 bookmark 時間組成一行一個字幕。
+"""
+import re
+from array import array
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+
+# 每個字幕最多字元數（兩行各約 42 字元，是常見的字幕行寬）與最長秒數
+DEFAULT_CUE_CHARS = 84
+LINE_CHARS = 42
+MAX_CUE_SECONDS = 7.0
+# 太短的字幕來不及讀；在不蓋到下一個字幕的前提下延長到這個長度
+MIN_CUE_SECONDS = 1.0
+
+# (開始秒數, 長度秒數, 文字)
+WordBoundary = Tuple[float, float, str]
+
+_WORD_CHAR_RE = re.compile(r"\w")
+# 沒有 bookmark 的純文字分段裡，句尾也是一個字幕的結尾
+_SENTENCE_END = (".", "!", "?", "。", "！", "？", ".\"", "!\"", "?\"", "…")
+
+
+@dataclass(frozen=True)
+class Cue:
+    start: float
+    end: float
+    text: str
+
+
+class WordCollector:
+    """依音軌順序累積各段的逐字時間；只在執行工作的那個執行緒中使用。"""
+
+    def __init__(self):
+        self.starts = array("d")
+        self.ends = array("d")
+        self.texts: List[str] = []
+        # 這個字是不是一行（bookmark）或一個片段的第一個字
+        self.line_starts = array("b")
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def add(self, clip_start: float, words: Sequence[WordBoundary], bookmarks: Sequence[Tuple[str, float]] = ()):
+        """把一段音訊的逐字時間接到後面；`clip_start` 是這段第 0 秒在最終音軌中的位置。"""
+        marks = sorted(offset for _mark, offset in bookmarks)
+        next_mark = 0
+        new_line = True
+        for offset, duration, text in words:
+            while next_mark < len(marks) and marks[next_mark] <= offset + 1e-3:
+                new_line = True
+                next_mark += 1
+            end = clip_start + offset + duration
+            # 標點（Azure 以獨立的 boundary 回報）附在前一個字後面
+            if not new_line and self.texts and not _WORD_CHAR_RE.search(text):
+                self.texts[-1] += text
+                self.ends[-1] = max(self.ends[-1], end)
+                continue
+            self.starts.append(clip_start + offset)
+            self.ends.append(end)
+            self.texts.append(text)
+            self.line_starts.append(1 if new_line else 0)
+            new_line = False
+
+    def cues(self, max_chars: int = DEFAULT_CUE_CHARS, max_seconds: float = MAX_CUE_SECONDS) -> List[Cue]:
+        """每行（沒有 bookmark 時每句）至少一個字幕；太長或太久時在字與字之間再切開。"""
+        cues: List[Cue] = []
+        first = 0
+        text = ""
+        for i, word in enumerate(self.texts):
+            if i > first and (
+                self.line_starts[i]
+                or self.texts[i - 1].endswith(_SENTENCE_END)
+                or len(text) + 1 + len(word) > max_chars
+                or self.ends[i] - self.starts[first] > max_seconds
+            ):
+                cues.append(Cue(self.starts[first], self.ends[i - 1], text))
+                first, text = i, ""
+            # 開頭的引號、括號這類純標點後面不加空白
+            joiner = " " if text and _WORD_CHAR_RE.search(self.texts[i - 1]) else ""
+            text = f"{text}{joiner}{word}"
+        if text:
+            cues.append(Cue(self.starts[first], self.ends[len(self.texts) - 1], text))
+        return _settle(cues)
+
+
+def line_cues(sentences: Sequence[str], line_starts: Dict[int, float], total_seconds: float) -> List[Cue]:
+    """沒有逐字時間時的退路：每行一個字幕，從這行的 bookmark 到下一行開始。"""
+    ordered = sorted(line_starts.items(), key=lambda item: item[1])
+    cues = []
+    for position, (line_index, start) in enumerate(ordered):
+        end = ordered[position + 1][1] if position + 1 < len(ordered) else total_seconds
+        text = sentences[line_index].strip() if line_index < len(sentences) else ""
+        if text and end > start:
+            cues.append(Cue(start, end, text))
+    return cues
+
+
+def _settle(cues: List[Cue]) -> List[Cue]:
+    """太短的字幕延長到 MIN_CUE_SECONDS，但不蓋到下一個字幕。"""
+    settled = []
+    for position, cue in enumerate(cues):
+        end = max(cue.end, cue.start + MIN_CUE_SECONDS)
+        if position + 1 < len(cues):
+            end = min(end, cues[position + 1].start)
+        settled.append(Cue(cue.start, max(cue.end, end), cue.text))
+    return settled
+
+
+def wrap_cue_text(text: str, line_chars: int = LINE_CHARS) -> str:
+    """超過一行寬度時，在最接近中間的空白處折成兩行。"""
+    if len(text) <= line_chars:
+        return text
+    middle = len(text) // 2
+    left, right = text.rfind(" ", 0, middle + 1), text.find(" ", middle)
+    candidates = [i for i in (left, right) if i > 0]
+    if not candidates:
+        return text
+    split = min(candidates, key=lambda i: abs(i - middle))
+    return f"{text[:split]}\n{text[split + 1:]}"
+
+
+def _timestamp(seconds: float, decimal: str) -> str:
+    millis = max(0, int(round(seconds * 1000)))
+    hours, millis = divmod(millis, 3_600_000)
+    minutes, millis = divmod(millis, 60_000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{decimal}{millis:03d}"
+
+
+def to_srt(cues: Iterable[Cue], shift: float = 0.0) -> str:
+    """`shift` 秒整體往後移，例如影片開頭的空白。"""
+    blocks = []
+    for number, cue in enumerate(cues, start=1):
+        blocks.append(
+            f"{number}\n{_timestamp(cue.start + shift, ',')} --> {_timestamp(cue.end + shift, ',')}\n"
+            f"{wrap_cue_text(cue.text)}\n"
+        )
+    return "\n".join(blocks)
+
+
+def to_vtt(cues: Iterable[Cue], shift: float = 0.0) -> str:
+    blocks = ["WEBVTT\n"]
+    for cue in cues:
+        blocks.append(
+            f"{_timestamp(cue.start + shift, '.')} --> {_timestamp(cue.end + shift, '.')}\n{wrap_cue_text(cue.text)}\n"
+        )
+    return "\n".join(blocks)
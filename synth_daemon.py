@@ -0,0 +1,419 @@
+"""本機常駐合成服務：每個 voice 保留一組預先連線好的合成 session，網頁與命令列透過本機 HTTP 使用。
+
+原本每段都建立新的 SpeechSynthesizer，每次請求都要重新連線、重新 TLS 交握；
+常駐服務啟動時先把 session 預熱好，之後的請求只需等合成本身。
+每個請求都量測三段延遲：
+- queue：等待空閒 session 的時間；
+- first_byte：送出後到第一個音訊片段到達；
+- total：從服務收到請求到合成完成。
+
+只綁定 127.0.0.1。用法：
+    python synth_daemon.py --voices de-DE-KatjaNeural --pool-size 4
+    python synth_daemon.py --fake          # 以本機假後端啟動，不連 Azure
+網頁側邊欄勾選「使用本機合成服務」，或 `batch_cli.py --daemon http://127.0.0.1:8765`。
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+from audio_formats import AUDIO_FORMATS, DEFAULT_AUDIO_FORMAT
+from run_report import percentile
+from tts_engine import DEFAULT_MAX_WORKERS, SynthesisCanceled, SynthesisOutput
+
+
+DEFAULT_DAEMON_PORT = 8765
+DEFAULT_DAEMON_URL = f"http://127.0.0.1:{DEFAULT_DAEMON_PORT}"
+DEFAULT_POOL_SIZE = DEFAULT_MAX_WORKERS
+# 每個 voice 保留最近多少筆延遲紀錄來算百分位數
+LATENCY_WINDOW = 1000
+# 等待空閒 session 的上限秒數；超過時回報錯誤，不讓請求無限排隊
+ACQUIRE_TIMEOUT = 120.0
+
+
+class SessionPool:
+    """單一 voice（與輸出格式）的 session 池：最多 `size` 個，用完歸還，出錯的 session 直接丟棄再補新的。"""
+
+    def __init__(
+        self,
+        voice: str,
+        factory: Callable[[str, str], object],
+        size: int = DEFAULT_POOL_SIZE,
+        audio_format: str = DEFAULT_AUDIO_FORMAT,
+    ):
+        self.voice = voice
+        self.audio_format = audio_format
+        self.factory = factory
+        self.size = max(1, size)
+        # 閒置的 session，後進先出（最近用過的連線最可能還活著）
+        self._idle: List = []
+        self._lock = threading.Lock()
+        # 歸還、丟棄 session 或建立失敗時通知等待中的請求：丟棄後池有空位，等待者可以自己建一個新的
+        self._available = threading.Condition(self._lock)
+        self._created = 0
+        self.warmups = 0
+        self.discarded = 0
+        self.requests = 0
+        self.errors = 0
+        self.latencies = {name: deque(maxlen=LATENCY_WINDOW) for name in ("queue", "first_byte", "total")}
+
+    def _new_session(self, warm: bool):
+        session = self.factory(self.voice, self.audio_format)
+        if warm:
+            session.warm_up()
+            with self._lock:
+                self.warmups += 1
+        return session
+
+    def warm(self, count: Optional[int] = None) -> int:
+        """預先建立並預熱 session，直到池中有 `count`（預設 `size`）個；回傳新建的數量。"""
+        target = min(self.size, count or self.size)
+        created = 0
+        while True:
+            with self._lock:
+                if self._created >= target:
+                    return created
+                self._created += 1
+            try:
+                session = self._new_session(warm=True)
+            except BaseException:
+                self._give_back_slot()
+                raise
+            with self._available:
+                self._idle.append(session)
+                self._available.notify()
+            created += 1
+
+    def _give_back_slot(self, discarded: bool = False):
+        with self._available:
+            self._created -= 1
+            if discarded:
+                self.discarded += 1
+            self._available.notify()
+
+    def _acquire(self):
+        deadline = time.monotonic() + ACQUIRE_TIMEOUT
+        with self._available:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self._created < self.size:
+                    self._created += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise SynthesisCanceled("QueueTimeout", f"等待空閒的 {self.voice} session 超過 {ACQUIRE_TIMEOUT:.0f} 秒")
+                self._available.wait(remaining)
+        # 池還沒滿（或剛丟棄了出錯的 session）：現場建立（未預熱，第一個請求會付連線時間）
+        try:
+            return self._new_session(warm=False)
+        except BaseException:
+            self._give_back_slot()
+            raise
+
+    def _release(self, session, broken: bool):
+        if not broken:
+            with self._available:
+                self._idle.append(session)
+                self._available.notify()
+            return
+        self._give_back_slot(discarded=True)
+        try:
+            session.close()
+        except Exception:
+            pass
+
+    def synthesize(self, payload: str, ssml: bool = False):
+        """回傳 (合成結果, {"queue", "first_byte", "total"} 秒數)。"""
+        received = time.perf_counter()
+        session = self._acquire()
+        acquired = time.perf_counter()
+        broken = False
+        try:
+            output, first_byte = session.synthesize(payload, ssml)
+        except SynthesisCanceled:
+            broken = True
+            with self._lock:
+                self.errors += 1
+            raise
+        except Exception as e:
+            broken = True
+            with self._lock:
+                self.errors += 1
+            raise SynthesisCanceled(type(e).__name__, str(e)) from e
+        finally:
+            self._release(session, broken)
+        timings = {"queue": acquired - received, "first_byte": first_byte, "total": time.perf_counter() - received}
+        with self._lock:
+            self.requests += 1
+            for name, value in timings.items():
+                self.latencies[name].append(value)
+        return output, timings
+
+    def stats(self) -> Dict:
+        with self._lock:
+            latencies = {name: list(values) for name, values in self.latencies.items()}
+            stats = {
+                "size": self.size,
+                "sessions": self._created,
+                "idle": len(self._idle),
+                "warmups": self.warmups,
+                "discarded": self.discarded,
+                "requests": self.requests,
+                "errors": self.errors,
+            }
+        for name, values in latencies.items():
+            stats[f"{name}_p50_ms"] = percentile(values, 50) * 1000
+            stats[f"{name}_p95_ms"] = percentile(values, 95) * 1000
+        return stats
+
+    def close(self):
+        with self._lock:
+            sessions, self._idle = self._idle, []
+        for session in sessions:
+            try:
+                session.close()
+            except Exception:
+                pass
+
+
+class SynthesisDaemon:
+    """依 voice 與輸出格式管理多個 `SessionPool`；第一次用到某個組合時才建立它的池。
+
+    `factory(voice, audio_format)` 建立一個 session，`audio_format` 為 `audio_formats.AUDIO_FORMATS` 的鍵。
+    """
+
+    def __init__(self, factory: Callable[[str, str], object], pool_size: int = DEFAULT_POOL_SIZE):
+        self.factory = factory
+        self.pool_size = pool_size
+        self._pools: Dict[str, SessionPool] = {}
+        self._lock = threading.Lock()
+
+    def pool(self, voice: str, audio_format: str = DEFAULT_AUDIO_FORMAT) -> SessionPool:
+        # 預設格式只用 voice 當名稱，統計畫面與舊版相同
+        name = voice if audio_format == DEFAULT_AUDIO_FORMAT else f"{voice} / {audio_format}"
+        with self._lock:
+            pool = self._pools.get(name)
+            if pool is None:
+                pool = self._pools[name] = SessionPool(voice, self.factory, self.pool_size, audio_format)
+            return pool
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            pools = dict(self._pools)
+        return {voice: pool.stats() for voice, pool in pools.items()}
+
+    def close(self):
+        with self._lock:
+            pools = list(self._pools.values())
+        for pool in pools:
+            pool.close()
+
+
+class _DaemonHandler(BaseHTTPRequestHandler):
+    def _query(self) -> Dict[str, str]:
+        return dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(self.path).query))
+
+    def _send_json(self, status: int, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        route = urllib.parse.urlsplit(self.path).path
+        if route == "/health":
+            self._send_json(200, {"ok": True})
+        elif route == "/stats":
+            self._send_json(200, self.server.daemon.stats())
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        route = urllib.parse.urlsplit(self.path).path
+        params = self._query()
+        voice = params.get("voice", "")
+        audio_format = params.get("format", DEFAULT_AUDIO_FORMAT)
+        if not voice:
+            self._send_json(400, {"reason": "BadRequest", "details": "缺少 voice 參數"})
+            return
+        if audio_format not in AUDIO_FORMATS:
+            self._send_json(400, {"reason": "BadRequest", "details": f"不支援的輸出格式：{audio_format}"})
+            return
+        pool = self.server.daemon.pool(voice, audio_format)
+        if route == "/warm":
+            try:
+                created = pool.warm(int(params["count"]) if "count" in params else None)
+            except Exception as e:
+                self._send_json(502, {"reason": type(e).__name__, "details": str(e)})
+                return
+            self._send_json(200, {"created": created, **pool.stats()})
+            return
+        if route != "/synthesize":
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        payload = self.rfile.read(length).decode("utf-8")
+        try:
+            output, timings = pool.synthesize(payload, ssml=params.get("ssml") == "1")
+        except SynthesisCanceled as e:
+            self._send_json(502, {"reason": str(e.reason), "details": e.details})
+            return
+        # 逐字時間一段可能有上千筆，超過 HTTP 標頭的長度限制；接在音訊後面，以 X-Words-Bytes 標出長度
+        words = json.dumps(output.words).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", AUDIO_FORMATS[audio_format].mime_type)
+        self.send_header("Content-Length", str(len(output.audio_data) + len(words)))
+        self.send_header("X-Audio-Duration", f"{output.audio_duration:.6f}")
+        self.send_header("X-Bookmarks", json.dumps(output.bookmarks))
+        self.send_header("X-Words-Bytes", str(len(words)))
+        for name, value in timings.items():
+            self.send_header(f"X-{name.replace('_', '-').title()}-Ms", f"{value * 1000:.1f}")
+        self.end_headers()
+        self.wfile.write(output.audio_data)
+        self.wfile.write(words)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class DaemonServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, daemon: SynthesisDaemon, host: str = "127.0.0.1", port: int = DEFAULT_DAEMON_PORT):
+        super().__init__((host, port), _DaemonHandler)
+        self.daemon = daemon
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start_background(self) -> threading.Thread:
+        """在背景執行緒中服務（給壓測與同一行程內使用）。"""
+        thread = threading.Thread(target=self.serve_forever, name="tts-synth-daemon", daemon=True)
+        thread.start()
+        return thread
+
+
+class DaemonSynthesizer:
+    """透過本機合成服務合成的 `SegmentSynthesizer`；可被多個 worker 執行緒同時使用。
+
+    每個請求的延遲（含用戶端往返的 "roundtrip"）記在 `timings`，供壓測統計。
+    """
+
+    def __init__(self, url: str, voice: str, timeout: float = 660.0, audio_format: str = DEFAULT_AUDIO_FORMAT):
+        self.url = url.rstrip("/")
+        self.voice = voice
+        self.audio_format = audio_format
+        self.timeout = timeout
+        self.timings: List[Dict[str, float]] = []
+        self._lock = threading.Lock()
+
+    def synthesize(self, text: str) -> SynthesisOutput:
+        return self._request(text, ssml=False)
+
+    def synthesize_ssml(self, ssml: str) -> SynthesisOutput:
+        return self._request(ssml, ssml=True)
+
+    def _request(self, payload: str, ssml: bool) -> SynthesisOutput:
+        query = urllib.parse.urlencode({"voice": self.voice, "format": self.audio_format, "ssml": "1" if ssml else "0"})
+        request = urllib.request.Request(
+            f"{self.url}/synthesize?{query}",
+            data=payload.encode("utf-8"),
+            method="POST",
+            headers={"Content-Type": "text/plain; charset=utf-8"},
+        )
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                body = response.read()
+                headers = response.headers
+        except urllib.error.HTTPError as e:
+            try:
+                error = json.loads(e.read().decode("utf-8"))
+            except ValueError:
+                error = {"reason": f"HTTP {e.code}", "details": e.reason}
+            raise SynthesisCanceled(error.get("reason", "DaemonError"), error.get("details", "")) from e
+        except urllib.error.URLError as e:
+            raise SynthesisCanceled("DaemonUnavailable", f"無法連線到本機合成服務 {self.url}：{e.reason}") from e
+        timing = {
+            name: float(headers.get(f"X-{name.replace('_', '-').title()}-Ms", 0)) / 1000
+            for name in ("queue", "first_byte", "total")
+        }
+        timing["roundtrip"] = time.perf_counter() - started
+        with self._lock:
+            self.timings.append(timing)
+        words_bytes = int(headers.get("X-Words-Bytes", 0))
+        audio = body[:len(body) - words_bytes]
+        words = json.loads(body[len(audio):].decode("utf-8")) if words_bytes else []
+        return SynthesisOutput(
+            audio_data=audio,
+            audio_duration=float(headers.get("X-Audio-Duration", 0)),
+            bookmarks=[tuple(b) for b in json.loads(headers.get("X-Bookmarks", "[]"))],
+            words=[tuple(w) for w in words],
+        )
+
+
+def daemon_available(url: str = DEFAULT_DAEMON_URL, timeout: float = 1.0) -> bool:
+    try:
+        with urllib.request.urlopen(f"{url.rstrip('/')}/health", timeout=timeout) as response:
+            return response.status == 200
+    except (urllib.error.URLError, OSError):
+        return False
+
+
+def warm_voice(url: str, voice: str, count: Optional[int] = None) -> Dict:
+    query = {"voice": voice, **({"count": str(count)} if count else {})}
+    request = urllib.request.Request(f"{url.rstrip('/')}/warm?{urllib.parse.urlencode(query)}", data=b"", method="POST")
+    with urllib.request.urlopen(request, timeout=120) as response:
+        return json.loads(response.read().decode("utf-8"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=DEFAULT_DAEMON_PORT, help=f"監聽埠號（預設 {DEFAULT_DAEMON_PORT}）")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE, help="每個 voice 最多幾個 session")
+    parser.add_argument("--voices", nargs="*", default=[], help="啟動時就預熱的 voice")
+    parser.add_argument("--fake", action="store_true", help="使用本機假後端（不連 Azure）")
+    parser.add_argument("--fake-connect-delay", type=float, default=0.3, help="假後端每個 session 的連線秒數")
+    parser.add_argument("--fake-latency", type=float, default=0.5, help="假後端每個請求的延遲秒數")
+    args = parser.parse_args(argv)
+
+    if args.fake:
+        from fake_backend import make_fake_session_factory
+
+        factory = make_fake_session_factory(connect_delay=args.fake_connect_delay, latency=args.fake_latency)
+    else:
+        from azure_backend import make_session_factory
+        from batch_cli import load_credentials
+
+        factory = make_session_factory(*load_credentials())
+
+    daemon = SynthesisDaemon(factory, args.pool_size)
+    for voice in args.voices:
+        started = time.perf_counter()
+        daemon.pool(voice).warm()
+        print(f"已預熱 {voice}：{args.pool_size} 個 session，耗時 {time.perf_counter() - started:.1f} 秒")
+
+    server = DaemonServer(daemon, port=args.port)
+    print(f"本機合成服務已啟動：{server.url}（Ctrl+C 結束）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        daemon.close()
+
+
+if __name__ == "__main__":
+    main()
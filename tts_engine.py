@@ -0,0 +1,174 @@
+"""分段語音合成引擎。
+
+以有限數量的 worker 併發送出各段合成請求，不論哪一段先完成，
+都會依原始段落順序把音訊交給輸出端（sink），並在每段完成時回報進度。
+每段失敗時先依 `RetryPolicy` 退避重試；重試後仍失敗，尚未開始的段落會全部取消，不再浪費額度。
+
+合成後端透過 `SegmentSynthesizer` 介面注入：
+- Azure 實作在 `azure_backend.py`；
+- 本機假後端在 `fake_backend.py`，測試與壓測不需要連到 Azure。
+"""
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Protocol, Sequence, Tuple
+
+
+DEFAULT_MAX_WORKERS = 4
+
+
+@dataclass
+class RetryPolicy:
+    """單段失敗時的重試設定：第 n 次重試前等待 base_delay * 2^(n-1) 秒（加上隨機抖動，不超過 max_delay）。
+
+    限流或網路短暫中斷通常幾秒後就會恢復，不值得讓整份工作失敗。
+    """
+
+    attempts: int = 3
+    base_delay: float = 1.0
+    max_delay: float = 20.0
+
+    def delay(self, retry: int) -> float:
+        return min(self.max_delay, self.base_delay * 2 ** (retry - 1)) * random.uniform(0.5, 1.0)
+
+
+DEFAULT_RETRY = RetryPolicy()
+NO_RETRY = RetryPolicy(attempts=1)
+
+
+@dataclass
+class SynthesisOutput:
+    """單段合成結果：音訊位元組，以及（若後端有提供）音訊長度秒數。
+
+    以 SSML 合成時，`bookmarks` 依序記錄 (bookmark 名稱, 在這段音訊中的秒數)。
+    `words` 是後端回報的逐字時間 (開始秒數, 長度秒數, 文字)，標點另成一筆；用來產生 SRT / VTT 字幕。
+    `cached` 表示結果來自分段快取；`elapsed_seconds` 由引擎填入這段請求（含重試）的實際耗時。
+    """
+
+    audio_data: bytes
+    audio_duration: float = 0.0
+    bookmarks: List[Tuple[str, float]] = field(default_factory=list)
+    words: List[Tuple[float, float, str]] = field(default_factory=list)
+    cached: bool = False
+    elapsed_seconds: float = 0.0
+
+
+class SynthesisCanceled(Exception):
+    """後端回報合成被取消或結果未知時拋出；`index` 由引擎補上（從 1 開始）。"""
+
+    def __init__(self, reason, details: str = "", index: Optional[int] = None):
+        self.reason = reason
+        self.details = details
+        self.index = index
+        super().__init__(f"{reason} - {details}")
+
+
+class SegmentSynthesizer(Protocol):
+    """合成後端介面：同一個物件會被多個 worker 執行緒同時呼叫，須為 thread-safe。"""
+
+    def synthesize(self, text: str) -> SynthesisOutput:
+        ...
+
+    def synthesize_ssml(self, ssml: str) -> SynthesisOutput:
+        ...
+
+
+# on_audio(index, output)：依順序交付每段音訊
+AudioSink = Callable[[int, SynthesisOutput], None]
+# on_progress(index, completed, total)：每完成一段呼叫一次（完成順序不一定是段落順序）
+ProgressCallback = Callable[[int, int, int], None]
+
+
+def synthesize_segments(
+    segments: Sequence[str],
+    synthesizer: SegmentSynthesizer,
+    on_audio: AudioSink,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    on_progress: Optional[ProgressCallback] = None,
+    ssml: bool = False,
+    retry: RetryPolicy = DEFAULT_RETRY,
+    on_complete: Optional[AudioSink] = None,
+) -> None:
+    """併發合成所有段落，最多同時 `max_workers` 個請求在途。
+
+    `ssml=True` 時每個段落都是完整的 SSML 文件，改呼叫後端的 `synthesize_ssml`。
+    `on_complete(index, output)` 在每段完成時立即呼叫（完成順序），適合把結果先存起來；
+    `on_audio` 則依段落順序交付。
+
+    所有回呼都只在呼叫端執行緒中被呼叫（不會在 worker 裡），
+    所以可以直接在裡面操作 Streamlit 元件。
+    任何一段重試後仍失敗時拋出 `SynthesisCanceled`（帶段落序號），其餘未開始的段落會被取消；
+    有 `on_complete` 時，會先等已在途的段落結束並交給它，續傳時就不必重做。
+    """
+    total = len(segments)
+    if total == 0:
+        return
+    max_workers = max(1, min(int(max_workers), total))
+    synthesize_once = synthesizer.synthesize_ssml if ssml else synthesizer.synthesize
+
+    def synthesize(payload: str) -> SynthesisOutput:
+        started = time.perf_counter()
+        for attempt in range(1, retry.attempts + 1):
+            try:
+                output = synthesize_once(payload)
+                output.elapsed_seconds = time.perf_counter() - started
+                return output
+            except Exception:
+                if attempt >= retry.attempts:
+                    raise
+                time.sleep(retry.delay(attempt))
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts-segment")
+    in_flight: Dict = {}
+    finished: Dict[int, SynthesisOutput] = {}
+    next_to_submit = 0
+    next_to_emit = 0
+    completed = 0
+
+    def submit_more():
+        nonlocal next_to_submit
+        # 只在有空位時才送出下一段，確保在途請求數不超過上限，也讓取消時不必回收大量排隊工作
+        while next_to_submit < total and len(in_flight) < max_workers:
+            future = executor.submit(synthesize, segments[next_to_submit])
+            in_flight[future] = next_to_submit
+            next_to_submit += 1
+
+    try:
+        submit_more()
+        while in_flight:
+            done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+            for future in done:
+                idx = in_flight.pop(future)
+                try:
+                    output = future.result()
+                except SynthesisCanceled as e:
+                    e.index = idx + 1
+                    raise
+                except Exception as e:
+                    raise SynthesisCanceled(type(e).__name__, str(e), index=idx + 1) from e
+                finished[idx] = output
+                completed += 1
+                if on_complete is not None:
+                    on_complete(idx + 1, output)
+                if on_progress is not None:
+                    on_progress(idx + 1, completed, total)
+
+            # 依原始順序交付已連續完成的段落
+            while next_to_emit in finished:
+                on_audio(next_to_emit + 1, finished.pop(next_to_emit))
+                next_to_emit += 1
+
+            submit_more()
+    except BaseException:
+        # 失敗時取消尚未開始的段落；執行中的請求讓它自然結束
+        executor.shutdown(wait=False, cancel_futures=True)
+        if on_complete is not None:
+            for future in list(in_flight):
+                try:
+                    on_complete(in_flight.pop(future) + 1, future.result())
+                except Exception:
+                    pass
+        raise
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,1099 @@
+"""Markdown → 語音 → MP3 / MP4 / 字幕文字檔的處理流程。
+
+原本全部寫在 Streamlit 的 `main()` 裡；抽成可匯入的函式之後，
+網頁介面（`azure_tts_app.py`）與批次命令列（`batch_cli.py`）共用同一套步驟，
+輸出結果完全一致。這個模組不依賴 Streamlit，也不直接依賴 Azure SDK，
+合成後端由呼叫端傳入（見 `tts_engine.SegmentSynthesizer`）。
+"""
+import os
+import re
+import shutil
+import subprocess
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from audio_formats import (
+    DEFAULT_AUDIO_QUALITY,
+    AudioFormat,
+    audio_duration,
+    make_joiner,
+    output_target,
+    pcm_counterpart,
+    select_audio_format,
+    silent_audio,
+    split_audio,
+)
+from job_manifest import SEGMENT_DONE, JobManifest
+from pcm_post import DEFAULT_LOUDNESS_DB, PcmPostProcessor, postprocess_available
+from run_report import RunReport, SegmentTiming
+from dialogue import DialogueLine, parse_dialogue
+from speech_text import clean_line
+from subtitles import Cue, WordCollector, line_cues, to_srt, to_vtt
+from ssml_builder import DEFAULT_BREAK_MS, build_ssml, line_mark, parse_line_mark, range_lines, spoken_line_indices
+from tts_engine import (
+    DEFAULT_MAX_WORKERS,
+    AudioSink,
+    ProgressCallback,
+    SegmentSynthesizer,
+    SynthesisCanceled,
+    SynthesisOutput,
+    synthesize_segments,
+)
+from karaoke_video import karaoke_available
+from video_render import DEFAULT_VIDEO_PROFILE, VIDEO_PROFILES, render_video
+from usage_quota import billable_chars
+from youtube_templates import DEFAULT_YT_TEMPLATE_KEY, YOUTUBE_DESCRIPTION_TEMPLATES
+
+
+DEFAULT_OUTPUT_DIR = "azure_outputs"
+
+
+# ====== 文字前處理 ======
+
+_BLANK_RUN_RE = re.compile(r"\n\n\n+")
+
+
+# 長文切成約這麼多字元的區塊分別清洗並快取；區塊邊界落在空行（段落）上，
+# 中間插入或刪除幾行時，後面的區塊邊界不會跟著位移，仍然命中快取
+_CLEAN_CHUNK_CHARS = 8192
+
+
+@lru_cache(maxsize=1024)
+def _clean_chunk(chunk: str, heading_seen: bool, block: str = "") -> Tuple[Tuple[str, ...], bool, str, int]:
+    """清洗一個區塊，回傳 (保留的行, 區塊結束時是否已遇過標題, 區塊結束時的 block, 詞數)。
+
+    `block` 是跨行的狀態（程式區塊圍欄或 HTML 註解），見 `speech_text.clean_line`。
+    """
+    kept = []
+    words = 0
+    for line in chunk.splitlines():
+        # 空行（text、空字串）保留為段落分隔，之後會變成一個空行
+        kind, cleaned, block = clean_line(line.strip(), block)
+        if kind == "heading":
+            # 只保留第一個標題的文字內容，其餘標題直接略過
+            if not heading_seen and cleaned:
+                kept.append(cleaned)
+                words += len(cleaned.split())
+            heading_seen = True
+        elif kind == "text":
+            kept.append(cleaned)
+            words += len(cleaned.split())
+    return tuple(kept), heading_seen, block, words
+
+
+def _iter_chunks(text: str):
+    start = 0
+    while start < len(text):
+        end = text.find("\n\n", start + _CLEAN_CHUNK_CHARS)
+        if end < 0 or end - start > 8 * _CLEAN_CHUNK_CHARS:
+            end = text.find("\n", start + _CLEAN_CHUNK_CHARS)
+        if end < 0:
+            yield text[start:]
+            return
+        # 區塊結尾包含換行，保證每個區塊都是完整的行
+        yield text[start:end + 1]
+        start = end + 1
+
+
+def _clean_markdown_counted(text: str) -> Tuple[str, int]:
+    kept = []
+    words = 0
+    heading_seen = False
+    block = ""
+    for chunk in _iter_chunks(text):
+        chunk_kept, heading_seen, block, chunk_words = _clean_chunk(chunk, heading_seen, block)
+        kept.extend(chunk_kept)
+        words += chunk_words
+    # 以換行重新接回文字，以保留原本的行結構
+    joined = "\n".join(kept)
+    # 壓縮多餘的連續空白行（最多保留兩個換行）
+    return _BLANK_RUN_RE.sub("\n\n", joined), words
+
+
+def clean_markdown(text: str) -> str:
+    """清掉 Markdown 標記，保留朗讀用的純文字，並盡量保留原始換行。
+    特別處理：
+    - 保留第一個標題的內容（當成正文開頭），其他標題仍刪除。
+    - 每行的標記由 `speech_text.clean_line` 處理：項目符號、強調、連結、程式碼、表格、引用、HTML 等。
+    - 原文中的換行會盡量被保留為行分隔符，一行輸入最多產生一行輸出。
+    清洗以區塊為單位快取，長文只改幾行時只有那幾個區塊需要重新清洗。
+    """
+    return _clean_markdown_counted(text)[0]
+
+
+def split_sentences(text: str):
+    """改為只依原始換行切成「行」，不再用標點符號斷句。
+
+    原則：
+    - 每一行視為一個朗讀單位。
+    - 原本為空行的，保留為空字串，最後在顯示時仍是一個換行。
+    - 這樣可避免像「z.b.」這類包含句點的縮寫被誤切斷。
+    """
+    # 直接保留原行（含空行）；splitlines 已去除換行符號
+    return text.splitlines()
+
+
+# ====== 分段與檔名 ======
+
+# (起始行號, 結束行號)，左閉右開，對應 split_sentences 的行列表
+LineRange = Tuple[int, int]
+
+
+def _join_range(all_sentences, line_range: LineRange) -> str:
+    start, end = line_range
+    return " ".join(all_sentences[start:end]).strip()
+
+
+def line_ranges_auto(all_sentences, per_segment: int) -> List[LineRange]:
+    """依序每 per_segment 行切一段，per_segment <= 0 時整篇一段。"""
+    total = len(all_sentences)
+    if not total:
+        return []
+    if per_segment <= 0:
+        ranges = [(0, total)]
+    else:
+        ranges = [(start, min(start + per_segment, total)) for start in range(0, total, per_segment)]
+    return [r for r in ranges if _join_range(all_sentences, r)]
+
+
+def build_segments_auto(all_sentences, per_segment: int):
+    """依序每 per_segment 行接成一段（以空白相接），per_segment <= 0 時整篇一段。"""
+    return [_join_range(all_sentences, r) for r in line_ranges_auto(all_sentences, per_segment)]
+
+
+# 各 voice 正常語速下每秒約唸幾個字元（含空白與標點），用來在合成前估算長度
+DEFAULT_VOICE = "de-DE-KatjaNeural"
+DEFAULT_CHARS_PER_SECOND = 14.0
+VOICE_CHARS_PER_SECOND = {
+    "de-DE-KatjaNeural": 14.0,
+    "de-DE-ConradNeural": 13.5,
+    "en-US-JennyNeural": 15.5,
+    "en-US-GuyNeural": 15.0,
+}
+DEFAULT_SEGMENT_SECONDS = 120
+DEFAULT_SEGMENT_CHARS = 2500
+# Azure 單次合成約 10 分鐘上限
+AZURE_MAX_SECONDS_PER_CALL = 600
+# 跟讀模式每次重複後的停頓，讓聽的人跟著唸
+DEFAULT_SHADOWING_GAP_MS = 2000
+
+
+def chars_per_second_for(voice: str) -> float:
+    return VOICE_CHARS_PER_SECOND.get(voice, DEFAULT_CHARS_PER_SECOND)
+
+
+def estimate_speech_seconds(text: str, chars_per_second: float = DEFAULT_CHARS_PER_SECOND) -> float:
+    return len(text.strip()) / chars_per_second
+
+
+def _range_pause_seconds(all_sentences, line_range: LineRange, pause_seconds: float) -> float:
+    """一段中行與行之間的停頓總秒數（SSML 的 `<break>`）。"""
+    spoken = sum(1 for line in all_sentences[line_range[0]:line_range[1]] if line.strip())
+    return pause_seconds * max(0, spoken - 1)
+
+
+def _estimate_range_seconds(all_sentences, line_range: LineRange, chars_per_second: float, pause_seconds: float) -> float:
+    chars = sum(len(line.strip()) for line in all_sentences[line_range[0]:line_range[1]])
+    return chars / chars_per_second + _range_pause_seconds(all_sentences, line_range, pause_seconds)
+
+
+@dataclass
+class SegmentPlan:
+    """分段結果與每段的估計朗讀秒數，合成前就能知道段數與最長一段有多長。"""
+
+    segments: List[str]
+    estimated_seconds: List[float]
+    # 每段涵蓋的行號範圍；SSML 打包與逐行時間戳都靠它對回原本的行
+    line_ranges: List[LineRange] = field(default_factory=list)
+    # 跟讀與對話模式：依原文順序的 (行號, 段號)，段號從 1 起算；一般模式為空，各段依序播放一次
+    track: List[Tuple[int, int]] = field(default_factory=list)
+    # 對話模式：每段包含的 (行號, 去掉說話者標籤的文字) 與朗讀的 voice；行號不一定連續
+    segment_lines: List[List[Tuple[int, str]]] = field(default_factory=list)
+    voices: List[str] = field(default_factory=list)
+    # 每段中行與行之間的停頓秒數（已算在 estimated_seconds 裡）；`run_history` 以此把停頓與語速分開估計
+    pause_seconds: List[float] = field(default_factory=list)
+
+    @property
+    def largest_seconds(self) -> float:
+        return max(self.estimated_seconds, default=0.0)
+
+    @property
+    def largest_chars(self) -> int:
+        return max((len(s) for s in self.segments), default=0)
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(self.estimated_seconds)
+
+    @property
+    def spoken_lines(self) -> int:
+        """跟讀模式中要唸的行數（含重複的行）；一般模式等於段數。"""
+        return len(self.track) if self.track else len(self.segments)
+
+    @property
+    def is_dialogue(self) -> bool:
+        return bool(self.segment_lines)
+
+
+def normalize_line(line: str) -> str:
+    """跟讀模式判斷「同一行」用：只差在前後或連續空白的兩行視為相同。"""
+    return " ".join(line.split())
+
+
+def shadowing_plan(all_sentences, chars_per_second: float = DEFAULT_CHARS_PER_SECOND) -> SegmentPlan:
+    """跟讀模式的分段：相同的行只合成一次，每個不重複的行自成一段。
+
+    `track` 依原文順序列出每個非空行與它對應的段號，合成後在本機依序串接、重複並插入停頓，
+    所以送給 Azure 的字元數只跟不重複的行有關，與實際唸出的行數無關。
+    """
+    first_seen: Dict[str, int] = {}
+    ranges: List[LineRange] = []
+    track: List[Tuple[int, int]] = []
+    for i, line in enumerate(all_sentences):
+        key = normalize_line(line)
+        if not key:
+            continue
+        if key not in first_seen:
+            ranges.append((i, i + 1))
+            first_seen[key] = len(ranges)
+        track.append((i, first_seen[key]))
+    return SegmentPlan(
+        segments=[_join_range(all_sentences, r) for r in ranges],
+        estimated_seconds=[_estimate_range_seconds(all_sentences, r, chars_per_second, 0.0) for r in ranges],
+        line_ranges=ranges,
+        track=track,
+        pause_seconds=[0.0] * len(ranges),
+    )
+
+
+def dialogue_plan(
+    all_sentences,
+    voice_map: Dict[str, str],
+    default_voice: str,
+    max_seconds: float = DEFAULT_SEGMENT_SECONDS,
+    max_chars: int = DEFAULT_SEGMENT_CHARS,
+    pause_seconds: float = 0.0,
+) -> SegmentPlan:
+    """對話模式的分段：同一個 voice 的所有行依 `line_ranges_packed` 打包成盡量少的段。
+
+    請求數只跟每個 voice 的總長度有關，與行數、換人說話的次數無關；
+    各段依第一行在原稿中的位置排序，按順序交付時能盡早接上音軌。
+    `track` 依原稿順序列出每行所在的段，合成後依 bookmark 把每行切出來、照原稿順序接起來。
+    """
+    by_voice: Dict[str, List[DialogueLine]] = {}
+    lines = parse_dialogue(all_sentences, voice_map, default_voice)
+    for line in lines:
+        by_voice.setdefault(line.voice, []).append(line)
+    groups = []
+    for voice, voice_lines in by_voice.items():
+        texts = [line.text for line in voice_lines]
+        chars_per_second = chars_per_second_for(voice)
+        for start, end in line_ranges_packed(texts, max_seconds, max_chars, chars_per_second, pause_seconds):
+            groups.append((voice, voice_lines[start:end], chars_per_second))
+    groups.sort(key=lambda group: group[1][0].line_index)
+
+    segment_of: Dict[int, int] = {}
+    plan = SegmentPlan(segments=[], estimated_seconds=[])
+    for number, (voice, group, chars_per_second) in enumerate(groups, start=1):
+        texts = [line.text for line in group]
+        plan.segments.append(" ".join(texts))
+        plan.pause_seconds.append(pause_seconds * (len(texts) - 1))
+        plan.estimated_seconds.append(sum(len(text) for text in texts) / chars_per_second + plan.pause_seconds[-1])
+        plan.segment_lines.append([(line.line_index, line.text) for line in group])
+        plan.voices.append(voice)
+        for line in group:
+            segment_of[line.line_index] = number
+    plan.track = [(line.line_index, segment_of[line.line_index]) for line in lines]
+    return plan
+
+
+def line_ranges_packed(
+    all_sentences,
+    max_seconds: float = DEFAULT_SEGMENT_SECONDS,
+    max_chars: int = DEFAULT_SEGMENT_CHARS,
+    chars_per_second: float = DEFAULT_CHARS_PER_SECOND,
+    pause_seconds: float = 0.0,
+) -> List[LineRange]:
+    """依估計朗讀長度打包：依序把整行塞進目前這段，直到再加一行就會超過秒數或字元上限。
+
+    永遠不會把一行切開；單行本身就超過上限時自成一段。空行不佔長度，跟著前一段。
+    `pause_seconds` 為行與行之間額外的停頓（SSML `<break>`）。
+    依序貪婪打包對「連續切段、每段有容量上限」來說就是段數最少的切法。
+    """
+    ranges = []
+    start = 0
+    current_chars = 0
+    current_seconds = 0.0
+    for i, line in enumerate(all_sentences):
+        line_chars = len(line.strip())
+        if line_chars == 0:
+            continue
+        added_chars = line_chars + (1 if current_chars else 0)
+        added_seconds = line_chars / chars_per_second + (pause_seconds if current_chars else 0.0)
+        if current_chars and (
+            current_seconds + added_seconds > max_seconds or current_chars + added_chars > max_chars
+        ):
+            ranges.append((start, i))
+            start, current_chars, current_seconds = i, 0, 0.0
+            added_chars, added_seconds = line_chars, line_chars / chars_per_second
+        current_chars += added_chars
+        current_seconds += added_seconds
+    if start < len(all_sentences):
+        ranges.append((start, len(all_sentences)))
+    return [r for r in ranges if _join_range(all_sentences, r)]
+
+
+def build_segments_packed(
+    all_sentences,
+    max_seconds: float = DEFAULT_SEGMENT_SECONDS,
+    max_chars: int = DEFAULT_SEGMENT_CHARS,
+    chars_per_second: float = DEFAULT_CHARS_PER_SECOND,
+) -> List[str]:
+    """`line_ranges_packed` 的純文字版本：每段的行以空白相接。"""
+    ranges = line_ranges_packed(all_sentences, max_seconds, max_chars, chars_per_second)
+    return [_join_range(all_sentences, r) for r in ranges]
+
+
+def format_timestamp(seconds: float) -> str:
+    """秒數 → `MM:SS.mmm`（超過一小時時為 `H:MM:SS.mmm`）。"""
+    millis = max(0, int(round(seconds * 1000)))
+    hours, rest = divmod(millis, 3_600_000)
+    minutes, rest = divmod(rest, 60_000)
+    secs, ms = divmod(rest, 1000)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}.{ms:03d}"
+    return f"{minutes:02d}:{secs:02d}.{ms:03d}"
+
+
+def sanitize_filename(s: str) -> str:
+    """簡單清理檔名：移除不適合的符號。"""
+    s = s.strip()
+    # 只保留常見安全字元，其餘用底線代替
+    return "".join(
+        (c if c.isalnum() or c in " _-一二三四五六七八九零〇壹貳參肆伍陸柒捌玖拾百千萬億" else "_")
+        for c in s
+    ).replace(" ", "_")
+
+
+def extract_heading(raw_markdown: str) -> str:
+    """取 Markdown 第一個標題當作檔名基底，沒有標題時用 "output"。"""
+    heading_match = re.search(r"^\s*#+\s+(.*)$", raw_markdown, flags=re.MULTILINE)
+    return heading_match.group(1).strip() if heading_match else "output"
+
+
+def make_final_base(raw_markdown: str, base_name: str = "", now: Optional[datetime] = None) -> str:
+    """根據自訂前綴（優先）或第一個標題，加上時間戳產生輸出檔名基底。"""
+    base_label = base_name.strip() if base_name.strip() else extract_heading(raw_markdown)
+    safe_label = sanitize_filename(base_label) or "output"
+    timestamp = (now or datetime.now()).strftime("%Y%m%d_%H%M%S")
+    return f"{safe_label}_{timestamp}"
+
+
+@lru_cache(maxsize=4)
+def build_description(display_text: str, template_key: str = DEFAULT_YT_TEMPLATE_KEY) -> str:
+    """本次文本加上固定模板，組成可直接貼到 YouTube 的說明欄。"""
+    template_body = YOUTUBE_DESCRIPTION_TEMPLATES.get(
+        template_key,
+        YOUTUBE_DESCRIPTION_TEMPLATES[DEFAULT_YT_TEMPLATE_KEY],
+    )
+    return f"{display_text}\n\n\n{template_body}"
+
+
+# ====== 合成與輸出 ======
+
+@dataclass
+class JobSpec:
+    """一份文件的合成設定，對應網頁側邊欄上的各個選項。"""
+
+    raw_markdown: str
+    voice: str = ""
+    base_name: str = ""
+    # "packed"：依估計朗讀長度打包；"auto"：每 sentences_per_segment 行一段；"single"：整篇一次合成
+    segmentation: str = "packed"
+    sentences_per_segment: int = 5
+    max_segment_seconds: float = DEFAULT_SEGMENT_SECONDS
+    max_segment_chars: int = DEFAULT_SEGMENT_CHARS
+    # True：以 SSML 送出，行間加 <break>，並用 <bookmark> 取得每行開始時間
+    use_ssml: bool = True
+    line_break_ms: int = DEFAULT_BREAK_MS
+    max_workers: int = DEFAULT_MAX_WORKERS
+    merge_in_memory: bool = True
+    make_video: bool = True
+    video_lead_seconds: float = 5
+    video_profile: str = DEFAULT_VIDEO_PROFILE
+    # 對話模式：說話者標籤 → voice，例如 {"A": "de-DE-KatjaNeural", "B": "de-DE-ConradNeural"}；
+    # 沒有標籤的行用 `voice`。空字典表示整份文本只用 `voice`
+    dialogue_voices: Dict[str, str] = field(default_factory=dict)
+    # 跟讀模式：大於 1 時每個不重複的行只合成一次，依原文順序每行重複這麼多次，每次後面接停頓
+    shadowing_repeats: int = 1
+    shadowing_gap_ms: int = DEFAULT_SHADOWING_GAP_MS
+    # 音訊格式依輸出目標決定（見 `audio_formats`）：影片與音檔用 MP3，wav_output 時用 PCM WAV
+    audio_quality: str = DEFAULT_AUDIO_QUALITY
+    wav_output: bool = False
+    # PCM 後製（需要 NumPy，見 `pcm_post`）：去掉各段前後靜音、接點統一為 post_gap_ms 的停頓，
+    # 整條音軌依 post_loudness_db 做一次音量正規化（0 表示不調整），最後只編碼一次
+    postprocess: bool = False
+    post_gap_ms: int = DEFAULT_BREAK_MS
+    post_loudness_db: float = DEFAULT_LOUDNESS_DB
+    # None：不輸出 YouTube 說明欄檔案
+    description_template: Optional[str] = None
+    output_dir: str = DEFAULT_OUTPUT_DIR
+
+
+@dataclass
+class JobResult:
+    final_base: str
+    audio_path: str
+    subtitle_path: str
+    video_path: Optional[str] = None
+    description_path: Optional[str] = None
+    timing_path: Optional[str] = None
+    # 依逐字時間（或每行 bookmark）對好時間的字幕；有影片時已加上開頭空白
+    srt_path: Optional[str] = None
+    vtt_path: Optional[str] = None
+    segment_count: int = 0
+    # 續傳時沿用上次已完成的段數
+    resumed_segments: int = 0
+    # 各階段耗時等效能資料（與 `<final_base>_report.json` 內容相同）
+    report_path: Optional[str] = None
+    report: Dict = field(default_factory=dict)
+    char_count: int = 0
+    audio_seconds: float = 0.0
+    render_seconds: float = 0.0
+    elapsed_seconds: float = 0.0
+    warnings: List[str] = field(default_factory=list)
+    # 行號 → 在最終 MP3 中的開始秒數（只有 SSML 模式才有）
+    line_starts: Dict[int, float] = field(default_factory=dict)
+
+
+class PreparedText:
+    """清洗後的文本與分段結果；網頁預覽與實際合成共用。
+
+    建立後視為唯讀：`prepare_text` 會把同一個實例交給多次重跑與多個工作共用。
+    """
+
+    def __init__(self, raw_markdown: str):
+        self.cleaned_text, self.word_count = (
+            _clean_markdown_counted(raw_markdown) if raw_markdown.strip() else ("", 0)
+        )
+        self.sentences = split_sentences(self.cleaned_text) if self.cleaned_text else []
+        self.display_text = "\n".join(self.sentences)
+        self._plans: Dict[tuple, SegmentPlan] = {}
+
+    def plan(self, spec: "JobSpec") -> SegmentPlan:
+        """依 spec 的分段設定切段；相同設定只算一次。"""
+        key = (
+            spec.segmentation,
+            spec.sentences_per_segment,
+            spec.max_segment_seconds,
+            spec.max_segment_chars,
+            spec.voice or DEFAULT_VOICE,
+            spec.use_ssml,
+            spec.line_break_ms,
+            spec.shadowing_repeats > 1,
+            tuple(sorted(spec.dialogue_voices.items())),
+        )
+        plan = self._plans.get(key)
+        if plan is None:
+            plan = self._plans[key] = self._build_plan(spec)
+        return plan
+
+    def _build_plan(self, spec: "JobSpec") -> SegmentPlan:
+        chars_per_second = chars_per_second_for(spec.voice or DEFAULT_VOICE)
+        pause_seconds = spec.line_break_ms / 1000 if spec.use_ssml else 0.0
+        if spec.dialogue_voices and self.sentences:
+            # 對話模式一定以 SSML 送出：要靠 bookmark 把每行切回來
+            return dialogue_plan(
+                self.sentences,
+                spec.dialogue_voices,
+                spec.voice or DEFAULT_VOICE,
+                max_seconds=spec.max_segment_seconds,
+                max_chars=spec.max_segment_chars,
+                pause_seconds=spec.line_break_ms / 1000,
+            )
+        if spec.shadowing_repeats > 1:
+            return shadowing_plan(self.sentences, chars_per_second)
+        if spec.segmentation == "packed" and self.sentences:
+            ranges = line_ranges_packed(
+                self.sentences,
+                max_seconds=spec.max_segment_seconds,
+                max_chars=spec.max_segment_chars,
+                chars_per_second=chars_per_second,
+                pause_seconds=pause_seconds,
+            )
+            segments = [_join_range(self.sentences, r) for r in ranges]
+        elif spec.segmentation == "auto" and self.sentences:
+            ranges = line_ranges_auto(self.sentences, spec.sentences_per_segment)
+            segments = [_join_range(self.sentences, r) for r in ranges]
+        else:
+            # 退而求其次，以 cleaned_text 當作單一段
+            ranges = [(0, len(self.sentences))] if self.cleaned_text.strip() else []
+            segments = [self.cleaned_text] if self.cleaned_text.strip() else []
+        return SegmentPlan(
+            segments=segments,
+            estimated_seconds=[
+                _estimate_range_seconds(self.sentences, r, chars_per_second, pause_seconds) for r in ranges
+            ],
+            line_ranges=ranges,
+            pause_seconds=[_range_pause_seconds(self.sentences, r, pause_seconds) for r in ranges],
+        )
+
+    def timed_text(self, line_starts: Dict[int, float], offset: float = 0.0) -> str:
+        """每行前面加上 `[MM:SS.mmm]` 開始時間；空行保留為空行。"""
+        lines = []
+        for i, line in enumerate(self.sentences):
+            if i in line_starts:
+                lines.append(f"[{format_timestamp(line_starts[i] + offset)}] {line}")
+            else:
+                lines.append(line)
+        return "\n".join(lines)
+
+
+def sends_ssml(spec: "JobSpec", plan: SegmentPlan) -> bool:
+    # 對話模式一定以 SSML 送出：要靠 bookmark 把每行切回來
+    return spec.use_ssml or plan.is_dialogue
+
+
+def build_payloads(spec: "JobSpec", sentences: Sequence[str], plan: SegmentPlan) -> Tuple[List[str], List[List[int]]]:
+    """每段實際送給後端的內容，以及各段 SSML bookmark（`L0`、`L1`…）依序對應的原文行號；純文字送出時沒有 bookmark。"""
+    if plan.is_dialogue:
+        payloads = [build_ssml(lines, voice, spec.line_break_ms) for lines, voice in zip(plan.segment_lines, plan.voices)]
+        return payloads, [spoken_line_indices(lines) for lines in plan.segment_lines]
+    if spec.use_ssml:
+        voice = spec.voice or DEFAULT_VOICE
+        segment_lines = [range_lines(sentences, r) for r in plan.line_ranges]
+        payloads = [build_ssml(lines, voice, spec.line_break_ms) for lines in segment_lines]
+        return payloads, [spoken_line_indices(lines) for lines in segment_lines]
+    return list(plan.segments), [[] for _ in plan.segments]
+
+
+def job_billable_chars(spec: "JobSpec", sentences: Sequence[str], plan: SegmentPlan) -> int:
+    """這份工作最多會被計費的字元數（SSML 標記也算，命中分段快取的分段實際上不計）。"""
+    use_ssml = sends_ssml(spec, plan)
+    return sum(billable_chars(payload, use_ssml) for payload in build_payloads(spec, sentences, plan)[0])
+
+
+@lru_cache(maxsize=8)
+def prepare_text(raw_markdown: str) -> PreparedText:
+    """`PreparedText` 的快取版本，以原始文字為鍵。
+
+    Streamlit 每動一次元件就從頭重跑腳本，但模組只匯入一次；
+    文字沒變時直接拿回上次的結果，改了幾行時也只有那幾個區塊要重新清洗（見 `_clean_chunk`）。
+    """
+    return PreparedText(raw_markdown)
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which("ffmpeg") is not None
+
+
+def concat_with_ffmpeg(part_files: List[str], audio_path: str, list_path: str) -> None:
+    """舊流程：以 ffmpeg concat 模式合併分段檔，成功後清理分段檔與清單檔。"""
+    with open(list_path, "w", encoding="utf-8") as f:
+        for part in part_files:
+            # ffmpeg concat 檔案列表格式：file 'path'
+            f.write(f"file '{os.path.abspath(part)}'\n")
+
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-y",
+            "-f",
+            "concat",
+            "-safe",
+            "0",
+            "-i",
+            list_path,
+            "-c",
+            "copy",
+            audio_path,
+        ],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        check=True,
+    )
+    # 合併成功後，清理中間切片檔與清單檔，只保留完整 MP3
+    for part in part_files:
+        try:
+            os.remove(part)
+        except Exception:
+            pass
+    try:
+        os.remove(list_path)
+    except Exception:
+        pass
+
+
+def run_job(
+    spec: JobSpec,
+    synthesizer: SegmentSynthesizer,
+    on_progress: Optional[ProgressCallback] = None,
+    on_stage: Optional[Callable[[str], None]] = None,
+    on_audio: Optional[AudioSink] = None,
+    final_base: Optional[str] = None,
+) -> JobResult:
+    """執行一份文件的完整流程：字幕文字檔 → 分段合成 → 合併 MP3 →（選擇性）MP4 與說明欄。
+
+    - `on_progress(index, completed, total)`：每完成一段呼叫一次。
+    - `on_stage(name)`：進入 "synthesize" / "concat" / "video" 等階段時呼叫。
+    - `on_audio(index, output)`：每段依順序寫入 MP3 之後呼叫（例如推給邊合成邊播放的串流）。
+    `spec.use_ssml` 時每段以 SSML 送出，另外輸出每行附開始時間的 `<final_base>_timed.txt`。
+    不論成功或失敗，都會輸出各階段耗時的 `<final_base>_report.json`。
+    合成失敗拋出 `SynthesisCanceled`，ffmpeg 失敗拋出 `subprocess.CalledProcessError`。
+    """
+    final_base = final_base or make_final_base(spec.raw_markdown, spec.base_name)
+    os.makedirs(spec.output_dir, exist_ok=True)
+    spec_fields = asdict(spec)
+    del spec_fields["raw_markdown"]
+    report = RunReport(final_base, settings=spec_fields)
+    report_path = os.path.join(spec.output_dir, f"{final_base}_report.json")
+    try:
+        result = _run_stages(spec, synthesizer, final_base, spec_fields, report, on_progress, on_stage, on_audio)
+    except BaseException as e:
+        report.status = "failed"
+        report.error = f"{type(e).__name__}: {e}"
+        try:
+            report.write(report_path)
+        except OSError:
+            pass
+        raise
+    report.status = "done"
+    result.elapsed_seconds = report.wall_seconds
+    try:
+        result.report = report.write(report_path)
+        result.report_path = report_path
+    except OSError as e:
+        result.warnings.append(f"輸出效能報告時發生錯誤：{e}")
+    return result
+
+
+def _run_stages(
+    spec: JobSpec,
+    synthesizer: SegmentSynthesizer,
+    final_base: str,
+    spec_fields: Dict,
+    report: RunReport,
+    on_progress: Optional[ProgressCallback],
+    on_stage: Optional[Callable[[str], None]],
+    on_audio: Optional[AudioSink],
+) -> JobResult:
+    """`run_job` 的各個階段；每個階段的耗時記進 `report`。"""
+    def stage(name: str):
+        if on_stage is not None:
+            on_stage(name)
+
+    audio_format = job_audio_format(spec)
+    output_format = job_output_format(spec)
+    postprocess = postprocess_enabled(spec)
+    with report.stage("preprocess") as timing:
+        prepared = prepare_text(spec.raw_markdown)
+        plan = prepared.plan(spec)
+        segments = plan.segments
+        if not segments:
+            raise ValueError("沒有可用來語音合成的文本分段。")
+        timing.chars = len(spec.raw_markdown)
+
+        result = JobResult(
+            final_base=final_base,
+            audio_path=os.path.join(spec.output_dir, f"{final_base}.{output_format.extension}"),
+            subtitle_path=os.path.join(spec.output_dir, f"{final_base}.txt"),
+            segment_count=len(segments),
+            char_count=len(prepared.cleaned_text),
+        )
+
+        if plan.largest_seconds > AZURE_MAX_SECONDS_PER_CALL:
+            result.warnings.append(
+                f"最長一段估計約 {plan.largest_seconds / 60:.1f} 分鐘，超過 Azure 單次約 10 分鐘的上限，可能被取消。"
+            )
+
+        # 將清洗後、每句一行的文本輸出成 .txt，方便餵給 YouTube 做字幕
+        try:
+            with open(result.subtitle_path, "w", encoding="utf-8") as f:
+                f.write(prepared.display_text)
+        except Exception as e:
+            result.warnings.append(f"輸出字幕用文本檔時發生錯誤：{e}")
+
+        use_ssml = sends_ssml(spec, plan)
+        payloads, segment_line_indices = build_payloads(spec, prepared.sentences, plan)
+        if plan.is_dialogue and spec.shadowing_repeats > 1:
+            result.warnings.append("對話模式不支援跟讀重複，本次每行只唸一次。")
+
+    has_ffmpeg = ffmpeg_available()
+    if spec.postprocess and not postprocess:
+        missing = "NumPy" if not postprocess_available() else "ffmpeg（編碼 MP3 用）"
+        result.warnings.append(f"找不到 {missing}，本次略過 PCM 後製，各段原樣串接。")
+    # 跟讀模式要在本機重複與插入停頓、後製要逐段處理 PCM，都只能用記憶體合併
+    merge_in_memory = spec.merge_in_memory or not has_ffmpeg or bool(plan.track) or postprocess
+    if spec.make_video and not has_ffmpeg:
+        result.warnings.append("找不到 ffmpeg，本次只會輸出 MP3，不會產生 MP4 影片。")
+
+    # 每段完成就寫進工作清單檔與分段檔；同名工作之前失敗過時，已完成的段落直接沿用
+    manifest = JobManifest.create(
+        spec.output_dir, final_base, spec_fields, spec.raw_markdown, payloads, audio_format=audio_format.key
+    )
+    pending = manifest.pending_indices()
+    result.resumed_segments = len(segments) - len(pending)
+
+    # 記憶體合併：依序拆成 MP3 frame（或 PCM 取樣）串流寫進最終音檔；舊流程：最後用 ffmpeg 合併各分段檔。
+    # 後製時由 PcmPostProcessor 逐段去掉前後靜音，commit 時才套用音量並編碼成最終格式
+    if postprocess:
+        audio_sink = PcmPostProcessor(
+            result.audio_path, spec.post_gap_ms, spec.post_loudness_db, bitrate=output_format.bitrate
+        )
+    else:
+        audio_sink = make_joiner(audio_format, result.audio_path) if merge_in_memory else None
+
+    # 各段依序到達，累加前面各段的實際長度，把段內 bookmark 時間換成整份 MP3 的時間
+    segment_start = 0.0
+    next_to_deliver = 1
+    # 跟讀模式：下一個要放進音軌的 plan.track 位置
+    next_in_track = 0
+    gap = None
+    if plan.track and not plan.is_dialogue:
+        gap_data = silent_audio(audio_format, spec.shadowing_gap_ms / 1000)
+        gap = SynthesisOutput(gap_data, audio_duration(gap_data))
+    # 本次實際合成的段落：(請求耗時, 是否命中快取)；續傳沿用的段落不在這裡
+    request_stats: Dict[int, Tuple[float, bool]] = {}
+    # 本次合成、還沒交付的段落直接從記憶體交付；分段檔只留給續傳讀回
+    synthesized: Dict[int, SynthesisOutput] = {}
+
+    def take_output(index: int) -> SynthesisOutput:
+        output = synthesized.pop(index, None)
+        return output if output is not None else manifest.load_output(index)
+    # 依音軌順序累積逐字時間；有任何一段沒有逐字時間（舊的快取或分段檔）就改用每行的 bookmark
+    words = WordCollector()
+    words_missing = False
+    last_line_start = 0.0
+
+    def emit(index: int, output: SynthesisOutput, duration: float) -> Tuple[float, SynthesisOutput]:
+        """把一段音訊接到最終音軌後面，並推給邊合成邊播放。
+
+        回傳 (這段開頭在最終音軌中的秒數, 這段)；後製時是去掉開頭靜音之後的位置，
+        回傳的這段的 bookmark 與逐字時間也已經扣掉去掉的開頭。
+        """
+        nonlocal segment_start, words_missing
+        start = segment_start
+        pushed = output
+        placed = audio_sink(index, output) if audio_sink is not None else None
+        if placed is None:
+            segment_start += duration
+        else:
+            # 後製去掉了前後靜音並改變接點的停頓，位置與段內時間都以後製的結果為準
+            (start, output), segment_start = placed, audio_sink.duration
+        if pushed is not gap:
+            if output.words:
+                words.add(start, output.words, output.bookmarks)
+            else:
+                words_missing = True
+        if on_audio is not None:
+            push_started = time.perf_counter()
+            on_audio(index, pushed)
+            report.add_time("playback", time.perf_counter() - push_started, bytes=len(pushed.audio_data))
+        return start, output
+
+    def set_line_start(line_index: int, seconds: float) -> None:
+        """各行依原文順序交付；開始時間不小於 0，也不早於前一行（bookmark 落在去掉的靜音裡時會夾到同一點）。"""
+        nonlocal last_line_start
+        last_line_start = max(last_line_start, seconds)
+        result.line_starts[line_index] = last_line_start
+
+    def record(index: int, output: SynthesisOutput, duration: float):
+        elapsed, cached = request_stats.get(index, (0.0, False))
+        report.record_segment(
+            SegmentTiming(
+                index=index,
+                chars=len(segments[index - 1]),
+                bytes=len(output.audio_data),
+                audio_seconds=duration,
+                wall_seconds=elapsed,
+                cached=cached,
+                resumed=index not in request_stats,
+                voice=plan.voices[index - 1] if plan.voices else spec.voice or DEFAULT_VOICE,
+                pause_seconds=plan.pause_seconds[index - 1] if plan.pause_seconds else 0.0,
+            )
+        )
+
+    def deliver_ready():
+        """依段落順序交付所有已完成的段落（包含續傳時沿用的段落）。"""
+        nonlocal next_to_deliver
+        if plan.track:
+            deliver_track()
+            return
+        while next_to_deliver <= len(segments) and manifest.segments[next_to_deliver - 1].state == SEGMENT_DONE:
+            entry = manifest.segments[next_to_deliver - 1]
+            output = take_output(next_to_deliver)
+            record(next_to_deliver, output, entry.duration)
+            start, placed = emit(next_to_deliver, output, entry.duration)
+            for line_index, offset in resolve_bookmarks(segment_line_indices[next_to_deliver - 1], placed.bookmarks):
+                set_line_start(line_index, start + offset)
+            next_to_deliver += 1
+
+    # 跟讀與對話模式中，同一段會在音軌裡用到好幾次；讀進來之後留到最後一次用完
+    loaded: Dict[int, list] = {}
+    last_use = {index: position for position, (_line, index) in enumerate(plan.track)}
+
+    def deliver_track():
+        """跟讀與對話模式：依原文順序組出音軌。
+
+        跟讀模式每行重複 `shadowing_repeats` 次，每次後面接一段停頓；
+        對話模式依 bookmark 從所在的段切出這一行。
+        """
+        nonlocal next_to_deliver, next_in_track
+        while next_in_track < len(plan.track):
+            line_index, index = plan.track[next_in_track]
+            entry = manifest.segments[index - 1]
+            if entry.state != SEGMENT_DONE:
+                return
+            if index == next_to_deliver:
+                # 各段第一次用到的順序就是段號順序，每段只記錄一次請求統計
+                output = take_output(index)
+                record(index, output, entry.duration)
+                if plan.is_dialogue:
+                    pause = spec.line_break_ms / 1000
+                    loaded[index] = split_dialogue_lines(
+                        plan.segment_lines[index - 1], segment_line_indices[index - 1], output, entry.duration, pause
+                    )
+                else:
+                    loaded[index] = [output]
+                next_to_deliver += 1
+            if plan.is_dialogue:
+                clip = loaded[index].pop(0)
+                start, placed = emit(index, clip, clip.audio_duration)
+                set_line_start(line_index, start + placed.bookmarks[0][1])
+            else:
+                output = loaded[index][0]
+                for repeat in range(spec.shadowing_repeats):
+                    start, _placed = emit(index, output, entry.duration)
+                    if repeat == 0:
+                        set_line_start(line_index, start)
+                    emit(index, gap, gap.audio_duration)
+            if last_use[index] == next_in_track:
+                del loaded[index]
+            next_in_track += 1
+
+    def on_segment_complete(local_idx: int, output):
+        index = pending[local_idx - 1]
+        request_stats[index] = (output.elapsed_seconds, output.cached)
+        manifest.mark_done(index, output, audio_duration(output.audio_data))
+        synthesized[index] = output
+
+    def on_segment_progress(local_idx: int, completed: int, _total: int):
+        if on_progress is not None:
+            on_progress(pending[local_idx - 1], result.resumed_segments + completed, len(segments))
+
+    stage("synthesize")
+    with report.stage("synthesize") as timing:
+        try:
+            deliver_ready()
+            synthesize_segments(
+                [payloads[i - 1] for i in pending],
+                synthesizer,
+                on_audio=lambda _idx, _output: deliver_ready(),
+                max_workers=spec.max_workers,
+                on_progress=on_segment_progress,
+                ssml=use_ssml,
+                on_complete=on_segment_complete,
+            )
+            deliver_ready()
+        except SynthesisCanceled as e:
+            if audio_sink is not None:
+                audio_sink.abort()
+            if e.index is not None:
+                e.index = pending[e.index - 1]
+            manifest.mark_failed(f"{e.reason} - {e.details}", e.index)
+            raise
+        except BaseException as e:
+            if audio_sink is not None:
+                audio_sink.abort()
+            manifest.mark_failed(repr(e))
+            raise
+        timing.chars = sum(len(segments[i - 1]) for i, (_t, cached) in request_stats.items() if not cached)
+        timing.bytes = sum(s.bytes for s in report.segments)
+        timing.audio_seconds = segment_start
+
+    stage("concat")
+    with report.stage("concat") as timing:
+        if audio_sink is not None:
+            audio_sink.commit()
+            result.audio_seconds = audio_sink.duration
+        else:
+            concat_with_ffmpeg(
+                manifest.part_paths(),
+                result.audio_path,
+                os.path.join(spec.output_dir, f"{final_base}_concat_list.txt"),
+            )
+            with open(result.audio_path, "rb") as f:
+                result.audio_seconds = audio_duration(f.read())
+        timing.bytes = os.path.getsize(result.audio_path)
+        timing.audio_seconds = result.audio_seconds
+    # MP3 已完整寫出，之後影片失敗也不需要重新合成
+    manifest.remove()
+
+    make_video = spec.make_video and has_ffmpeg
+    with report.stage("subtitles"):
+        if result.line_starts:
+            result.timing_path = os.path.join(spec.output_dir, f"{final_base}_timed.txt")
+            try:
+                with open(result.timing_path, "w", encoding="utf-8") as f:
+                    f.write(prepared.timed_text(result.line_starts))
+            except OSError as e:
+                result.timing_path = None
+                result.warnings.append(f"輸出逐行時間戳文本時發生錯誤：{e}")
+        elif use_ssml:
+            result.warnings.append("合成結果沒有回報任何 bookmark，未輸出逐行時間戳文本。")
+        cues = write_subtitle_files(
+            result,
+            spec.output_dir,
+            words.cues() if len(words) and not words_missing else [],
+            prepared.sentences,
+            # 字幕對的是影片：影片開頭有 video_lead_seconds 的空白
+            spec.video_lead_seconds if make_video else 0.0,
+        )
+
+    if make_video and VIDEO_PROFILES[spec.video_profile].karaoke:
+        if not karaoke_available():
+            result.warnings.append("找不到 Pillow（pip install pillow），本次改輸出黑底影片，不顯示逐行字幕。")
+        elif not cues:
+            result.warnings.append("沒有逐行時間可用，本次改輸出黑底影片，不顯示逐行字幕。")
+
+    if make_video:
+        stage("video")
+        with report.stage("video") as timing:
+            result.video_path = os.path.join(spec.output_dir, f"{final_base}.mp4")
+            result.render_seconds = render_video(
+                result.audio_path,
+                result.video_path,
+                lead_seconds=spec.video_lead_seconds,
+                profile_key=spec.video_profile,
+                cues=cues,
+            )
+            timing.bytes = os.path.getsize(result.video_path)
+            timing.audio_seconds = result.audio_seconds + spec.video_lead_seconds
+
+    if spec.description_template:
+        with report.stage("description"):
+            result.description_path = os.path.join(spec.output_dir, f"{final_base}_description.txt")
+            with open(result.description_path, "w", encoding="utf-8") as f:
+                f.write(build_description(prepared.display_text, spec.description_template))
+
+    stage("done")
+    return result
+
+
+def write_subtitle_files(
+    result: JobResult,
+    output_dir: str,
+    cues: List[Cue],
+    sentences: List[str],
+    shift: float,
+) -> List[Cue]:
+    """寫出 `<final_base>.srt` 與 `.vtt`，回傳實際使用的字幕（也用於逐行字幕影片）。
+
+    沒有逐字時間時改用每行的 bookmark，兩者都沒有就不輸出。
+    """
+    if not cues and result.line_starts:
+        cues = line_cues(sentences, result.line_starts, result.audio_seconds)
+    if not cues:
+        result.warnings.append("合成結果沒有逐字時間也沒有 bookmark，未輸出 SRT / VTT 字幕。")
+        return []
+    for attr, extension, render in (("srt_path", "srt", to_srt), ("vtt_path", "vtt", to_vtt)):
+        path = os.path.join(output_dir, f"{result.final_base}.{extension}")
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(render(cues, shift))
+        except OSError as e:
+            result.warnings.append(f"輸出 {extension.upper()} 字幕時發生錯誤：{e}")
+            continue
+        setattr(result, attr, path)
+    return cues
+
+
+def resolve_bookmarks(line_indices: Sequence[int], bookmarks) -> List[Tuple[int, float]]:
+    """段內的 bookmark（`L0`、`L1`…）換成 (原文行號, 段內秒數)；`line_indices` 來自 `spoken_line_indices`。"""
+    resolved = []
+    for mark, offset in bookmarks:
+        position = parse_line_mark(mark)
+        if position is not None and position < len(line_indices):
+            resolved.append((line_indices[position], offset))
+    return resolved
+
+
+def split_dialogue_lines(
+    lines: List[Tuple[int, str]],
+    line_indices: Sequence[int],
+    output: SynthesisOutput,
+    duration: float,
+    pause_seconds: float,
+) -> List[SynthesisOutput]:
+    """依 bookmark 把一段對話音訊切回每一行，每一行的音訊帶一個 `L0` bookmark，標出行內開始說話的秒數。
+
+    切點放在兩行之間停頓的中間，避免切到字；某行沒有回報 bookmark 時依字數比例估計位置。
+    """
+    marks = dict(resolve_bookmarks(line_indices, output.bookmarks))
+    total_chars = sum(len(text) for _i, text in lines) or 1
+    starts = []
+    chars_before = 0
+    for line_index, text in lines:
+        starts.append(marks.get(line_index, duration * chars_before / total_chars))
+        chars_before += len(text)
+    cuts = [0.0]
+    for previous, start in zip(starts, starts[1:]):
+        cuts.append(max(cuts[-1], previous, start - pause_seconds / 2))
+    clips = []
+    ends = cuts[1:] + [float("inf")]
+    for data, cut, end, start in zip(split_audio(output.audio_data, cuts[1:]), cuts, ends, starts):
+        # 逐字時間依開始位置分到所在的那一行，改成相對於切出來的片段
+        clip_words = [(offset - cut, length, text) for offset, length, text in output.words if cut <= offset < end]
+        clips.append(
+            SynthesisOutput(
+                data, audio_duration(data), bookmarks=[(line_mark(0), max(0.0, start - cut))], words=clip_words
+            )
+        )
+    return clips
+
+
+def job_output_format(spec: JobSpec) -> AudioFormat:
+    """最終音檔的格式，依輸出目標與品質等級決定；沒有開啟後製時與 `job_audio_format` 相同。"""
+    return select_audio_format(output_target(spec.make_video, spec.wav_output), spec.audio_quality)
+
+
+def postprocess_enabled(spec: JobSpec) -> bool:
+    """PCM 後製需要 NumPy；最終要 MP3 時另外需要 ffmpeg 編碼。"""
+    if not spec.postprocess or not postprocess_available():
+        return False
+    return job_output_format(spec).container == "wav" or ffmpeg_available()
+
+
+def job_audio_format(spec: JobSpec) -> AudioFormat:
+    """這份工作要向 Azure 要求的輸出格式；建立合成後端時也要用同一個格式。
+
+    開啟 PCM 後製時是同取樣率的 PCM，處理完才編碼成 `job_output_format`。
+    """
+    output_format = job_output_format(spec)
+    return pcm_counterpart(output_format) if postprocess_enabled(spec) else output_format
+
+
+def spec_from_manifest(manifest: JobManifest) -> JobSpec:
+    return JobSpec(raw_markdown=manifest.read_source(), **manifest.spec)
+
+
+def resume_job(
+    manifest: JobManifest,
+    synthesizer: SegmentSynthesizer,
+    on_progress: Optional[ProgressCallback] = None,
+    on_stage: Optional[Callable[[str], None]] = None,
+    on_audio: Optional[AudioSink] = None,
+) -> JobResult:
+    """續傳未完成的工作：沿用清單檔中的設定與檔名基底，只合成還沒完成的段落，再合併與產生影片。"""
+    return run_job(
+        spec_from_manifest(manifest),
+        synthesizer,
+        on_progress=on_progress,
+        on_stage=on_stage,
+        on_audio=on_audio,
+        final_base=manifest.final_base,
+    )
@@ -0,0 +1,262 @@
+"""Azure 用量帳本與請求限速。
+
+原本側邊欄的「文字用量」只拿這次文本的字元數去比固定的 500,000，跨次執行的用量完全沒有紀錄；
+併發或批次合成時也沒有任何東西限制請求速度，一超過資源層級的限制就是一連串 `Canceled`。
+
+- `UsageLedger`：以 SQLite 記錄每月、每把金鑰、每個 voice 實際送出的計費字元數與請求數
+  （SSML 的標記也計費，只有 `<speak>`、`<voice>` 外框不算，見 `billable_chars`），
+  存在輸出資料夾的 `.usage.sqlite3`（`ledger_path`），網頁與命令列用同一個輸出資料夾時共用同一份；
+  金鑰只存雜湊後的指紋。
+- `TokenBucket`：依資源層級的每秒交易數補充權杖，每個送往 Azure 的請求都要先拿到一個權杖；
+  同一個程序中的所有工作共用同一個 bucket。限速只在單一程序內有效：網頁與 `batch_cli.py`
+  各有自己的 bucket（經由常駐服務送出的請求由送出的那一方限速），同時對同一把金鑰執行時，
+  合計的請求速度仍可能超過資源層級的限制。
+- `MeteredSynthesizer`：包住實際呼叫 Azure 的後端，先過限速再送出，成功後記進帳本。
+  它放在分段快取的內層，命中快取的分段不佔權杖、也不計入用量。
+"""
+import calendar
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from tts_engine import SegmentSynthesizer, SynthesisOutput
+
+
+LEDGER_FILENAME = ".usage.sqlite3"
+DEFAULT_LEDGER_PATH = os.path.join("azure_outputs", LEDGER_FILENAME)
+
+
+@dataclass(frozen=True)
+class ResourceTier:
+    key: str
+    label: str
+    # 每秒可補充的請求數與可以一次連發的上限
+    requests_per_second: float
+    burst: int
+    # 每月免費字元數；0 表示沒有免費額度
+    monthly_free_chars: int
+
+
+TIERS = {
+    # F0：每 60 秒 20 個交易、每月 50 萬字元免費
+    "F0": ResourceTier("F0", "免費（F0）", 20 / 60, 20, 500_000),
+    # S0：預設每秒 200 個交易，沒有免費額度
+    "S0": ResourceTier("S0", "標準（S0）", 200.0, 200, 0),
+}
+DEFAULT_TIER = "F0"
+
+# Azure 計費時不算的只有 <speak> 與 <voice> 這兩層外框；<break>、<bookmark>、<prosody> 等標記照算
+_UNBILLED_TAG_RE = re.compile(r"</?(?:speak|voice)\b[^>]*>")
+_SSML_VOICE_RE = re.compile(r"<voice\s+name=[\"']([^\"']+)[\"']")
+
+
+def ledger_path(output_dir: str) -> str:
+    return os.path.join(output_dir, LEDGER_FILENAME)
+
+
+def current_month(now: Optional[float] = None) -> str:
+    return datetime.fromtimestamp(now if now is not None else time.time()).strftime("%Y-%m")
+
+
+def key_fingerprint(key: str) -> str:
+    """帳本中代表一把金鑰的指紋；不存金鑰本身。"""
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:12] if key else "default"
+
+
+def billable_chars(payload: str, ssml: bool = False) -> int:
+    """計費字元數：SSML 除了 `<speak>`、`<voice>` 的開頭與結尾標籤之外都算，
+    包括 `<break>`、`<bookmark>` 等標記與跳脫後的實體（`&amp;` 算 5 個字元）。"""
+    if not ssml:
+        return len(payload)
+    return len(_UNBILLED_TAG_RE.sub("", payload))
+
+
+def ssml_voice(ssml: str, default: str) -> str:
+    match = _SSML_VOICE_RE.search(ssml)
+    return match.group(1) if match else default
+
+
+class UsageLedger:
+    """執行緒安全；多個程序同時寫入時由 SQLite 的鎖保護。"""
+
+    def __init__(self, path: str = DEFAULT_LEDGER_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._db:
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS usage (
+                    month TEXT NOT NULL,
+                    key_id TEXT NOT NULL,
+                    voice TEXT NOT NULL,
+                    chars INTEGER NOT NULL DEFAULT 0,
+                    requests INTEGER NOT NULL DEFAULT 0,
+                    failed INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (month, key_id, voice)
+                )
+                """
+            )
+
+    def record(self, key_id: str, voice: str, chars: int, ok: bool = True, month: Optional[str] = None) -> None:
+        """記錄一個送往 Azure 的請求；失敗的請求只計次數，不計字元。"""
+        with self._lock, self._db:
+            self._db.execute(
+                """
+                INSERT INTO usage (month, key_id, voice, chars, requests, failed) VALUES (?, ?, ?, ?, 1, ?)
+                ON CONFLICT (month, key_id, voice) DO UPDATE SET
+                    chars = chars + excluded.chars,
+                    requests = requests + 1,
+                    failed = failed + excluded.failed
+                """,
+                (month or current_month(), key_id, voice, chars if ok else 0, 0 if ok else 1),
+            )
+
+    def month_totals(self, key_id: str, month: Optional[str] = None) -> Dict[str, int]:
+        with self._lock:
+            chars, requests, failed = self._db.execute(
+                "SELECT COALESCE(SUM(chars), 0), COALESCE(SUM(requests), 0), COALESCE(SUM(failed), 0) "
+                "FROM usage WHERE month = ? AND key_id = ?",
+                (month or current_month(), key_id),
+            ).fetchone()
+        return {"chars": chars, "requests": requests, "failed": failed}
+
+    def by_voice(self, key_id: str, month: Optional[str] = None) -> List[Dict]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT voice, chars, requests, failed FROM usage WHERE month = ? AND key_id = ? ORDER BY chars DESC",
+                (month or current_month(), key_id),
+            ).fetchall()
+        return [{"voice": v, "chars": c, "requests": r, "failed": f} for v, c, r, f in rows]
+
+    def history(self, key_id: str) -> List[Dict]:
+        """每個月的總用量，最新的月份在前面。"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT month, SUM(chars), SUM(requests) FROM usage WHERE key_id = ? GROUP BY month ORDER BY month DESC",
+                (key_id,),
+            ).fetchall()
+        return [{"month": m, "chars": c, "requests": r} for m, c, r in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def budget_warning(ledger: UsageLedger, key_id: str, budget_chars: int, job_chars: int) -> Optional[str]:
+    """這份工作送出後會超過本月預算時回傳提醒文字；`budget_chars` 為 0 時不檢查。"""
+    if budget_chars <= 0:
+        return None
+    used = ledger.month_totals(key_id)["chars"]
+    remaining = budget_chars - used
+    if job_chars <= remaining:
+        return None
+    days_left = calendar.monthrange(datetime.now().year, datetime.now().month)[1] - datetime.now().day
+    return (
+        f"本月已用 {used:,} / {budget_chars:,} 字元，剩下 {max(0, remaining):,} 字元；"
+        f"這份工作最多約 {job_chars:,} 字元（命中分段快取的部分不計），可能超過預算。"
+        f"距離下個月重新計算還有 {days_left} 天。"
+    )
+
+
+class TokenBucket:
+    """執行緒安全的權杖桶：每秒補充 `rate` 個、最多存 `capacity` 個；拿不到時等到補上為止。"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+
+    def _refill_locked(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> float:
+        """拿一個權杖，回傳等待的秒數。"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill_locked(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self.acquired += 1
+                    if waited:
+                        self.waited += 1
+                        self.wait_seconds += waited
+                    return waited
+                # 先算好還差多久，在鎖外面睡，其他執行緒可以同時檢查
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def set_rate(self, rate: float, capacity: int) -> None:
+        with self._lock:
+            self._refill_locked(time.monotonic())
+            self.rate = rate
+            self.capacity = max(1, capacity)
+            self._tokens = min(self._tokens, self.capacity)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "acquired": self.acquired,
+                "waited": self.waited,
+                "wait_seconds": self.wait_seconds,
+                "rate": self.rate,
+                "capacity": self.capacity,
+            }
+
+
+def make_bucket(tier: str = DEFAULT_TIER) -> TokenBucket:
+    resource_tier = TIERS.get(tier, TIERS[DEFAULT_TIER])
+    return TokenBucket(resource_tier.requests_per_second, resource_tier.burst)
+
+
+@dataclass
+class UsageMeter:
+    """同一把金鑰共用的限速與帳本，交給 `azure_backend.make_synthesizer` 等建立後端時使用。"""
+
+    bucket: TokenBucket
+    ledger: Optional[UsageLedger] = None
+    key_id: str = "default"
+
+
+class MeteredSynthesizer:
+    """每個請求先從 bucket 拿權杖再送出，結束後把字元數與成敗記進帳本。"""
+
+    def __init__(self, inner: SegmentSynthesizer, meter: UsageMeter, voice: str):
+        self.inner = inner
+        self.meter = meter
+        self.voice = voice
+
+    def _call(self, fn, payload: str, ssml: bool) -> SynthesisOutput:
+        self.meter.bucket.acquire()
+        voice = ssml_voice(payload, self.voice) if ssml else self.voice
+        try:
+            output = fn(payload)
+        except Exception:
+            if self.meter.ledger is not None:
+                self.meter.ledger.record(self.meter.key_id, voice, 0, ok=False)
+            raise
+        if self.meter.ledger is not None:
+            self.meter.ledger.record(self.meter.key_id, voice, billable_chars(payload, ssml))
+        return output
+
+    def synthesize(self, text: str) -> SynthesisOutput:
+        return self._call(self.inner.synthesize, text, ssml=False)
+
+    def synthesize_ssml(self, ssml: str) -> SynthesisOutput:
+        return self._call(self.inner.synthesize_ssml, ssml, ssml=True)
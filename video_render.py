@@ -0,0 +1,281 @@
+"""MP4 影片的輸出設定檔（profile）與 ffmpeg 指令組裝。
+
+舊流程以 1920x1080@30fps 的 `lavfi color` 當畫面、用 `adelay` 延後音訊，
+等於每秒重新編碼 30 張一模一樣的黑畫面，還要把 MP3 解碼再重新編碼一次。
+黑底影片的畫面完全不會動，所以這裡提供幾種更省的做法：
+
+- `still`：每秒 1 張畫面、x264 `stillimage` 調校；開頭空白改在 Python 端
+  直接接上同參數的靜音 MP3 frame，音訊以 `-c:a copy` 原封不動放進 MP4。
+- `still_720p`：同上，但畫面降為 1280x720，檔案更小。
+- `leadin_concat`：開頭空白片段（黑畫面 + 靜音）只渲染一次並快取，
+  之後每支影片只需編碼主體，再用 concat demuxer `-c copy` 接起來。
+- `karaoke`：逐行字幕畫面；每個字幕預先畫成一張圖（見 `karaoke_video.py`），
+  以 concat demuxer 指定每張圖的顯示秒數、可變影格率編碼，影格數等於字幕數。音訊處理與 `still` 相同。
+- `legacy`：原本的 30fps + `adelay` 重新編碼流程，保留給比較與相容用。
+
+輸入為 PCM WAV（需要後製的工作）時，開頭空白同樣在 Python 端補 0 取樣，
+音訊只做一次 AAC 編碼（無損來源，不算重新編碼）；`leadin_concat` 此時退回 `still` 的做法。
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional, Sequence
+
+from audio_formats import audio_duration
+from karaoke_video import StillRenderer, build_timeline, karaoke_available, render_blank, write_concat_list
+from mp3_frames import audio_frames, silent_mp3
+from subtitles import Cue
+from wav_pcm import is_wav, parse_wav, silent_pcm, wav_header
+
+
+@dataclass(frozen=True)
+class VideoProfile:
+    key: str
+    label: str
+    width: int
+    height: int
+    fps: int
+    # True：音訊以 -c:a copy 放進 MP4，開頭空白用靜音 frame 補
+    copy_audio: bool
+    # True：開頭空白片段另外渲染並快取，再與主體 concat
+    leadin_clip: bool = False
+    # True：畫面是逐行字幕（需要字幕時間與 Pillow），影格率可變，`fps` 不使用
+    karaoke: bool = False
+
+
+VIDEO_PROFILES = {
+    "still": VideoProfile("still", "快速：1080p 靜態畫面、音訊不重新編碼（建議）", 1920, 1080, 1, True),
+    "still_720p": VideoProfile("still_720p", "最快：720p 靜態畫面、音訊不重新編碼", 1280, 720, 1, True),
+    "leadin_concat": VideoProfile(
+        "leadin_concat", "快取開頭片段：1080p，開頭空白只渲染一次再接主體", 1920, 1080, 1, True, leadin_clip=True
+    ),
+    "karaoke": VideoProfile(
+        "karaoke", "逐行字幕：1080p，每行預先畫成一張畫面（需要 Pillow）", 1920, 1080, 1, True, karaoke=True
+    ),
+    "legacy": VideoProfile("legacy", "相容：1080p 30fps、音訊重新編碼（舊流程）", 1920, 1080, 30, False),
+}
+DEFAULT_VIDEO_PROFILE = "still"
+
+DEFAULT_LEADIN_CACHE_DIR = os.path.join("azure_outputs", ".video_cache")
+# PCM 輸入放進 MP4 時的 AAC 位元率
+PCM_AAC_BITRATE = "192k"
+
+
+def _run_ffmpeg(args: List[str]) -> None:
+    subprocess.run(
+        ["ffmpeg", "-y", *args],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        check=True,
+    )
+
+
+@lru_cache(maxsize=1)
+def _vfr_args() -> List[str]:
+    """可變影格率的選項：ffmpeg 5.1 起用 `-fps_mode`（`-vsync` 已棄用），更舊的版本只認得 `-vsync`。"""
+    try:
+        help_text = subprocess.run(
+            ["ffmpeg", "-hide_banner", "-h", "long"],
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            text=True,
+            errors="replace",
+        ).stdout
+    except OSError:
+        help_text = ""
+    return ["-fps_mode", "vfr"] if "-fps_mode" in help_text else ["-vsync", "vfr"]
+
+
+def _video_encode_args(profile: VideoProfile) -> List[str]:
+    # 靜態畫面：極低 fps + stillimage 調校，畫面幾乎不佔編碼時間
+    return [
+        "-c:v", "libx264",
+        "-preset", "veryfast",
+        "-tune", "stillimage",
+        "-pix_fmt", "yuv420p",
+        "-r", str(profile.fps),
+        "-g", str(profile.fps * 10),
+    ]
+
+
+def _black_source(profile: VideoProfile) -> List[str]:
+    return ["-f", "lavfi", "-i", f"color=c=black:s={profile.width}x{profile.height}:r={profile.fps}"]
+
+
+def _render_legacy(audio_path: str, video_path: str, lead_seconds: float) -> None:
+    delay_ms = int(lead_seconds * 1000)
+    _run_ffmpeg([
+        *_black_source(VIDEO_PROFILES["legacy"]),
+        "-i", audio_path,
+        "-af", f"adelay={delay_ms}|{delay_ms}",
+        "-shortest",
+        video_path,
+    ])
+
+
+def _mux_still(
+    profile: VideoProfile,
+    audio_path: str,
+    video_path: str,
+    audio_codec: Optional[List[str]] = None,
+) -> None:
+    _run_ffmpeg([
+        *_black_source(profile),
+        "-i", audio_path,
+        "-map", "0:v", "-map", "1:a",
+        *_video_encode_args(profile),
+        *(audio_codec or ["-c:a", "copy"]),
+        "-shortest",
+        video_path,
+    ])
+
+
+def _mux_karaoke(
+    profile: VideoProfile,
+    audio_path: str,
+    video_path: str,
+    cues: Sequence[Cue],
+    lead_seconds: float,
+    audio_codec: Optional[List[str]] = None,
+    font_path: Optional[str] = None,
+) -> None:
+    """`audio_path` 已含開頭空白；`cues` 的時間不含，畫面時間另外加上 `lead_seconds`。"""
+    with open(audio_path, "rb") as f:
+        total_seconds = audio_duration(f.read())
+    stills_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(video_path)), prefix=".karaoke_")
+    try:
+        renderer = StillRenderer(profile.width, profile.height, stills_dir, font_path)
+        timeline = build_timeline(cues, renderer, lead_seconds, total_seconds)
+        list_path = os.path.join(stills_dir, "stills.txt")
+        write_concat_list(list_path, timeline, render_blank(profile.width, profile.height, stills_dir))
+        _run_ffmpeg([
+            "-f", "concat", "-safe", "0", "-i", list_path,
+            "-i", audio_path,
+            "-map", "0:v", "-map", "1:a",
+            "-c:v", "libx264",
+            "-preset", "veryfast",
+            "-tune", "stillimage",
+            "-pix_fmt", "yuv420p",
+            # 可變影格率：每張圖只編碼一格，不依固定 fps 重複
+            *_vfr_args(),
+            *(audio_codec or ["-c:a", "copy"]),
+            video_path,
+        ])
+    finally:
+        shutil.rmtree(stills_dir, ignore_errors=True)
+
+
+def _write_with_leadin(audio_path: str, lead_seconds: float, out_path: str) -> None:
+    """在原音訊前面接上同參數的靜音 frame（或 0 取樣），取代 adelay 重新編碼。"""
+    with open(audio_path, "rb") as f:
+        data = f.read()
+    if is_wav(data):
+        fmt, pcm = parse_wav(data)
+        if fmt is None:
+            raise ValueError(f"{audio_path} 不是可辨識的 PCM WAV")
+        silence = silent_pcm(lead_seconds, fmt)
+        with open(out_path, "wb") as f:
+            f.write(wav_header(fmt, len(silence) + len(pcm)))
+            f.write(silence)
+            f.write(pcm)
+        return
+    frames, _samples, header = audio_frames(data)
+    if header is None:
+        raise ValueError(f"{audio_path} 不是可辨識的 MP3，無法直接放進 MP4")
+    with open(out_path, "wb") as f:
+        if lead_seconds > 0:
+            f.write(silent_mp3(lead_seconds, template=header))
+        f.writelines(frames)
+
+
+def get_leadin_clip(profile: VideoProfile, lead_seconds: float, audio_path: str, cache_dir: str) -> str:
+    """取得（必要時渲染並快取）開頭空白片段；音訊參數與主體相同，才能用 concat -c copy 接起來。"""
+    with open(audio_path, "rb") as f:
+        _frames, _samples, header = audio_frames(f.read(64 * 1024))
+    if header is None:
+        raise ValueError(f"{audio_path} 不是可辨識的 MP3，無法直接放進 MP4")
+    name = (
+        f"leadin_{profile.width}x{profile.height}_{profile.fps}fps_{lead_seconds:g}s_"
+        f"{header.sample_rate}hz_{header.bitrate // 1000}k_{header.channels}ch.mp4"
+    )
+    clip_path = os.path.join(cache_dir, name)
+    if os.path.exists(clip_path):
+        return clip_path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, silence_path = tempfile.mkstemp(dir=cache_dir, suffix=".mp3")
+    tmp_clip = clip_path + ".tmp.mp4"
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(silent_mp3(lead_seconds, template=header))
+        _mux_still(profile, silence_path, tmp_clip)
+        os.replace(tmp_clip, clip_path)
+    finally:
+        for path in (silence_path, tmp_clip):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    return clip_path
+
+
+def render_video(
+    audio_path: str,
+    video_path: str,
+    lead_seconds: float = 5,
+    profile_key: str = DEFAULT_VIDEO_PROFILE,
+    leadin_cache_dir: str = DEFAULT_LEADIN_CACHE_DIR,
+    cues: Optional[Sequence[Cue]] = None,
+    font_path: Optional[str] = None,
+) -> float:
+    """依設定檔把音訊做成 MP4，回傳實際花費秒數；ffmpeg 失敗時拋出 CalledProcessError。
+
+    `cues` 是不含開頭空白的字幕時間，只有 `karaoke` 設定檔使用；沒有字幕或沒有 Pillow 時改用預設的黑底畫面。
+    """
+    profile = VIDEO_PROFILES[profile_key]
+    if profile.karaoke and not (cues and karaoke_available()):
+        profile = VIDEO_PROFILES[DEFAULT_VIDEO_PROFILE]
+    start = time.perf_counter()
+    if not profile.copy_audio:
+        _render_legacy(audio_path, video_path, lead_seconds)
+        return time.perf_counter() - start
+
+    with open(audio_path, "rb") as f:
+        pcm_input = is_wav(f.read(12))
+    work_dir = os.path.dirname(os.path.abspath(video_path))
+    temp_paths = []
+    try:
+        if profile.leadin_clip and lead_seconds > 0 and not pcm_input:
+            leadin = get_leadin_clip(profile, lead_seconds, audio_path, leadin_cache_dir)
+            body_fd, body_path = tempfile.mkstemp(dir=work_dir, suffix=".body.mp4")
+            os.close(body_fd)
+            list_fd, list_path = tempfile.mkstemp(dir=work_dir, suffix=".concat.txt")
+            temp_paths += [body_path, list_path]
+            _mux_still(profile, audio_path, body_path)
+            with os.fdopen(list_fd, "w", encoding="utf-8") as f:
+                f.write(f"file '{os.path.abspath(leadin)}'\n")
+                f.write(f"file '{os.path.abspath(body_path)}'\n")
+            _run_ffmpeg(["-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", video_path])
+        else:
+            audio_fd, padded_path = tempfile.mkstemp(dir=work_dir, suffix=".lead.wav" if pcm_input else ".lead.mp3")
+            os.close(audio_fd)
+            temp_paths.append(padded_path)
+            _write_with_leadin(audio_path, lead_seconds, padded_path)
+            # MP3 是 MP4 原生支援的音訊編碼，直接 copy；PCM 只在這裡編碼一次成 AAC
+            audio_codec = ["-c:a", "aac", "-b:a", PCM_AAC_BITRATE] if pcm_input else None
+            if profile.karaoke:
+                _mux_karaoke(profile, padded_path, video_path, cues, lead_seconds, audio_codec, font_path)
+            else:
+                _mux_still(profile, padded_path, video_path, audio_codec)
+    finally:
+        for path in temp_paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    return time.perf_counter() - start
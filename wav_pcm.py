@@ -0,0 +1,173 @@
+"""純 Python 的 WAV（RIFF / PCM）解析與串接，對應 `mp3_frames.py` 的 MP3 版本。
+
+Azure 的 `Riff*Pcm` 輸出格式每段都是帶 RIFF 標頭的完整 WAV 檔；
+串接時只取出 `data` chunk 的 PCM 取樣依序寫出，最後再回頭補上整個檔案的標頭。
+PCM 沒有 frame 結構，長度直接由位元組數與取樣率推算，開頭空白也只要補上全 0 的取樣。
+"""
+import os
+import struct
+import tempfile
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+
+WAVE_FORMAT_PCM = 1
+HEADER_LENGTH = 44
+
+
+@dataclass(frozen=True)
+class PcmFormat:
+    sample_rate: int
+    channels: int = 1
+    bits_per_sample: int = 16
+
+    @property
+    def block_align(self) -> int:
+        return self.channels * self.bits_per_sample // 8
+
+    @property
+    def bytes_per_second(self) -> int:
+        return self.sample_rate * self.block_align
+
+
+def is_wav(data) -> bool:
+    return len(data) >= 12 and bytes(data[:4]) == b"RIFF" and bytes(data[8:12]) == b"WAVE"
+
+
+def parse_wav(data) -> Tuple[Optional[PcmFormat], memoryview]:
+    """回傳 (PCM 參數, data chunk 內容)；不是 PCM WAV 時回傳 (None, 空 memoryview)。
+
+    串流產生的 WAV 標頭中 data 長度可能是 0 或 0xFFFFFFFF，這時取到檔案結尾為止。
+    """
+    view = memoryview(data)
+    if not is_wav(view):
+        return None, view[:0]
+    fmt: Optional[PcmFormat] = None
+    offset = 12
+    while offset + 8 <= len(view):
+        chunk_id = bytes(view[offset:offset + 4])
+        (size,) = struct.unpack_from("<I", view, offset + 4)
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            audio_format, channels, sample_rate, _rate, _align, bits = struct.unpack_from("<HHIIHH", view, body)
+            if audio_format != WAVE_FORMAT_PCM:
+                return None, view[:0]
+            fmt = PcmFormat(sample_rate, channels, bits)
+        elif chunk_id == b"data":
+            end = len(view) if size in (0, 0xFFFFFFFF) or body + size > len(view) else body + size
+            if fmt is None:
+                return None, view[:0]
+            # 只保留完整的取樣，避免接起來之後聲道錯位
+            end -= (end - body) % fmt.block_align
+            return fmt, view[body:end]
+        # RIFF chunk 以 2 bytes 對齊
+        offset = body + size + (size & 1)
+    return None, view[:0]
+
+
+def wav_duration(data) -> float:
+    fmt, pcm = parse_wav(data)
+    return len(pcm) / fmt.bytes_per_second if fmt else 0.0
+
+
+def wav_header(fmt: PcmFormat, data_length: int) -> bytes:
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF",
+        36 + data_length,
+        b"WAVE",
+        b"fmt ",
+        16,
+        WAVE_FORMAT_PCM,
+        fmt.channels,
+        fmt.sample_rate,
+        fmt.bytes_per_second,
+        fmt.block_align,
+        fmt.bits_per_sample,
+        b"data",
+        data_length,
+    )
+
+
+def silent_pcm(seconds: float, fmt: PcmFormat) -> bytes:
+    """長度約 `seconds` 秒、全為 0 的 PCM 取樣（16-bit 有號 PCM 的 0 就是靜音）。"""
+    return bytes(max(0, round(seconds * fmt.sample_rate)) * fmt.block_align)
+
+
+def silent_wav(seconds: float, fmt: PcmFormat) -> bytes:
+    pcm = silent_pcm(seconds, fmt)
+    return wav_header(fmt, len(pcm)) + pcm
+
+
+def split_wav(data, boundaries: Sequence[float]) -> List[bytes]:
+    """在 `boundaries`（遞增的秒數）切開，回傳 len(boundaries) + 1 個完整的 WAV 檔。"""
+    fmt, pcm = parse_wav(data)
+    if fmt is None:
+        return [b""] * (len(boundaries) + 1)
+    offsets = [0]
+    for seconds in boundaries:
+        offset = min(len(pcm), max(0, round(seconds * fmt.sample_rate)) * fmt.block_align)
+        offsets.append(max(offsets[-1], offset))
+    offsets.append(len(pcm))
+    return [wav_header(fmt, end - start) + bytes(pcm[start:end]) for start, end in zip(offsets, offsets[1:])]
+
+
+class WavJoiner:
+    """把依序交付的各段 WAV 取出 PCM 取樣，串流寫進單一輸出檔；介面與 `Mp3Joiner` 相同。
+
+    標頭先以 0 長度佔位，`commit` 時才回頭寫入實際長度。
+    """
+
+    def __init__(self, output_path: str):
+        self.output_path = output_path
+        self.format: Optional[PcmFormat] = None
+        self.bytes_written = 0
+        directory = os.path.dirname(os.path.abspath(output_path))
+        fd, self._tmp_path = tempfile.mkstemp(dir=directory, suffix=".wav.tmp")
+        self._file = os.fdopen(fd, "wb")
+        self._file.write(bytes(HEADER_LENGTH))
+
+    def __call__(self, index: int, output) -> None:
+        self.append(output.audio_data, label=f"第 {index} 段")
+
+    def append(self, data: bytes, label: str = "分段") -> None:
+        fmt, pcm = parse_wav(data)
+        if fmt is None:
+            raise ValueError(f"{label}不是可辨識的 PCM WAV")
+        if self.format is None:
+            self.format = fmt
+        elif fmt != self.format:
+            raise ValueError(
+                f"{label}的格式（{fmt.sample_rate} Hz, {fmt.channels}ch, {fmt.bits_per_sample} bit）"
+                f"與前面的分段不同，無法直接串接"
+            )
+        self._file.write(pcm)
+        self.bytes_written += len(pcm)
+
+    @property
+    def duration(self) -> float:
+        return self.bytes_written / self.format.bytes_per_second if self.format else 0.0
+
+    def commit(self) -> None:
+        if self.format is not None:
+            self._file.seek(0)
+            self._file.write(wav_header(self.format, self.bytes_written))
+        self._file.close()
+        os.replace(self._tmp_path, self.output_path)
+
+    def abort(self) -> None:
+        self._file.close()
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+        return False
@@ -0,0 +1,108 @@
+"""YouTube 說明欄的固定模板，依影片用途挑選。"""
+
+
+YOUTUBE_DESCRIPTION_TEMPLATES = {
+    # 一般德文聽力 / 閱讀 / 口語跟讀
+    "general_listening": """#Deutschlernen #GermanListening #TELC #Deutschverstehen
+📌 Deutsche Hörübung – Vorlesen eines Übungstextes zur Prüfungsvorbereitung
+
+In diesem Video wird ein deutscher Übungstext langsam, deutlich und mit natürlicher Betonung vorgelesen. Ideal für:
+✓ Vorbereitung auf TestDaF / DSH / Goethe / TELC
+✓ Training des Hörverstehens
+✓ Schattenlesen (Shadowing) und Nachsprechen
+✓ Wortschatzaufbau und Festigung grammatischer Strukturen
+✓ Gewöhnung an akademische Hörtexte
+
+🗣 Sprecher: Standarddeutscher Sprecher mit neutraler, klarer Aussprache  
+🎧 Inhalt: Vorlesen eines sachlichen deutschen Textes in prüfungsnahem Stil
+
+Tipps zum Lernen:
+1. Zuerst ohne Untertitel hören
+2. Danach mit deutschen Untertiteln (automatisch erzeugt) erneut anhören
+3. Den Text laut nachsprechen (Shadowing)
+4. Mehrmals wiederholen – Sprache lernt man durch Wiederholung
+
+💡 Lerntipp:  
+Dieses Video lässt sich sehr gut zusammen mit dem Browser‑Add‑on **Language Reactor** verwenden (https://www.languagereactor.com/).  
+Damit kannst du Untertitel bequemer steuern, Vokabeln speichern und schwierige Stellen mehrfach im Kontext wiederholen.
+
+Wenn du weitere deutsche Hörübungen möchtest, freue ich mich über einen Kommentar oder ein Abo!
+
+#Deutschlernen #GermanListening #TestDaF #DSH #TELC #Goethe #GermanAudio #DeutschfürAusländer #GermanPractice #GermanReading #Deutschverstehen""",
+    # 德福 / 高階考試：聽力重點
+    "testdaf_listening": """#TestDaF #Deutschlernen #Hörverstehen #GermanListening
+📌 TestDaF / Hochschulprüfung – Hörverstehen-Training mit authentischem Übungstext
+
+In diesem Video hörst du einen deutschen Übungstext im prüfungsnahen Stil. Ideal für:
+✓ Vorbereitung auf TestDaF, DSH, telc Hochschule
+✓ Training des globalen und selektiven Hörverstehens
+✓ Gewöhnung an akademische Hörtexte und typische Prüfungssituationen
+
+🗣 Sprecher: neutrale, deutliche Aussprache in Standarddeutsch  
+🎧 Fokus: Hörverstehen, Notizen machen, Struktur erkennen
+
+Lerntipps:
+1. Zuerst einmal ohne Untertitel hören und nur grob mitschreiben
+2. Beim zweiten Hören gezielt auf Details achten (Zahlen, Argumente, Beispiele)
+3. Schwierige Stellen mehrfach wiederholen, bis die Struktur klar ist
+4. Zum Schluss laut mitsprechen (Shadowing), um Aussprache und Rhythmus zu üben
+
+💡 Bonus:  
+Zusammen mit **Language Reactor** im Browser kannst du Untertitel, Pausen und Wiederholungen noch besser steuern.
+
+Wenn dir dieses Hörtraining hilft, lass gerne einen Kommentar oder ein Abo da.
+
+#TestDaF #DSH #telcC1 #GermanExam #Hörverstehen #DeutschfürStudium""",
+    # 德福 / 口語題型
+    "testdaf_speaking": """#TestDaF #Deutschlernen #Sprechen #GermanSpeaking
+📌 TestDaF Mündliche Prüfung – Sprechanlass / Antwortbausteine zum Mitsprechen
+
+Dieses Video ist für die Vorbereitung auf die mündliche Prüfung gedacht. Ideal für:
+✓ TestDaF-Aufgaben zur Beschreibung, Meinungsäußerung und Diskussion
+✓ Strukturierte Antwortbausteine (Einleitung – Argumente – Schluss)
+✓ Lautes Mitsprechen (Shadowing) für mehr Sicherheit im Ausdruck
+
+🗣 Fokus: flüssiges, zusammenhängendes Sprechen in Prüfungssituationen  
+🎯 Ziel: typische Redemittel automatisieren, damit im Ernstfall mehr Kapazität fürs Denken bleibt
+
+💡 Lerntipps:
+1. Höre den Text zuerst komplett durch und achte auf Aufbau und Redemittel
+2. Spule zurück und sprich einzelne Sätze oder Abschnitte laut nach
+3. Pausiere das Video und versuche, ähnliche Antworten mit eigenen Inhalten zu formulieren
+4. Wiederhole das Ganze mehrmals an verschiedenen Tagen, damit die Strukturen im Kopf bleiben
+
+ 
+Dieses Video lässt sich sehr gut zusammen mit dem Browser‑Add‑on **Language Reactor** verwenden (https://www.languagereactor.com/).  
+Damit kannst du Untertitel bequemer steuern, Vokabeln speichern und schwierige Stellen mehrfach im Kontext wiederholen.
+
+Wenn du dir mehr Vorlagen für mündliche Prüfungen wünschst, schreib es gern in die Kommentare.
+
+#TestDaF #MündlichePrüfung #DeutschSprechen #Redemittel #GermanOralExam""",
+    # 德福 / 書寫題型
+    "testdaf_writing": """#TestDaF #Deutschlernen #Schreiben #GermanWriting
+📌 TestDaF Schriftlicher Ausdruck – Mustertext / Formulierungshilfen
+
+In diesem Video wird ein Mustertext für die schriftliche Prüfung vorgelesen. Ideal für:
+✓ Vorbereitung auf den schriftlichen Ausdruck im TestDaF
+✓ Einüben von typischen Einleitungen, Überleitungen und Schlussformulierungen
+✓ Wiederkehrende Formulierungen für Argumentation, Beschreibung und Stellungnahme
+
+🗣 Sprecher: ruhige, deutliche Aussprache in Standarddeutsch  
+📄 Inhalt: prüfungsnaher Beispieltext, der sich gut als Vorlage oder Inspiration eignet
+
+💡 Lerntipps:
+1. Höre den Text einmal komplett, nur um Struktur und Aufbau zu verstehen
+2. Lies (oder höre) Abschnitt für Abschnitt und markiere dir nützliche Redemittel
+3. Versuche dann, mit denselben Bausteinen eigene Texte zu einem anderen Thema zu formulieren
+4. Nutze den Text zum laut Vorlesen, um Schriftbild und Aussprache gleichzeitig zu trainieren
+
+💡 Bonus:  
+Dieses Video lässt sich sehr gut zusammen mit dem Browser‑Add‑on **Language Reactor** verwenden (https://www.languagereactor.com/).  
+Damit kannst du Untertitel bequemer steuern, Vokabeln speichern und schwierige Stellen mehrfach im Kontext wiederholen.
+
+Wenn du mehr Beispieltexte für schriftliche Prüfungen brauchst, lass gern einen Kommentar oder ein Abo da.
+
+#TestDaF #SchriftlicherAusdruck #DeutschSchreiben #GermanWriting #DeutschPrüfung"""
+}
+
+DEFAULT_YT_TEMPLATE_KEY = "general_listening"